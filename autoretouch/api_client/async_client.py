@@ -0,0 +1,881 @@
+import asyncio
+import io
+import json
+import logging
+import mimetypes
+import os
+from time import monotonic
+from typing import AsyncIterator, BinaryIO, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from uuid import UUID
+
+try:
+    import aiohttp
+except ImportError as e:
+    raise ImportError(
+        "AsyncAutoRetouchAPIClient requires aiohttp. Install it with `pip install aiohttp`"
+    ) from e
+
+from autoretouch.api_client.client import (
+    AutoRetouchAPIClient,
+    DEFAULT_API_CONFIG,
+    AR_CREDENTIALS,
+    AR_REFRESH_TOKEN,
+    DEFAULT_USER_AGENT,
+    DEFAULT_POOL_SIZE,
+    DEFAULT_TIMEOUT,
+    DOWNLOAD_CHUNK_SIZE,
+    COMPLETION_POLL,
+    COMPLETION_STREAM,
+)
+from autoretouch.api_client.model import (
+    ApiConfig,
+    Organization,
+    Page,
+    Workflow,
+    WorkflowExecution,
+    ServerSentEvent,
+)
+from autoretouch.api_client.files import AtomicFile
+from autoretouch.api_client.instrumentation import route_of
+from autoretouch.api_client.metadata_cache import MetadataCache
+from autoretouch.api_client.pagination import DEFAULT_PAGE_SIZE, aiter_pages
+from autoretouch.api_client.retry import RetryPolicy
+from autoretouch.api_client.scan import scan_images
+from autoretouch.api_client.sse import EventStreamParser
+from autoretouch.api_client.schedule import PollSchedule, RuntimeStats, execution_runtime
+from autoretouch.api_client.throttle import AIMDController, TokenBucket
+
+__all__ = [
+    "AsyncAutoRetouchAPIClient",
+    "DEFAULT_CONCURRENCY",
+]
+
+logger = logging.getLogger("autoretouch-python-client")
+
+DEFAULT_CONCURRENCY = 1000
+
+
+class _KeepOpen(io.IOBase):
+    """a file aiohttp reads but does not close once it is sent, so that a failed upload can be sent again"""
+
+    def __init__(self, file: BinaryIO):
+        super().__init__()
+        self._file = file
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def close(self):
+        pass
+
+
+def _keep_open(image: Union[bytes, BinaryIO]) -> Union[bytes, BinaryIO]:
+    try:
+        image.fileno()
+    except (AttributeError, OSError):
+        # bytes and in-memory streams are not closed by aiohttp
+        return image
+    return _KeepOpen(image)
+
+
+class AsyncAutoRetouchAPIClient:
+    """
+    asyncio autoRetouch API client
+
+    Authentication is shared with :class:`AutoRetouchAPIClient`: the (rare) auth requests run through
+    a blocking client in a worker thread, every other endpoint is a coroutine.
+
+    :param organization_id: Default: `AUTORETOUCH_ORGANIZATION_ID` or the organization of the user config
+    :param workflow_id: Default: `AUTORETOUCH_WORKFLOW_ID` or the workflow of the user config
+    :param api_config:
+    :param credentials_path: optional path to a .json credential file
+    :param refresh_token: optional refresh_token for requesting up-to-dates access_token
+    :param user_agent:
+    :param save_credentials: whether the credentials should be saved. Default: True
+    :param session: optional `aiohttp.ClientSession` to send requests with. The client does not close a passed-in session
+    :param pool_size: maximum number of concurrent connections per host. Default: 200
+    :param timeout: `(connect, read)` seconds a request waits for a connection and for the server between two
+        bytes of its response, see `AutoRetouchAPIClient`. Only applies to the session the client creates.
+        Default: (10, 60)
+    :param poll_schedule: default `PollSchedule` of `process_image`. Default: poll every 2 seconds
+    :param runtime_stats: optional `RuntimeStats` to learn the workflows' runtimes into, e.g. loaded from a previous run
+    :param metadata_cache: optional `MetadataCache` of organizations, workflows and balance
+    :param retry_policy: the `RetryPolicy` of all requests, shared with the blocking client. Default: `RetryPolicy()`
+    :param rate_limiter: optional `TokenBucket` every request takes a token from, shareable between clients
+    :param concurrency_controller: optional `AIMDController` adapting the number of images in flight in
+        `process_image`/`process_folder` to the latency and errors of all requests, shareable between clients
+    """
+
+    #: seconds between two checks for a free slot of the `concurrency_controller`
+    _SLOT_POLL_INTERVAL = 0.01
+
+    def __init__(
+            self,
+            organization_id: Optional[Union[str, UUID]] = None,
+            workflow_id: Optional[Union[str, UUID]] = None,
+            api_config: ApiConfig = DEFAULT_API_CONFIG,
+            credentials_path: Optional[str] = AR_CREDENTIALS,
+            refresh_token: Optional[str] = AR_REFRESH_TOKEN,
+            user_agent: str = DEFAULT_USER_AGENT,
+            save_credentials: bool = True,
+            session: Optional[aiohttp.ClientSession] = None,
+            pool_size: int = DEFAULT_POOL_SIZE,
+            timeout: Optional[Tuple[float, float]] = DEFAULT_TIMEOUT,
+            poll_schedule: Optional[PollSchedule] = None,
+            runtime_stats: Optional[RuntimeStats] = None,
+            metadata_cache: Optional[MetadataCache] = None,
+            retry_policy: Optional[RetryPolicy] = None,
+            rate_limiter: Optional[TokenBucket] = None,
+            concurrency_controller: Optional[AIMDController] = None,
+    ):
+        self.sync_client = AutoRetouchAPIClient(
+            organization_id=organization_id,
+            workflow_id=workflow_id,
+            api_config=api_config,
+            credentials_path=credentials_path,
+            refresh_token=refresh_token,
+            user_agent=user_agent,
+            save_credentials=save_credentials,
+            pool_size=1,
+            timeout=timeout,
+            poll_schedule=poll_schedule,
+            runtime_stats=runtime_stats,
+            metadata_cache=metadata_cache,
+            retry_policy=retry_policy,
+            rate_limiter=rate_limiter,
+            concurrency_controller=concurrency_controller,
+        )
+        self.api_config = api_config
+        self.user_agent = user_agent
+        self.pool_size = pool_size
+        self._owns_session = session is None
+        self._session = session
+        self._auth_lock = asyncio.Lock()
+
+    @property
+    def auth(self):
+        return self.sync_client.auth
+
+    @property
+    def organization_id(self):
+        return self.sync_client.organization_id
+
+    @property
+    def workflow_id(self):
+        return self.sync_client.workflow_id
+
+    @property
+    def poll_schedule(self) -> PollSchedule:
+        return self.sync_client.poll_schedule
+
+    @property
+    def runtime_stats(self) -> RuntimeStats:
+        return self.sync_client.runtime_stats
+
+    @property
+    def metadata_cache(self) -> Optional[MetadataCache]:
+        return self.sync_client.metadata_cache
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return self.sync_client.retry_policy
+
+    @property
+    def timeout(self) -> Optional[Tuple[float, float]]:
+        return self.sync_client.timeout
+
+    @property
+    def rate_limiter(self) -> Optional[TokenBucket]:
+        return self.sync_client.rate_limiter
+
+    @property
+    def concurrency_controller(self) -> Optional[AIMDController]:
+        return self.sync_client.concurrency_controller
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size)
+            timeout = aiohttp.ClientTimeout()
+            if self.timeout is not None:
+                timeout = aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1])
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    @property
+    def base_headers(self) -> dict:
+        return self.sync_client.base_headers
+
+    async def close(self):
+        """close the pooled connections if the session was created by this client"""
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+        self.sync_client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def get_api_status(self) -> int:
+        async with await self._send("GET", f"{self.api_config.BASE_API_URL}/health") as response:
+            return response.status
+
+    # ****** AUTH ******
+
+    async def authenticated(self):
+        auth = self.auth
+        if auth.credentials is None or auth.token_expired:
+            # only one coroutine talks to the auth server, the others wait for its credentials
+            async with self._auth_lock:
+                if auth.credentials is None or auth.token_expired:
+                    await asyncio.to_thread(self.sync_client.authenticated)
+
+    async def login(self):
+        await asyncio.to_thread(self.sync_client.login)
+        return self
+
+    async def logout(self):
+        await asyncio.to_thread(self.sync_client.logout)
+        return self
+
+    async def revoke_credentials(self):
+        await asyncio.to_thread(self.sync_client.revoke_credentials)
+        return self
+
+    # ****** API ******
+
+    async def get_organizations(self) -> List[Organization]:
+        return [organization async for organization in self.iter_organizations()]
+
+    def iter_organizations(self, page_size: int = DEFAULT_PAGE_SIZE, prefetch: int = 0) -> AsyncIterator[Organization]:
+        """lazily list all your organizations, `page_size` per request. See `aiter_pages`"""
+        logger.info("getting organizations...")
+
+        async def fetch_page(offset: int, limit: int) -> Page:
+            url = f"{self.api_config.BASE_API_URL_CURRENT}/organization?limit={limit}&offset={offset}"
+            page = Page(**await self._get_metadata(f"organizations/{limit}/{offset}", url))
+            page.entries = [Organization.from_dict(entry) for entry in page.entries]
+            return page
+
+        return aiter_pages(fetch_page, page_size, prefetch)
+
+    async def get_organization(self, organization_id: Optional[UUID] = None) -> Organization:
+        logger.info("getting organization...")
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/organization/{organization_id}"
+        return Organization.from_dict(await self._get_metadata(f"organization/{organization_id}", url))
+
+    async def get_workflows(self, organization_id: Optional[UUID] = None) -> List[Workflow]:
+        return [workflow async for workflow in self.iter_workflows(organization_id)]
+
+    def iter_workflows(
+            self,
+            organization_id: Optional[UUID] = None,
+            page_size: int = DEFAULT_PAGE_SIZE,
+            prefetch: int = 0,
+    ) -> AsyncIterator[Workflow]:
+        """lazily list all workflows of an organization, `page_size` per request. See `aiter_pages`"""
+        logger.info("getting workflows...")
+        organization_id = self._get_organization_id(organization_id)
+
+        async def fetch_page(offset: int, limit: int) -> Page:
+            url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow?limit={limit}&offset={offset}&organization={organization_id}"
+            page = Page(**await self._get_metadata(f"workflows/{organization_id}/{limit}/{offset}", url))
+            page.entries = [Workflow.from_dict(entry) for entry in page.entries]
+            return page
+
+        return aiter_pages(fetch_page, page_size, prefetch)
+
+    async def get_workflow(self, workflow_id: UUID, organization_id: Optional[UUID] = None) -> Workflow:
+        logger.info("getting workflow...")
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow/{workflow_id}?organization={organization_id}"
+        return Workflow.from_dict(await self._get_metadata(f"workflow/{organization_id}/{workflow_id}", url))
+
+    async def get_workflow_executions(
+            self,
+            workflow_id: UUID,
+            organization_id: Optional[UUID] = None,
+            limit: int = 50,
+            offset: int = 0,
+    ) -> Page:
+        """list one page of the workflow's executions, newest first"""
+        logger.info("getting workflow executions...")
+        await self.authenticated()
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow/execution?workflow={workflow_id}&limit={limit}&offset={offset}&organization={organization_id}"
+        async with await self._send("GET", url, headers=self.base_headers) as response:
+            logger.debug(f"{url} answered with status {response.status}")
+            response.raise_for_status()
+            page = Page(**await response.json())
+        page.entries = [WorkflowExecution.from_dict(entry) for entry in page.entries]
+        return page
+
+    def iter_workflow_executions(
+            self,
+            workflow_id: UUID,
+            organization_id: Optional[UUID] = None,
+            page_size: int = DEFAULT_PAGE_SIZE,
+            prefetch: int = 0,
+    ) -> AsyncIterator[WorkflowExecution]:
+        """lazily list all executions of the workflow, newest first, `page_size` per request. See `aiter_pages`"""
+        organization_id = self._get_organization_id(organization_id)
+        return aiter_pages(
+            lambda offset, limit: self.get_workflow_executions(workflow_id, organization_id, limit, offset),
+            page_size,
+            prefetch,
+        )
+
+    async def upload_image(
+            self, image_path: str, organization_id: Optional[UUID] = None
+    ) -> str:
+        logger.info("uploading image...")
+        with open(image_path, "rb") as file:
+            return await self.upload_image_from_stream(file, organization_id)
+
+    async def upload_image_from_stream(self, open_file: io.BufferedReader, organization_id: Optional[UUID] = None) -> str:
+        """upload an open binary file, read chunk by chunk while it is sent"""
+        logger.info("uploading image from stream...")
+        await self.authenticated()
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/upload?organization={organization_id}"
+        filename = os.path.basename(getattr(open_file, "name", "")) or "image"
+        data = self._form_data(open_file, filename)
+        async with await self._send("POST", url, headers=self.base_headers, data=data) as response:
+            logger.debug(f"{url} answered with status {response.status}")
+            response.raise_for_status()
+            return await response.text()
+
+    async def upload_image_from_bytes(
+            self,
+            image_content: bytes,
+            image_name: str,
+            mimetype: Optional[str] = None,
+            organization_id: Optional[UUID] = None,
+    ) -> str:
+        logger.info("uploading image from bytes...")
+        await self.authenticated()
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/upload?organization={organization_id}"
+        data = self._form_data(image_content, image_name, mimetype)
+        async with await self._send("POST", url, headers=self.base_headers, data=data) as response:
+            logger.debug(f"{url} answered with status {response.status}")
+            response.raise_for_status()
+            return await response.text()
+
+    async def upload_image_from_urls(
+            self,
+            public_accessible_urls: Dict[str, str],
+            organization_id: Optional[UUID] = None,
+    ) -> Dict[str, str]:
+        logger.info("uploading image from public urls...")
+        await self.authenticated()
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/upload?organization={organization_id}"
+        async with await self._send(
+                "POST", url, headers=self.base_headers, json={"urls": public_accessible_urls}
+        ) as response:
+            response.raise_for_status()
+            return (await response.json())["urls"]
+
+    async def create_workflow_execution_for_image_file(
+            self,
+            workflow_id: UUID,
+            image_path: str,
+            labels: Optional[Dict[str, str]] = None,
+            workflow_version_id: Optional[UUID] = None,
+            organization_id: Optional[UUID] = None,
+    ) -> UUID:
+        logger.info("creating workflow execution for image file...")
+        await self.authenticated()
+        organization_id = self._get_organization_id(organization_id)
+        labels = labels or {}
+        labels_encoded = "".join(
+            [f"&label[{key}]={value}" for key, value in labels.items()]
+        )
+        version_str = f"&version={workflow_version_id}" if workflow_version_id else ""
+        url = (
+            f"{self.api_config.BASE_API_URL_CURRENT}/workflow/execution/create"
+            f"?workflow={workflow_id}"
+            f"{version_str}"
+            f"&organization={organization_id}"
+            f"{labels_encoded}"
+        )
+        logger.info(f"Starting to process {image_path} with workflow {workflow_id}")
+        with open(image_path, "rb") as file:
+            data = self._form_data(file, os.path.basename(image_path))
+            async with await self._send(
+                    "POST", url, idempotent=False, headers=self.base_headers, data=data
+            ) as response:
+                logger.debug(f"{url} answered with status {response.status}")
+                response.raise_for_status()
+                return UUID(await response.text())
+
+    async def create_workflow_execution_for_image_reference(
+            self,
+            workflow_id: UUID,
+            image_content_hash: str,
+            image_name: str,
+            labels: Optional[Dict[str, str]] = None,
+            workflow_version_id: Optional[UUID] = None,
+            organization_id: Optional[UUID] = None,
+            settings: Optional[dict] = None,
+            webhooks: Optional[List[str]] = None,
+    ) -> UUID:
+        logger.info("creating workflow execution for image reference...")
+        await self.authenticated()
+        organization_id = self._get_organization_id(organization_id)
+        version_str = f"&version={workflow_version_id}" if workflow_version_id else ""
+        url = (
+            f"{self.api_config.BASE_API_URL_CURRENT}/workflow/execution/create"
+            f"?workflow={workflow_id}"
+            f"{version_str}"
+            f"&organization={organization_id}"
+        )
+        headers = {**self.base_headers, "Content-Type": "application/json"}
+        mimetype, _ = mimetypes.guess_type(image_name)
+        payload = {
+            "image": {
+                "name": image_name,
+                "contentHash": image_content_hash,
+                "contentType": mimetype,
+            },
+            **({"labels": labels} if labels else {}),
+            "settings": settings if settings else {}
+        }
+        if webhooks is not None:
+            payload["webhooks"] = webhooks
+
+        async with await self._send(
+                "POST", url, idempotent=False, headers=headers, data=json.dumps(payload)
+        ) as response:
+            logger.debug(f"{url} answered with status {response.status}")
+            response.raise_for_status()
+            return UUID(await response.text())
+
+    async def get_workflow_execution_details(
+            self, workflow_execution_id: UUID, organization_id: Optional[UUID] = None
+    ) -> WorkflowExecution:
+        logger.info("getting workflow execution details...")
+        await self.authenticated()
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow/execution/{workflow_execution_id}?organization={organization_id}"
+        headers = {**self.base_headers, "Content-Type": "application/json"}
+        async with await self._send("GET", url, headers=headers) as response:
+            logger.debug(f"{url} answered with status {response.status}")
+            response.raise_for_status()
+            return WorkflowExecution.from_dict(await response.json())
+
+    async def stream_workflow_execution_status(
+            self, workflow_execution_id: UUID, organization_id: Optional[UUID] = None
+    ) -> AsyncIterator[ServerSentEvent]:
+        """yield the events of the execution's status stream as soon as the server sends them"""
+        logger.info("streaming workflow execution status...")
+        await self.authenticated()
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow/execution/{workflow_execution_id}/status?organization={organization_id}"
+        headers = {**self.base_headers, "Content-Type": "text/event-stream", "Accept": "text/event-stream"}
+        parser = EventStreamParser()
+        async with await self._send("GET", url, headers=headers) as response:
+            logger.debug(f"{url} answered with status {response.status}")
+            response.raise_for_status()
+            async for chunk in response.content.iter_any():
+                for event in parser.feed(chunk):
+                    yield event
+
+    async def get_workflow_execution_status_blocking(
+            self, workflow_execution_id: UUID, organization_id: Optional[UUID] = None
+    ) -> str:
+        """wait for the status stream to end and return the last status it reported"""
+        logger.info("getting workflow execution status...")
+        status = None
+        async for event in self.stream_workflow_execution_status(workflow_execution_id, organization_id):
+            status = AutoRetouchAPIClient._status_from_event(event)
+        return status
+
+    async def download_image(
+            self,
+            image_content_hash: str,
+            image_name: str,
+            organization_id: Optional[UUID] = None,
+    ) -> bytes:
+        logger.info("downloading image...")
+        await self.authenticated()
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/image/{image_content_hash}/{image_name}?organization={organization_id}"
+        return await self._get_bytes(url)
+
+    async def download_result_blocking(
+            self, workflow_execution_id: UUID, organization_id: Optional[UUID] = None
+    ) -> bytes:
+        logger.info("downloading result (blocking)...")
+        await self.authenticated()
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow/execution/{workflow_execution_id}/result/default?organization={organization_id}"
+        return await self._get_bytes(url)
+
+    async def download_result(
+            self, result_path: str, organization_id: Optional[UUID] = None
+    ) -> bytes:
+        logger.info("downloading result...")
+        await self.authenticated()
+        assert result_path.startswith("/image/")
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}{result_path}?organization={organization_id}"
+        return await self._get_bytes(url)
+
+    async def download_image_to_file(
+            self,
+            image_content_hash: str,
+            image_name: str,
+            target_path: str,
+            organization_id: Optional[UUID] = None,
+            verify: bool = True,
+    ) -> str:
+        """
+        stream an image to `target_path` without holding it in memory
+
+        :param verify: check that the downloaded bytes match `image_content_hash`. Default: True
+        :return: `target_path`
+        """
+        logger.info("downloading image to file...")
+        await self.authenticated()
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/image/{image_content_hash}/{image_name}?organization={organization_id}"
+        return await self._download_to_file(url, target_path, image_content_hash if verify else None)
+
+    async def download_result_to_file(
+            self,
+            result_path: str,
+            target_path: str,
+            organization_id: Optional[UUID] = None,
+            expected_content_hash: Optional[str] = None,
+    ) -> str:
+        """
+        stream a result to `target_path` without holding it in memory
+
+        :param expected_content_hash: optional `resultContentHash` of the execution to verify the download against
+        :return: `target_path`
+        """
+        logger.info("downloading result to file...")
+        await self.authenticated()
+        assert result_path.startswith("/image/")
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}{result_path}?organization={organization_id}"
+        return await self._download_to_file(url, target_path, expected_content_hash)
+
+    async def retry_workflow_execution(
+            self, workflow_execution_id: UUID, organization_id: Optional[UUID] = None
+    ) -> int:
+        logger.info("retrying workflow execution...")
+        await self.authenticated()
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow/execution/{workflow_execution_id}/retry?organization={organization_id}"
+        headers = {**self.base_headers, "Content-Type": "application/json"}
+        async with await self._send("POST", url, idempotent=False, headers=headers, data={}) as response:
+            logger.debug(f"{url} answered with status {response.status}")
+            return response.status
+
+    async def get_balance(self, organization_id: Optional[UUID] = None) -> int:
+        logger.info("getting balance...")
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/organization/balance?organization={organization_id}"
+        return int(await self._get_metadata(f"balance/{organization_id}", url, as_json=False))
+
+    # ****** HIGH-LEVEL METHODS ******
+
+    async def send_feedback(
+            self,
+            workflow_execution_id: UUID,
+            thumbs_up: bool,
+            expected_images_content_hashes: List[str] = [],
+            organization_id: Optional[UUID] = None,
+    ):
+        logger.info("sending feedback...")
+        await self.authenticated()
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow/execution/{workflow_execution_id}/feedback?organization={organization_id}"
+        headers = {**self.base_headers, "Content-Type": "application/json"}
+        payload = {
+            "thumbsUp": thumbs_up,
+            "expectedImages": expected_images_content_hashes,
+        }
+        async with await self._send(
+                "POST", url, idempotent=False, headers=headers, data=json.dumps(payload)
+        ) as response:
+            response.raise_for_status()
+
+    async def process_image(
+            self,
+            image_path: str,
+            output_dir: str,
+            workflow_id: Optional[UUID] = None,
+            organization_id: Optional[UUID] = None,
+            completion: str = COMPLETION_POLL,
+            schedule: Optional[PollSchedule] = None,
+    ):
+        """
+        upload image, start workflow, download result to `output_dir`
+
+        :param completion: how to wait for the execution: `"poll"` its details
+            or `"stream"` its status events. Default: `"poll"`
+        :param schedule: the `PollSchedule` when polling. Default: the client's `poll_schedule`
+        """
+        controller = self.concurrency_controller
+        if controller is not None:
+            await self._acquire_slot()
+        try:
+            await self._process_image(image_path, output_dir, workflow_id, organization_id, completion, schedule)
+        finally:
+            if controller is not None:
+                controller.release()
+
+    async def _process_image(
+            self,
+            image_path: str,
+            output_dir: str,
+            workflow_id: Optional[UUID],
+            organization_id: Optional[UUID],
+            completion: str,
+            schedule: Optional[PollSchedule],
+    ):
+        organization_id = self._get_organization_id(organization_id)
+        workflow_id = self._get_workflow_id(workflow_id)
+        execution_id = await self.create_workflow_execution_for_image_file(
+            workflow_id, image_path, organization_id=organization_id
+        )
+        started = monotonic()
+        streamed = completion == COMPLETION_STREAM
+        if streamed:
+            await self._wait_for_status_stream(execution_id, organization_id)
+        delays = (schedule or self.poll_schedule).delays(self.runtime_stats.median(workflow_id))
+        while True:
+            # after a finished stream, the first request most likely finds the execution completed
+            if not streamed:
+                await asyncio.sleep(next(delays))
+            streamed = False
+            execution = await self.get_workflow_execution_details(execution_id, organization_id)
+            if execution.status in ("COMPLETED", "FAILED"):
+                break
+        if execution.status == "FAILED":
+            raise RuntimeWarning("execution failed on server")
+        self.runtime_stats.record(workflow_id, execution_runtime(execution) or monotonic() - started)
+
+        await self.download_result_to_file(
+            execution.resultPath,
+            os.path.join(output_dir, os.path.split(image_path)[-1]),
+            organization_id,
+            expected_content_hash=execution.resultContentHash,
+        )
+
+    find_images = staticmethod(AutoRetouchAPIClient.find_images)
+    iter_images = staticmethod(AutoRetouchAPIClient.iter_images)
+
+    async def process_folder(
+            self,
+            image_dir: str,
+            target_dir: str,
+            workflow_id: Optional[UUID] = None,
+            organization_id: Optional[UUID] = None,
+            concurrency: int = DEFAULT_CONCURRENCY,
+            completion: str = COMPLETION_POLL,
+            schedule: Optional[PollSchedule] = None,
+            recursive: bool = False,
+            include: Sequence[str] = (),
+            exclude: Sequence[str] = (),
+    ):
+        """
+        apply a workflow to a directory of images and download the results to `target_dir`, mirroring its tree
+
+        :param concurrency: maximum number of images in flight at once. Default: 1000
+        :param completion: how `process_image` waits for the executions. Default: `"poll"`
+        :param schedule: the `PollSchedule` when polling. Default: the client's `poll_schedule`
+        :param recursive: whether to process the images of subdirectories. Default: False
+        :param include: if given, only images matching one of these glob patterns are processed
+        :param exclude: images and directories matching one of these glob patterns are skipped
+        """
+        organization_id = self._get_organization_id(organization_id)
+        workflow_id = self._get_workflow_id(workflow_id)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def process(relative_path: str):
+            path = os.path.join(image_dir, relative_path)
+            output_dir = os.path.join(target_dir, os.path.dirname(relative_path))
+            try:
+                await self.process_image(
+                    path, output_dir, workflow_id, organization_id, completion=completion, schedule=schedule
+                )
+                logger.info(f"Processed {path} successfully")
+            except Exception as e:
+                logger.error(f"Execution failed for {path}: {e}")
+            finally:
+                semaphore.release()
+
+        tasks = set()
+        # start images only as fast as slots become free, instead of creating a task per image upfront
+        for path in scan_images(
+                image_dir, recursive=recursive, include=include, exclude=exclude, skip_dirs=[target_dir]
+        ):
+            await semaphore.acquire()
+            task = asyncio.create_task(process(path))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+
+    def invalidate_metadata(self, *kinds: str):
+        """forget cached metadata, see `AutoRetouchAPIClient.invalidate_metadata`"""
+        self.sync_client.invalidate_metadata(*kinds)
+
+    # ****** HELPERS ******
+
+    async def _get_metadata(self, key: str, url: str, as_json: bool = True):
+        """GET the JSON (or text) at `url`, through the `metadata_cache` under `key` if there is one"""
+        cache = self.metadata_cache
+        if cache is not None:
+            value = cache.get(key)
+            if value is not None:
+                return value
+        await self.authenticated()
+        headers = {**self.base_headers, "Content-Type": "application/json"}
+        async with await self._send("GET", url, headers=headers) as response:
+            logger.debug(f"{url} answered with status {response.status}")
+            response.raise_for_status()
+            value = await response.json() if as_json else await response.text()
+        if cache is not None:
+            cache.put(key, value)
+        return value
+
+    async def _send(self, method: str, url: str, idempotent: bool = True, data=None, **kwargs) -> aiohttp.ClientResponse:
+        """
+        send a request through the session, retrying it according to the `retry_policy` like
+        `AutoRetouchAPIClient._send`. Release the response, e.g. with `async with`
+
+        :param data: the body, or a function building it for every attempt, see `_form_data`
+        """
+        policy = self.retry_policy
+        controller = self.concurrency_controller
+        route = f"{method} {route_of(url)}"
+        attempt = 0
+        while True:
+            await self._take_token()
+            sent = monotonic()
+            try:
+                response = await self.session.request(
+                    method, url, data=data() if callable(data) else data, **kwargs
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if controller is not None:
+                    controller.record(monotonic() - sent, None, route)
+                if not (attempt + 1 < policy.max_attempts and self._should_retry_error(e, idempotent)):
+                    raise
+                delay = policy.delay(attempt)
+                logger.warning(f"{method} {url} failed ({e!r}), retrying in {delay:.1f}s")
+            else:
+                if controller is not None:
+                    # the request returns with the headers; the time to send a file grows with its size instead
+                    # of with the load of the server
+                    controller.record(None if callable(data) else monotonic() - sent, response.status, route)
+                if not (attempt + 1 < policy.max_attempts and policy.should_retry_status(response.status, idempotent)):
+                    return response
+                delay = policy.delay(attempt, response)
+                logger.warning(f"{url} answered with status {response.status}, retrying in {delay:.1f}s")
+                response.release()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _take_token(self):
+        """take a token of the `rate_limiter`, without blocking the event loop while waiting for one"""
+        if self.rate_limiter is None:
+            return
+        while True:
+            wait = self.rate_limiter.try_acquire()
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+
+    async def _acquire_slot(self):
+        """take a slot of the `concurrency_controller`, which is shared with threads and cannot notify coroutines"""
+        while not self.concurrency_controller.try_acquire():
+            await asyncio.sleep(self._SLOT_POLL_INTERVAL)
+
+    def _should_retry_error(self, error: Exception, idempotent: bool) -> bool:
+        # only a failed connection guarantees that the server never saw the request
+        if isinstance(error, aiohttp.ClientConnectorError):
+            return self.retry_policy.should_retry_failure(False, idempotent)
+        if isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)):
+            return self.retry_policy.should_retry_failure(True, idempotent)
+        return False
+
+    async def _wait_for_status_stream(self, execution_id: UUID, organization_id: Optional[UUID] = None):
+        """return once the status stream reports a final status or ends, polling then picks up the result"""
+        try:
+            async for event in self.stream_workflow_execution_status(execution_id, organization_id):
+                if AutoRetouchAPIClient._status_from_event(event) in ("COMPLETED", "FAILED"):
+                    return
+        except aiohttp.ClientError as e:
+            logger.warning(f"status stream of {execution_id} failed, falling back to polling: {e}")
+
+    async def _get_bytes(self, url: str, headers: Optional[dict] = None) -> bytes:
+        async with await self._send("GET", url, headers=headers or self.base_headers) as response:
+            logger.debug(f"{url} answered with status {response.status}")
+            response.raise_for_status()
+            return await response.read()
+
+    async def _download_to_file(self, url: str, target_path: str, expected_content_hash: Optional[str] = None) -> str:
+        async with await self._send("GET", url, headers=self.base_headers) as response:
+            logger.debug(f"{url} answered with status {response.status}")
+            response.raise_for_status()
+            file = await asyncio.to_thread(AtomicFile, target_path, expected_content_hash)
+            try:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    await asyncio.to_thread(file.write, chunk)
+            except BaseException:
+                file.discard()
+                raise
+            await asyncio.to_thread(file.commit)
+        return target_path
+
+    @staticmethod
+    def _form_data(
+            image: Union[bytes, BinaryIO], image_name: str, mimetype: Optional[str] = None
+    ) -> Callable[[], aiohttp.FormData]:
+        """
+        a function building a multipart body with the image, which aiohttp reads chunk by chunk if it is a file
+
+        A body can only be sent once: `_send` builds a new one for every attempt, from the file's start position.
+        """
+        if not mimetype:
+            mimetype, _ = mimetypes.guess_type(image_name)
+        position = image.tell() if hasattr(image, "seek") else None
+
+        def build() -> aiohttp.FormData:
+            if position is not None:
+                image.seek(position)
+            data = aiohttp.FormData()
+            data.add_field("file", _keep_open(image), filename=image_name, content_type=mimetype)
+            return data
+
+        return build
+
+    def _get_organization_id(self, passed_in_value):
+        return self.sync_client._get_organization_id(passed_in_value)
+
+    def _get_workflow_id(self, passed_in_value):
+        return self.sync_client._get_workflow_id(passed_in_value)
+
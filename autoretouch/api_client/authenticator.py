@@ -1,10 +1,13 @@
 import json
 import os.path
+import threading
 import time
 import webbrowser
 import logging
+from contextlib import nullcontext
 from datetime import datetime
-from typing import Optional
+from typing import ContextManager, Optional
+from autoretouch.api_client.files import file_lock, write_atomically
 from autoretouch.api_client.model import Credentials, DeviceCodeResponse
 
 logger = logging.getLogger("autoretouch-python-client")
@@ -43,38 +46,72 @@ def _poll_credentials_while_user_confirm(
 
 
 class Authenticator:
+    """
+    obtain, refresh and store the credentials of a client
+
+    Safe to share between threads: when the access token expires, one thread refreshes it while the others
+    wait for the new one. Processes sharing a `credentials_path` coordinate through a lock file next to it,
+    and a process about to refresh first adopts credentials that another process already refreshed.
+
+    :param refresh_margin: seconds before its expiry an access token is refreshed. Default: 30
+    :param background_refresh: refresh the access token in a background thread `2 * refresh_margin` seconds
+        before it expires, so that requests never wait for a refresh. Default: False
+    """
+
     def __init__(
         self,
         api: "AutoRetouchAPIClient",
         credentials_path: Optional[str] = None,
         refresh_token: Optional[str] = None,
         save_credentials: bool = True,
+        refresh_margin: float = 30,
+        background_refresh: bool = False,
     ):
         self.api: "AutoRetouchAPIClient" = api
         self.credentials_path: str = credentials_path
         self.refresh_token: str = refresh_token
         self.save_credentials: bool = save_credentials
         self.credentials: Optional[Credentials] = None
+        self.refresh_margin = refresh_margin
+        self.background_refresh = background_refresh
+        self._lock = threading.RLock()
+        self._refresher: Optional[threading.Thread] = None
+        self._stop_refresher = threading.Event()
 
     def authenticate(self):
-        if self.refresh_token is not None:
-            logger.info("authenticating from refresh token")
-            self.credentials = self.api.get_credentials_from_refresh_token(
-                self.refresh_token
-            )
-        elif self.credentials_path is not None and os.path.isfile(self.credentials_path):
-            logger.debug(f"found stored credentials at {self.credentials_path}")
-            self.credentials = self._read_credentials_file()
-            self._refresh_credentials_if_expired()
-        else:
-            logger.info(f"authenticating with new device flow")
-            device_code_response = self.api.get_device_code()
-            _open_browser_for_verification(device_code_response)
-            self.credentials = _poll_credentials_while_user_confirm(
-                self.api, device_code_response
-            )
-            logger.info("Login was successful")
-            self._save_credentials()
+        with self._lock:
+            if self.refresh_token is not None:
+                logger.info("authenticating from refresh token")
+                self.credentials = self.api.get_credentials_from_refresh_token(
+                    self.refresh_token
+                )
+            elif self.credentials_path is not None and os.path.isfile(self.credentials_path):
+                logger.debug(f"found stored credentials at {self.credentials_path}")
+                self.credentials = self._read_credentials_file()
+                self._refresh_credentials_if_expired()
+            else:
+                logger.info("authenticating with new device flow")
+                device_code_response = self.api.get_device_code()
+                _open_browser_for_verification(device_code_response)
+                self.credentials = _poll_credentials_while_user_confirm(
+                    self.api, device_code_response
+                )
+                logger.info("Login was successful")
+                with self._credentials_file_lock():
+                    self._save_credentials()
+        if self.background_refresh:
+            self.start_background_refresh()
+        return self
+
+    def ensure_authenticated(self):
+        """authenticate or refresh the access token if needed, once for all threads calling at the same time"""
+        if self.credentials is not None and not self.token_expired:
+            return self
+        with self._lock:
+            if self.credentials is None:
+                self.authenticate()
+            else:
+                self._refresh_credentials_if_expired()
         return self
 
     @property
@@ -83,24 +120,91 @@ class Authenticator:
 
     @property
     def token_expired(self) -> bool:
-        now = int(datetime.utcnow().timestamp())
-        return now + 30 > self.credentials.expires_at
+        return self._expires_within(self.credentials, self.refresh_margin)
 
     def refresh_credentials(self):
-        logger.info("refreshing credentials")
-        self.credentials = self.api.get_credentials_from_refresh_token(
-            refresh_token=self.credentials.refresh_token
-        )
-        self._save_credentials()
+        with self._lock, self._credentials_file_lock():
+            self._refresh_and_save()
         return self
 
     def revoke_refresh_token(self) -> int:
         return self.api.revoke_refresh_token(self.credentials.refresh_token)
 
-    def _refresh_credentials_if_expired(self):
-        if not self.credentials.access_token or self.token_expired:
+    def start_background_refresh(self):
+        """start the thread refreshing the access token before it expires, if not running yet"""
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._stop_refresher.clear()
+            self._refresher = threading.Thread(
+                target=self._refresh_in_background, name="autoretouch-token-refresh", daemon=True
+            )
+            self._refresher.start()
+
+    def stop_background_refresh(self):
+        self._stop_refresher.set()
+        refresher, self._refresher = self._refresher, None
+        if refresher is not None and refresher is not threading.current_thread():
+            refresher.join()
+
+    def _refresh_credentials_if_expired(self, margin: Optional[float] = None):
+        margin = self.refresh_margin if margin is None else margin
+        if self.credentials.access_token and not self._expires_within(self.credentials, margin):
+            return
+        with self._credentials_file_lock():
+            stored = self._read_stored_credentials()
+            # another process sharing the credentials file may have refreshed them already
+            if stored is not None and stored.access_token and not self._expires_within(stored, margin):
+                logger.debug(f"using credentials refreshed by another process at {self.credentials_path}")
+                self.credentials = stored
+                return
             logger.info("access token expired, refreshing ...")
-            self.refresh_credentials()
+            self._refresh_and_save()
+
+    def _refresh_and_save(self):
+        logger.info("refreshing credentials")
+        self.credentials = self.api.get_credentials_from_refresh_token(
+            refresh_token=self.credentials.refresh_token
+        )
+        self._save_credentials()
+
+    def _refresh_in_background(self):
+        margin = 2 * self.refresh_margin
+        while True:
+            credentials = self.credentials
+            if credentials is None:
+                delay = margin
+            else:
+                delay = credentials.expires_at - margin - _now()
+            # at least a second apart, in case tokens are issued for less than the margin
+            if self._stop_refresher.wait(max(delay, 1)):
+                return
+            try:
+                with self._lock:
+                    if self.credentials is not None:
+                        self._refresh_credentials_if_expired(margin)
+            except Exception as e:
+                logger.warning(f"refreshing credentials in the background failed: {e}")
+                if self._stop_refresher.wait(min(margin, 5)):
+                    return
+
+    @staticmethod
+    def _expires_within(credentials: Credentials, seconds: float) -> bool:
+        return _now() + seconds > credentials.expires_at
+
+    def _credentials_file_lock(self) -> ContextManager:
+        if not self.save_credentials or not self.credentials_path:
+            return nullcontext()
+        return file_lock(f"{self.credentials_path}.lock")
+
+    def _read_stored_credentials(self) -> Optional[Credentials]:
+        if not self.save_credentials or not self.credentials_path or not os.path.isfile(self.credentials_path):
+            return None
+        try:
+            return self._read_credentials_file()
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"could not read stored credentials at {self.credentials_path}: {e}")
+            return None
 
     def _read_credentials_file(self) -> Credentials:
         with open(self.credentials_path, "r") as credentials_file:
@@ -112,21 +216,21 @@ class Authenticator:
         if not self.credentials_path:
             logger.warning("Can not save credentials, no credentials path given")
             return
+        content = json.dumps(self.credentials, default=lambda o: o.__dict__, indent=4)
+        # readers in other processes never see a partially written file
+        write_atomically([content.encode()], self.credentials_path)
         logger.info(f"successfully stored credentials at {self.credentials_path}")
-        if not os.path.exists(os.path.dirname(self.credentials_path)):
-            os.makedirs(os.path.dirname(self.credentials_path), exist_ok=True)
-        with open(self.credentials_path, "w") as credentials_file:
-            json.dump(
-                self.credentials,
-                credentials_file,
-                default=lambda o: o.__dict__,
-                indent=4,
-            )
 
     def logout(self):
-        if os.path.isfile(self.credentials_path):
-            os.remove(self.credentials_path)
-            logger.info(f"removed credentials at {self.credentials_path}")
-        self.credentials = None
-        self.refresh_token = None
+        self.stop_background_refresh()
+        with self._lock:
+            if os.path.isfile(self.credentials_path):
+                os.remove(self.credentials_path)
+                logger.info(f"removed credentials at {self.credentials_path}")
+            self.credentials = None
+            self.refresh_token = None
         return self
+
+
+def _now() -> int:
+    return int(datetime.utcnow().timestamp())
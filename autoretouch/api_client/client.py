@@ -1,15 +1,22 @@
+import hashlib
 import io
+import ipaddress
 import json
 import logging
 import os
 import mimetypes
+import queue
+import threading
 from io import BytesIO
-from time import sleep
+from time import sleep, monotonic, time
+from urllib.parse import urlparse
 from uuid import UUID
 
 import requests
-from typing import Dict, List, Optional, Callable, TypeVar, Union
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from functools import partial
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Callable, Sequence, Set, Tuple, TypeVar, Union
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from autoretouch.api_client.authenticator import Authenticator
 from autoretouch.api_client.model import (
@@ -20,11 +27,59 @@ from autoretouch.api_client.model import (
     DeviceCodeResponse,
     WorkflowExecution,
     Credentials,
+    ProcessedImage,
+    ServerSentEvent,
+)
+from autoretouch.api_client.sse import iter_events
+from autoretouch.api_client.poller import ExecutionStatusPoller
+from autoretouch.api_client.pipeline import BatchPipeline, _log_result
+from autoretouch.api_client.instrumentation import (
+    Instrumentation,
+    InstrumentedHTTPAdapter,
+    StageEvent,
+    STAGE_DOWNLOAD,
+    STAGE_PROCESSING,
+    STAGE_QUEUE,
+    STAGE_UPLOAD,
+    reset_connection_timings,
+    route_of,
+)
+from autoretouch.api_client.journal import JobJournal
+from autoretouch.api_client.metadata_cache import MetadataCache
+from autoretouch.api_client.pagination import DEFAULT_PAGE_SIZE, iter_pages
+from autoretouch.api_client.progress import Progress
+from autoretouch.api_client.files import write_atomically
+from autoretouch.api_client.result_cache import ResultCache
+from autoretouch.api_client.retry import RetryPolicy
+from autoretouch.api_client.scan import scan_images
+from autoretouch.api_client.sync_manifest import Fingerprint, SyncManifest
+from autoretouch.api_client.throttle import AIMDController, TokenBucket
+from autoretouch.api_client.upload_index import UploadIndex, sha256_file
+from autoretouch.api_client.user_config import (
+    CONFIG_ROOT,
+    USER_CONFIG_PATH,
+    default_organization_id,
+    default_workflow_id,
+    load_user_config,
+)
+from autoretouch.api_client.schedule import (
+    FixedPollSchedule,
+    PollSchedule,
+    RuntimeStats,
+    execution_runtime,
+    execution_stages,
 )
 
 __all__ = [
     "AutoRetouchAPIClient",
-    "DEFAULT_API_CONFIG"
+    "DEFAULT_API_CONFIG",
+    "create_session",
+    "COMPLETION_POLL",
+    "COMPLETION_STREAM",
+    "COMPLETION_BATCH",
+    "COMPLETION_WEBHOOK",
+    # moved to user_config, still importable from here as it used to be defined here
+    "USER_CONFIG_PATH",
 ]
 
 logger = logging.getLogger("autoretouch-python-client")
@@ -37,7 +92,6 @@ DEFAULT_API_CONFIG = ApiConfig(
     AUDIENCE="https://api.autoretouch.com",
     AUTH_DOMAIN="https://auth.autoretouch.com",
 )
-CONFIG_ROOT = os.path.join(os.path.expanduser("~"), ".config")
 AR_CREDENTIALS = os.environ.get(
     "AUTORETOUCH_CREDENTIALS_PATH",
     os.path.join(CONFIG_ROOT, "autoretouch-credentials.json")
@@ -45,56 +99,202 @@ AR_CREDENTIALS = os.environ.get(
 AR_REFRESH_TOKEN = os.environ.get(
     "AUTORETOUCH_REFRESH_TOKEN", None
 )
-USER_CONFIG_PATH = os.path.join(CONFIG_ROOT, "autoretouch-config.json")
-if os.path.isfile(USER_CONFIG_PATH):
-    USER_CONFIG = json.load(open(USER_CONFIG_PATH, "r"))
-else:
-    USER_CONFIG = {
-        "organization": {"id": None, "name": None},
-        "workflow": {"name": None, "id": None}
-    }
-DEFAULT_ORG_ID = os.environ.get(
-    "AUTORETOUCH_ORGANIZATION_ID",
-    USER_CONFIG["organization"]["id"]
-)
-DEFAULT_WORKFLOW_ID = os.environ.get(
-    "AUTORETOUCH_WORKFLOW_ID",
-    USER_CONFIG["workflow"]["id"]
-)
 DEFAULT_USER_AGENT = "Autoretouch-Python-Api-Client-0.1.0"
+DEFAULT_POOL_SIZE = 200
+# seconds to wait for a connection and, after that, for each response
+DEFAULT_TIMEOUT = (10.0, 60.0)
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+COMPLETION_POLL = "poll"
+COMPLETION_STREAM = "stream"
+COMPLETION_BATCH = "batch"
+COMPLETION_WEBHOOK = "webhook"
 
 T = TypeVar("T", bound=Callable)
 
 
+def __getattr__(name: str):
+    # the user config is read when these are first used, not at import
+    if name == "USER_CONFIG":
+        return load_user_config()
+    if name == "DEFAULT_ORG_ID":
+        return default_organization_id()
+    if name == "DEFAULT_WORKFLOW_ID":
+        return default_workflow_id()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _is_url(image: str) -> bool:
+    return image.startswith(("http://", "https://"))
+
+
+def _is_local_url(url: str) -> bool:
+    host = urlparse(url).hostname or ""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+# the first bytes of the image formats the API accepts, to name images passed as bytes
+_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpeg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"II*\x00", ".tiff"),
+    (b"MM\x00*", ".tiff"),
+)
+
+
+def _input_name(image: Union[str, bytes, BinaryIO], index: int) -> str:
+    """the file name of an input of `process_images`, numbered by its position if it has none"""
+    if isinstance(image, str):
+        name = os.path.basename(urlparse(image).path if _is_url(image) else image)
+    elif isinstance(image, (bytes, bytearray)):
+        extension = next((extension for signature, extension in _SIGNATURES if image.startswith(signature)), "")
+        name = f"image_{index}{extension}"
+    else:
+        # files opened from a descriptor are named by it
+        name = getattr(image, "name", None)
+        name = os.path.basename(name) if isinstance(name, str) else ""
+    return name or f"image_{index}"
+
+
+def _unique_name(name: str, index: int, taken: Set[str]) -> str:
+    """`name`, numbered by the position of its input if an earlier input of `process_images` has the same name"""
+    if name in taken:
+        stem, extension = os.path.splitext(name)
+        name = f"{stem}_{index}{extension}"
+        suffix = 1
+        while name in taken:
+            name = f"{stem}_{index}_{suffix}{extension}"
+            suffix += 1
+    taken.add(name)
+    return name
+
+
+def _content_hash_of(image: Union[str, bytes, BinaryIO]) -> Optional[str]:
+    """the SHA-256 of an input of `process_images`, `None` for URLs and files that cannot be read twice"""
+    if isinstance(image, str):
+        return None if _is_url(image) else sha256_file(image)
+    if isinstance(image, (bytes, bytearray)):
+        return hashlib.sha256(image).hexdigest()
+    if not (hasattr(image, "seekable") and image.seekable()):
+        return None
+    start = image.tell()
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: image.read(1024 * 1024), b""):
+        digest.update(chunk)
+    image.seek(start)
+    return digest.hexdigest()
+
+
+def create_session(
+        pool_size: int = DEFAULT_POOL_SIZE, pool_block: bool = True, instrumented: bool = False
+) -> requests.Session:
+    """
+    create a keep-alive session whose connection pools are shared by all threads of a client
+
+    :param pool_size: maximum number of connections kept open per host
+    :param pool_block: wait for a free connection instead of opening more than `pool_size` per host
+    :param instrumented: time how long new connections take to connect, see `Instrumentation`. Default: False
+    """
+    session = requests.Session()
+    # one pool per host: the api and the auth domain
+    adapter_class = InstrumentedHTTPAdapter if instrumented else HTTPAdapter
+    adapter = adapter_class(pool_connections=4, pool_maxsize=pool_size, pool_block=pool_block)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
 class AutoRetouchAPIClient:
     """
     autoRetouch API client
 
-    :param organization_id:
+    :param organization_id: Default: `AUTORETOUCH_ORGANIZATION_ID` or the organization of the user config
+    :param workflow_id: Default: `AUTORETOUCH_WORKFLOW_ID` or the workflow of the user config
     :param api_config:
     :param credentials_path: optional path to a .json credential file
     :param refresh_token: optional refresh_token for requesting up-to-dates access_token
     :param user_agent:
     :param save_credentials: whether the credentials should be saved. Default: True
+    :param session: optional `requests.Session` to send requests with. The client does not close a passed-in session
+    :param pool_size: maximum number of concurrent connections per host and of threads in `process_folder`.
+        Default: 200
+    :param timeout: `(connect, read)` seconds a request waits for a connection and for the server between two
+        bytes of its response. A request that times out is retried as the `retry_policy` allows, a stalled status
+        stream falls back to polling. `None` waits forever. Default: (10, 60)
+    :param poll_schedule: default `PollSchedule` of `process_image`. Default: poll every 2 seconds
+    :param runtime_stats: optional `RuntimeStats` to learn the workflows' runtimes into, e.g. loaded from a previous run
+    :param retry_policy: the `RetryPolicy` of all requests and of FAILED executions. Default: `RetryPolicy()`
+    :param rate_limiter: optional `TokenBucket` every request takes a token from, shareable between clients
+    :param concurrency_controller: optional `AIMDController` adapting the number of executions in flight
+        in `process_image`/`process_folder` to the latency and errors of all requests
+    :param upload_index: optional `UploadIndex` of images already uploaded. When given, `process_image` starts
+        executions of known images by their content hash instead of uploading them again
+    :param background_refresh: refresh the access token in a background thread before it expires instead of
+        when a request finds it expired. Default: False
+    :param result_cache: optional `ResultCache`. When given, `process_image`, `process_folder` and `process_images`
+        serve images already processed by the current version of the workflow from it instead of starting an execution
+    :param metadata_cache: optional `MetadataCache` of organizations, workflows and balance. See `invalidate_metadata`
+    :param webhook_receiver: optional `WebhookReceiver` the `"webhook"` completion waits on. The client does not stop
+        a passed-in receiver. Default: a receiver on a free local port, started on first use if the API runs on
+        this machine. A remote API needs a receiver with a `public_url`
+    :param instrumentation: optional `Instrumentation` receiving the timings of every request and of every stage of
+        the processed images. Connection timings are only measured on the session the client creates
     """
 
     def __init__(
             self,
-            organization_id: Optional[Union[str, UUID]] = DEFAULT_ORG_ID,
-            workflow_id: Optional[Union[str, UUID]] = DEFAULT_WORKFLOW_ID,
+            organization_id: Optional[Union[str, UUID]] = None,
+            workflow_id: Optional[Union[str, UUID]] = None,
             api_config: ApiConfig = DEFAULT_API_CONFIG,
             credentials_path: Optional[str] = AR_CREDENTIALS,
             refresh_token: Optional[str] = AR_REFRESH_TOKEN,
             user_agent: str = DEFAULT_USER_AGENT,
             save_credentials: bool = True,
+            session: Optional[requests.Session] = None,
+            pool_size: int = DEFAULT_POOL_SIZE,
+            timeout: Optional[Tuple[float, float]] = DEFAULT_TIMEOUT,
+            poll_schedule: Optional[PollSchedule] = None,
+            runtime_stats: Optional[RuntimeStats] = None,
+            retry_policy: Optional[RetryPolicy] = None,
+            rate_limiter: Optional[TokenBucket] = None,
+            concurrency_controller: Optional[AIMDController] = None,
+            upload_index: Optional[UploadIndex] = None,
+            background_refresh: bool = False,
+            result_cache: Optional[ResultCache] = None,
+            metadata_cache: Optional[MetadataCache] = None,
+            webhook_receiver: Optional["WebhookReceiver"] = None,
+            instrumentation: Optional[Instrumentation] = None,
     ):
         self.api_config = api_config
         self.user_agent = user_agent
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.poll_schedule = poll_schedule or FixedPollSchedule()
+        self.runtime_stats = runtime_stats or RuntimeStats()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.concurrency_controller = concurrency_controller
+        self.upload_index = upload_index
+        self.result_cache = result_cache
+        self.metadata_cache = metadata_cache
+        self.webhook_receiver = webhook_receiver
+        self.instrumentation = instrumentation
+        self._owns_webhook_receiver = False
+        self._webhook_receiver_lock = threading.Lock()
+        self._owns_session = session is None
+        self.session = (
+            session if session is not None
+            else create_session(pool_size, instrumented=instrumentation is not None)
+        )
         self.auth = Authenticator(
-            self, credentials_path, refresh_token, save_credentials
+            self, credentials_path, refresh_token, save_credentials, background_refresh=background_refresh
         )
-        self.organization_id = organization_id
-        self.workflow_id = workflow_id
+        self.organization_id = organization_id if organization_id is not None else default_organization_id()
+        self.workflow_id = workflow_id if workflow_id is not None else default_workflow_id()
 
     @property
     def base_headers(self) -> dict:
@@ -103,8 +303,25 @@ class AutoRetouchAPIClient:
             "Authorization": f"Bearer {self.auth.credentials.access_token}",
         }
 
+    def close(self):
+        """
+        stop refreshing the access token and close the pooled connections and the webhook receiver if they were
+        created by this client
+        """
+        self.auth.stop_background_refresh()
+        if self._owns_webhook_receiver:
+            self.webhook_receiver.stop()
+        if self._owns_session:
+            self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
     def get_api_status(self) -> int:
-        return requests.get(f"{self.api_config.BASE_API_URL}/health").status_code
+        return self._send("GET", f"{self.api_config.BASE_API_URL}/health").status_code
 
     # ****** AUTH ENDPOINTS ******
 
@@ -116,7 +333,7 @@ class AutoRetouchAPIClient:
             "User-Agent": self.user_agent,
             "Content-Type": "application/x-www-form-urlencoded",
         }
-        response = requests.post(url=url, headers=headers, data=payload)
+        response = self._send("POST", url, headers=headers, data=payload)
         logger.debug(f"{url} answered with status {response.status_code}")
         response.raise_for_status()
         logger.info("new device code request was successful")
@@ -134,7 +351,7 @@ class AutoRetouchAPIClient:
             "User-Agent": self.user_agent,
             "Content-Type": "application/x-www-form-urlencoded",
         }
-        response = requests.post(url=url, headers=headers, data=payload)
+        response = self._send("POST", url, headers=headers, data=payload)
         logger.debug(f"{url} answered with status {response.status_code}")
         response.raise_for_status()
         logger.info("successfully obtained new credentials")
@@ -152,7 +369,7 @@ class AutoRetouchAPIClient:
             "User-Agent": self.user_agent,
             "Content-Type": "application/x-www-form-urlencoded",
         }
-        response = requests.post(url=url, headers=headers, data=payload)
+        response = self._send("POST", url, headers=headers, data=payload)
         logger.debug(f"{url} answered with status {response.status_code}")
         response.raise_for_status()
         logger.info("successfully obtained new credentials")
@@ -163,18 +380,14 @@ class AutoRetouchAPIClient:
         url = f"{self.api_config.AUTH_DOMAIN}/oauth/revoke"
         payload = {"client_id": self.api_config.CLIENT_ID, "token": refresh_token}
         headers = {"User-Agent": self.user_agent, "Content-Type": "application/json"}
-        response = requests.post(url=url, headers=headers, data=json.dumps(payload))
+        response = self._send("POST", url, headers=headers, data=json.dumps(payload))
         logger.debug(f"{url} answered with status {response.status_code}")
         response.raise_for_status()
         logger.info("successfully revoked refresh token")
         return response.status_code
 
     def authenticated(self):
-        auth = self.auth
-        if auth.credentials is None:
-            auth.authenticate()
-        elif auth.token_expired:
-            auth.refresh_credentials()
+        self.auth.ensure_authenticated()
 
     def login(self):
         logger.info("logging in...")
@@ -186,6 +399,7 @@ class AutoRetouchAPIClient:
         logger.info("logging out...")
         self.authenticated()
         self.auth.logout()
+        self.invalidate_metadata()
         logger.info("logged out!")
         return self
 
@@ -199,65 +413,87 @@ class AutoRetouchAPIClient:
     # ****** API ******
 
     def get_organizations(self) -> List[Organization]:
+        return list(self.iter_organizations())
+
+    def iter_organizations(self, page_size: int = DEFAULT_PAGE_SIZE, prefetch: int = 0) -> Iterator[Organization]:
+        """lazily list all your organizations, `page_size` per request. See `iter_pages`"""
         logger.info("getting organizations...")
-        self.authenticated()
-        url = f"{self.api_config.BASE_API_URL_CURRENT}/organization?limit=50&offset=0"
-        headers = {**self.base_headers, "Content-Type": "application/json"}
-        response = requests.get(url=url, headers=headers)
-        logger.debug(f"{url} answered with status {response.status_code}")
-        response.raise_for_status()
-        page = Page(**response.json())
-        organizations = [Organization.from_dict(entry) for entry in page.entries]
-        return organizations
+
+        def fetch_page(offset: int, limit: int) -> Page:
+            url = f"{self.api_config.BASE_API_URL_CURRENT}/organization?limit={limit}&offset={offset}"
+            page = Page(**self._get_metadata(f"organizations/{limit}/{offset}", url))
+            page.entries = [Organization.from_dict(entry) for entry in page.entries]
+            return page
+
+        return iter_pages(fetch_page, page_size, prefetch)
 
     def get_organization(self, organization_id: Optional[UUID] = None) -> Organization:
         logger.info("getting organization...")
-        self.authenticated()
         organization_id = self._get_organization_id(organization_id)
         url = f"{self.api_config.BASE_API_URL_CURRENT}/organization/{organization_id}"
-        headers = {**self.base_headers, "Content-Type": "application/json"}
-        response = requests.get(url=url, headers=headers)
-        logger.debug(f"{url} answered with status {response.status_code}")
-        response.raise_for_status()
-        return Organization.from_dict(response.json())
+        return Organization.from_dict(self._get_metadata(f"organization/{organization_id}", url))
 
     def get_workflows(self, organization_id: Optional[UUID] = None) -> List[Workflow]:
+        return list(self.iter_workflows(organization_id))
+
+    def iter_workflows(
+            self,
+            organization_id: Optional[UUID] = None,
+            page_size: int = DEFAULT_PAGE_SIZE,
+            prefetch: int = 0,
+    ) -> Iterator[Workflow]:
+        """lazily list all workflows of an organization, `page_size` per request. See `iter_pages`"""
         logger.info("getting workflows...")
-        self.authenticated()
         organization_id = self._get_organization_id(organization_id)
-        url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow?limit=50&offset=0&organization={organization_id}"
-        headers = {**self.base_headers, "Content-Type": "application/json"}
-        response = requests.get(url=url, headers=headers)
-        logger.debug(f"{url} answered with status {response.status_code}")
-        response.raise_for_status()
-        page = Page(**response.json())
-        workflows = [Workflow.from_dict(entry) for entry in page.entries]
-        return workflows
+
+        def fetch_page(offset: int, limit: int) -> Page:
+            url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow?limit={limit}&offset={offset}&organization={organization_id}"
+            page = Page(**self._get_metadata(f"workflows/{organization_id}/{limit}/{offset}", url))
+            page.entries = [Workflow.from_dict(entry) for entry in page.entries]
+            return page
+
+        return iter_pages(fetch_page, page_size, prefetch)
 
     def get_workflow(self, workflow_id: UUID, organization_id: Optional[UUID] = None, ) -> Workflow:
         logger.info("getting workflow...")
-        self.authenticated()
         organization_id = self._get_organization_id(organization_id)
         url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow/{workflow_id}?organization={organization_id}"
-        response = requests.get(url, headers=self.base_headers)
-        logger.debug(f"{url} answered with status {response.status_code}")
-        response.raise_for_status()
-        return Workflow.from_dict(response.json())
+        return Workflow.from_dict(self._get_metadata(f"workflow/{organization_id}/{workflow_id}", url))
 
     def get_workflow_executions(
-            self, workflow_id: UUID, organization_id: Optional[UUID] = None
+            self,
+            workflow_id: UUID,
+            organization_id: Optional[UUID] = None,
+            limit: int = 50,
+            offset: int = 0,
     ) -> Page:
+        """list one page of the workflow's executions, newest first"""
         logger.info("getting workflow executions...")
         self.authenticated()
         organization_id = self._get_organization_id(organization_id)
-        url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow/execution?workflow={workflow_id}&limit=50&offset=0&organization={organization_id}"
-        response = requests.get(url=url, headers=self.base_headers)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow/execution?workflow={workflow_id}&limit={limit}&offset={offset}&organization={organization_id}"
+        response = self._send("GET", url, headers=self.base_headers)
         logger.debug(f"{url} answered with status {response.status_code}")
         response.raise_for_status()
         page = Page(**response.json())
         page.entries = [WorkflowExecution.from_dict(entry) for entry in page.entries]
         return page
 
+    def iter_workflow_executions(
+            self,
+            workflow_id: UUID,
+            organization_id: Optional[UUID] = None,
+            page_size: int = DEFAULT_PAGE_SIZE,
+            prefetch: int = 0,
+    ) -> Iterator[WorkflowExecution]:
+        """lazily list all executions of the workflow, newest first, `page_size` per request. See `iter_pages`"""
+        organization_id = self._get_organization_id(organization_id)
+        return iter_pages(
+            lambda offset, limit: self.get_workflow_executions(workflow_id, organization_id, limit, offset),
+            page_size,
+            prefetch,
+        )
+
     def upload_image(
             self, image_path: str, organization_id: Optional[UUID] = None
     ) -> str:
@@ -269,7 +505,7 @@ class AutoRetouchAPIClient:
             filename = os.path.basename(file.name)
             mimetype, _ = mimetypes.guess_type(file.name)
             files = [("file", (filename, file, mimetype))]
-            response = requests.post(url=url, headers=self.base_headers, files=files)
+            response = self._send("POST", url, headers=self.base_headers, files=files)
             logger.debug(f"{url} answered with status {response.status_code}")
         response.raise_for_status()
         return response.content.decode(response.encoding)
@@ -279,10 +515,10 @@ class AutoRetouchAPIClient:
         self.authenticated()
         organization_id = self._get_organization_id(organization_id)
         url = f"{self.api_config.BASE_API_URL_CURRENT}/upload?organization={organization_id}"
-        filename = os.path.basename(open_file.name) or "image"
-        mimetype, _ = mimetypes.guess_type(open_file.name)
+        filename = os.path.basename(getattr(open_file, "name", "")) or "image"
+        mimetype, _ = mimetypes.guess_type(filename)
         files = [("file", (filename, open_file, mimetype))]
-        response = requests.post(url=url, headers=self.base_headers, files=files)
+        response = self._send("POST", url, headers=self.base_headers, files=files)
         logger.debug(f"{url} answered with status {response.status_code}")
         response.raise_for_status()
         return response.content.decode(response.encoding)
@@ -302,7 +538,7 @@ class AutoRetouchAPIClient:
             mimetype, _ = mimetypes.guess_type(image_name)
         with BytesIO(image_content) as file:
             files = [("file", (image_name, file, mimetype))]
-            response = requests.post(url=url, headers=self.base_headers, files=files)
+            response = self._send("POST", url, headers=self.base_headers, files=files)
             logger.debug(f"{url} answered with status {response.status_code}")
         response.raise_for_status()
         return response.content.decode(response.encoding)
@@ -316,7 +552,7 @@ class AutoRetouchAPIClient:
         self.authenticated()
         organization_id = self._get_organization_id(organization_id)
         url = f"{self.api_config.BASE_API_URL_CURRENT}/upload?organization={organization_id}"
-        response = requests.post(url=url, headers=self.base_headers, json={"urls": public_accessible_urls})
+        response = self._send("POST", url, headers=self.base_headers, json={"urls": public_accessible_urls})
         response.raise_for_status()
         return response.json()["urls"]
 
@@ -348,7 +584,7 @@ class AutoRetouchAPIClient:
             filename = os.path.basename(file.name)
             mimetype, _ = mimetypes.guess_type(file.name)
             files = [("file", (filename, file, mimetype))]
-            response = requests.post(url=url, headers=self.base_headers, files=files)
+            response = self._send("POST", url, idempotent=False, headers=self.base_headers, files=files)
             logger.debug(f"{url} answered with status {response.status_code}")
         response.raise_for_status()
         return UUID(response.content.decode(response.encoding))
@@ -388,7 +624,7 @@ class AutoRetouchAPIClient:
         if webhooks is not None:
             payload["webhooks"] = webhooks
 
-        response = requests.post(url=url, headers=headers, data=json.dumps(payload))
+        response = self._send("POST", url, idempotent=False, headers=headers, data=json.dumps(payload))
         logger.debug(f"{url} answered with status {response.status_code}")
         response.raise_for_status()
         return UUID(response.content.decode(response.encoding))
@@ -401,24 +637,34 @@ class AutoRetouchAPIClient:
         organization_id = self._get_organization_id(organization_id)
         url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow/execution/{workflow_execution_id}?organization={organization_id}"
         headers = {**self.base_headers, "Content-Type": "application/json"}
-        response = requests.get(url=url, headers=headers)
+        response = self._send("GET", url, headers=headers)
         logger.debug(f"{url} answered with status {response.status_code}")
         response.raise_for_status()
         return WorkflowExecution.from_dict(response.json())
 
-    def get_workflow_execution_status_blocking(
+    def stream_workflow_execution_status(
             self, workflow_execution_id: UUID, organization_id: Optional[UUID] = None
-    ) -> str:
-        logger.info("getting workflow execution status...")
+    ) -> Iterator[ServerSentEvent]:
+        """yield the events of the execution's status stream as soon as the server sends them"""
+        logger.info("streaming workflow execution status...")
         self.authenticated()
         organization_id = self._get_organization_id(organization_id)
         url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow/execution/{workflow_execution_id}/status?organization={organization_id}"
-        headers = {**self.base_headers, "Content-Type": "text/event-stream"}
-        response = requests.get(url=url, headers=headers)
-        logger.debug(f"{url} answered with status {response.status_code}")
-        response.raise_for_status()
-        # TODO: decode event stream format
-        return response.content.decode(response.encoding)
+        headers = {**self.base_headers, "Content-Type": "text/event-stream", "Accept": "text/event-stream"}
+        with self._send("GET", url, headers=headers, stream=True) as response:
+            logger.debug(f"{url} answered with status {response.status_code}")
+            response.raise_for_status()
+            yield from iter_events(response.iter_content(chunk_size=None))
+
+    def get_workflow_execution_status_blocking(
+            self, workflow_execution_id: UUID, organization_id: Optional[UUID] = None
+    ) -> str:
+        """wait for the status stream to end and return the last status it reported"""
+        logger.info("getting workflow execution status...")
+        status = None
+        for event in self.stream_workflow_execution_status(workflow_execution_id, organization_id):
+            status = self._status_from_event(event)
+        return status
 
     def download_image(
             self,
@@ -430,7 +676,7 @@ class AutoRetouchAPIClient:
         self.authenticated()
         organization_id = self._get_organization_id(organization_id)
         url = f"{self.api_config.BASE_API_URL_CURRENT}/image/{image_content_hash}/{image_name}?organization={organization_id}"
-        response = requests.get(url=url, headers=self.base_headers)
+        response = self._send("GET", url, headers=self.base_headers)
         logger.debug(f"{url} answered with status {response.status_code}")
         response.raise_for_status()
         return response.content
@@ -442,7 +688,7 @@ class AutoRetouchAPIClient:
         self.authenticated()
         organization_id = self._get_organization_id(organization_id)
         url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow/execution/{workflow_execution_id}/result/default?organization={organization_id}"
-        response = requests.get(url=url, headers=self.base_headers)
+        response = self._send("GET", url, headers=self.base_headers)
         logger.debug(f"{url} answered with status {response.status_code}")
         response.raise_for_status()
         return response.content
@@ -455,11 +701,61 @@ class AutoRetouchAPIClient:
         assert result_path.startswith("/image/")
         organization_id = self._get_organization_id(organization_id)
         url = f"{self.api_config.BASE_API_URL_CURRENT}{result_path}?organization={organization_id}"
-        response = requests.get(url=url, headers=self.base_headers)
+        response = self._send("GET", url, headers=self.base_headers)
         logger.debug(f"{url} answered with status {response.status_code}")
         response.raise_for_status()
         return response.content
 
+    def download_image_to_file(
+            self,
+            image_content_hash: str,
+            image_name: str,
+            target_path: str,
+            organization_id: Optional[UUID] = None,
+            verify: bool = True,
+    ) -> str:
+        """
+        stream an image to `target_path` without holding it in memory
+
+        :param verify: check that the downloaded bytes match `image_content_hash`. Default: True
+        :return: `target_path`
+        """
+        logger.info("downloading image to file...")
+        self.authenticated()
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/image/{image_content_hash}/{image_name}?organization={organization_id}"
+        return self._download_to_file(url, target_path, image_content_hash if verify else None)
+
+    def download_result_blocking_to_file(
+            self, workflow_execution_id: UUID, target_path: str, organization_id: Optional[UUID] = None
+    ) -> str:
+        """wait for the execution's result and stream it to `target_path`, return `target_path`"""
+        logger.info("downloading result to file (blocking)...")
+        self.authenticated()
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow/execution/{workflow_execution_id}/result/default?organization={organization_id}"
+        return self._download_to_file(url, target_path)
+
+    def download_result_to_file(
+            self,
+            result_path: str,
+            target_path: str,
+            organization_id: Optional[UUID] = None,
+            expected_content_hash: Optional[str] = None,
+    ) -> str:
+        """
+        stream a result to `target_path` without holding it in memory
+
+        :param expected_content_hash: optional `resultContentHash` of the execution to verify the download against
+        :return: `target_path`
+        """
+        logger.info("downloading result to file...")
+        self.authenticated()
+        assert result_path.startswith("/image/")
+        organization_id = self._get_organization_id(organization_id)
+        url = f"{self.api_config.BASE_API_URL_CURRENT}{result_path}?organization={organization_id}"
+        return self._download_to_file(url, target_path, expected_content_hash)
+
     def retry_workflow_execution(
             self, workflow_execution_id: UUID, organization_id: Optional[UUID] = None
     ) -> int:
@@ -468,20 +764,15 @@ class AutoRetouchAPIClient:
         organization_id = self._get_organization_id(organization_id)
         url = f"{self.api_config.BASE_API_URL_CURRENT}/workflow/execution/{workflow_execution_id}/retry?organization={organization_id}"
         headers = {**self.base_headers, "Content-Type": "application/json"}
-        response = requests.post(url=url, headers=headers, data={})
+        response = self._send("POST", url, idempotent=False, headers=headers, data={})
         logger.debug(f"{url} answered with status {response.status_code}")
         return response.status_code
 
     def get_balance(self, organization_id: Optional[UUID] = None) -> int:
         logger.info("getting balance...")
-        self.authenticated()
         organization_id = self._get_organization_id(organization_id)
         url = f"{self.api_config.BASE_API_URL_CURRENT}/organization/balance?organization={organization_id}"
-        headers = {**self.base_headers, "Content-Type": "application/json"}
-        response = requests.get(url=url, headers=headers)
-        logger.debug(f"{url} answered with status {response.status_code}")
-        response.raise_for_status()
-        return response.content
+        return int(self._get_metadata(f"balance/{organization_id}", url, as_json=False))
 
     # ****** HIGH-LEVEL METHODS ******
 
@@ -501,7 +792,7 @@ class AutoRetouchAPIClient:
             "thumbsUp": thumbs_up,
             "expectedImages": expected_images_content_hashes,
         }
-        response = requests.post(url=url, headers=headers, data=json.dumps(payload))
+        response = self._send("POST", url, idempotent=False, headers=headers, data=json.dumps(payload))
         response.raise_for_status()
 
     def process_image(
@@ -509,66 +800,716 @@ class AutoRetouchAPIClient:
             image_path: str,
             output_dir: str,
             workflow_id: Optional[UUID] = None,
-            organization_id: Optional[UUID] = None
+            organization_id: Optional[UUID] = None,
+            completion: str = COMPLETION_POLL,
+            poller: Optional[ExecutionStatusPoller] = None,
+            schedule: Optional[PollSchedule] = None,
+            workflow_version_id: Optional[UUID] = None,
+    ):
+        """
+        upload image, start workflow, download result to `output_dir`
+
+        :param completion: how to wait for the execution: `"poll"` its details, `"stream"` its status events
+            or `"webhook"`: register the `webhook_receiver` on the execution and wait for its callback, checking the
+            status only if none arrives within the receiver's `fallback_interval` or twice the workflow's usual runtime.
+            Default: `"poll"`
+        :param poller: optional running `ExecutionStatusPoller` of the workflow that resolves the execution's
+            status together with other executions. Takes precedence over `completion`
+        :param schedule: the `PollSchedule` when polling. Default: the client's `poll_schedule`
+        :param workflow_version_id: version of the workflow to start the execution with and to look the image up
+            in the `result_cache` for, e.g. resolved once for many images. Default: the current version
+        """
+        controller = self.concurrency_controller
+        if controller is not None:
+            controller.acquire()
+        try:
+            self._process_image(
+                image_path, output_dir, workflow_id, organization_id, completion, poller, schedule, workflow_version_id
+            )
+        finally:
+            if controller is not None:
+                controller.release()
+
+    def _process_image(
+            self,
+            image_path: str,
+            output_dir: str,
+            workflow_id: Optional[UUID],
+            organization_id: Optional[UUID],
+            completion: str,
+            poller: Optional[ExecutionStatusPoller],
+            schedule: Optional[PollSchedule],
+            workflow_version_id: Optional[UUID],
     ):
-        """upload image, start workflow, download result to `output_dir`"""
         organization_id = self._get_organization_id(organization_id)
         workflow_id = self._get_workflow_id(workflow_id)
-        execution_id = self.create_workflow_execution_for_image_file(
-            workflow_id, image_path, organization_id=organization_id
+        output_path = os.path.join(output_dir, os.path.split(image_path)[-1])
+        content_hash = cache_key = None
+        if self.result_cache is not None:
+            content_hash = sha256_file(image_path)
+            workflow_version_id = workflow_version_id or self._cache_workflow_version(workflow_id, organization_id)
+            cache_key = ResultCache.key(content_hash, workflow_id, workflow_version_id)
+            if self.result_cache.get(cache_key, output_path):
+                logger.info(f"{image_path} was already processed by this workflow version, using the cached result")
+                return
+        webhooks = None
+        if completion == COMPLETION_WEBHOOK and poller is None:
+            webhooks = [self._get_webhook_receiver().url]
+        started = monotonic()
+        execution_id = self._create_execution_for_image_file(
+            workflow_id, image_path, organization_id, content_hash, workflow_version_id, webhooks
         )
-        while True:
-            execution = self.get_workflow_execution_details(execution_id)
-            if execution.status in ("COMPLETED", "FAILED"):
-                break
-            else:
-                sleep(2.0)
+        if self.instrumentation is not None:
+            self._emit_stage(image_path, STAGE_UPLOAD, monotonic() - started, execution_id, os.path.getsize(image_path))
+        started = monotonic()
+        execution = self._wait_for_execution(
+            execution_id, workflow_id, organization_id, completion, poller, schedule, webhooks
+        )
+        if self.instrumentation is not None:
+            self._emit_execution_stages(image_path, execution, monotonic() - started)
         if execution.status == "FAILED":
-            raise RuntimeWarning(f"execution failed on server")
+            raise RuntimeWarning("execution failed on server")
+        self.runtime_stats.record(workflow_id, execution_runtime(execution) or monotonic() - started)
 
-        result = self.download_result(execution.resultPath)
-        os.makedirs(output_dir, exist_ok=True)
-        with open(os.path.join(output_dir, os.path.split(image_path)[-1]), "wb") as f:
-            f.write(result)
+        downloading = monotonic()
+        self.download_result_to_file(
+            execution.resultPath,
+            output_path,
+            expected_content_hash=execution.resultContentHash,
+        )
+        if self.instrumentation is not None:
+            self._emit_stage(
+                image_path, STAGE_DOWNLOAD, monotonic() - downloading, execution.id, os.path.getsize(output_path)
+            )
+        if cache_key is not None:
+            self.result_cache.put(cache_key, output_path)
 
     @staticmethod
-    def find_images(image_dir: str) -> List[str]:
-        return [
-            *filter(
-                lambda f: os.path.splitext(f)[-1] in {".jpeg", ".jpg", ".png", ".tif", ".tiff"},
-                os.listdir(image_dir),
-            )
-        ]
+    def find_images(image_dir: str, recursive: bool = False, include: Sequence[str] = (),
+                    exclude: Sequence[str] = ()) -> List[str]:
+        """
+        list the images in `image_dir` as paths relative to it, see `iter_images`
+
+        Hidden files (starting with ".") are not listed, and extensions match case-insensitively.
+        """
+        return list(AutoRetouchAPIClient.iter_images(image_dir, recursive, include, exclude))
+
+    @staticmethod
+    def iter_images(image_dir: str, recursive: bool = False, include: Sequence[str] = (),
+                    exclude: Sequence[str] = ()) -> Iterator[str]:
+        """
+        yield the images in `image_dir` as paths relative to it as they are found, see `scan_images`
+
+        :param recursive: whether to descend into subdirectories. Default: False
+        :param include: if given, only files matching one of these glob patterns are yielded
+        :param exclude: files and directories matching one of these glob patterns are skipped
+        """
+        return scan_images(image_dir, recursive=recursive, include=include, exclude=exclude)
 
     def process_folder(
             self,
             image_dir: str,
             target_dir: str,
             workflow_id: Optional[UUID] = None,
-            organization_id: Optional[UUID] = None
+            organization_id: Optional[UUID] = None,
+            completion: str = COMPLETION_POLL,
+            schedule: Optional[PollSchedule] = None,
+            upload_workers: int = 8,
+            download_workers: int = 8,
+            journal_path: Optional[str] = None,
+            processes: int = 1,
+            recursive: bool = False,
+            include: Sequence[str] = (),
+            exclude: Sequence[str] = (),
+            sync: Optional[str] = None,
+            progress: Optional[Progress] = None,
     ):
-        """apply a workflow to a directory of images and download the results to `target_dir`"""
+        """
+        apply a workflow to a directory of images and download the results to `target_dir`
+
+        Images are processed as soon as they are found. The results mirror the input tree: the result of
+        `image_dir/a/b.jpg` is written to `target_dir/a/b.jpg`.
+
+        :param completion: how to wait for the executions. `"poll"`, `"stream"` or `"webhook"` process every image
+            in its own thread with `process_image`. `"batch"` runs a `BatchPipeline`: separate upload and download
+            pools with one thread resolving all statuses through paged listing requests. Default: `"poll"`
+        :param schedule: the `PollSchedule` when polling. Default: the client's `poll_schedule`
+        :param upload_workers: number of concurrent uploads with `"batch"`. Default: 8
+        :param download_workers: number of concurrent downloads with `"batch"`. Default: 8
+        :param journal_path: optional path of a `JobJournal` recording the progress of every image. Running again
+            with the same journal resumes the run instead of starting over. Implies `"batch"`
+        :param processes: number of worker processes to shard the images across, each running a `"batch"`
+            pipeline with its share of `pool_size`. Default: 1, process the images in this process
+        :param recursive: whether to process the images of subdirectories. Default: False
+        :param include: if given, only images matching one of these glob patterns are processed
+        :param exclude: images and directories matching one of these glob patterns are skipped
+        :param sync: only process images that are new or changed since a previous run into `target_dir`, compared
+            through a `SyncManifest` in `target_dir`: `"name"`, `"mtime"` or `"hash"`. Default: None, process all
+        :param progress: optional `Progress` following the run, e.g. to show its throughput and ETA
+        """
         organization_id = self._get_organization_id(organization_id)
         workflow_id = self._get_workflow_id(workflow_id)
-        image_paths = self.find_images(image_dir)
-        executor = ThreadPoolExecutor(max_workers=min(200, len(image_paths)))
-        futures_to_images = {}
-        for path in image_paths:
-            path = os.path.join(image_dir, path)
-            future = executor.submit(
-                self.process_image, path, target_dir, workflow_id, organization_id
+        image_paths = (
+            os.path.join(image_dir, path)
+            for path in scan_images(
+                image_dir, recursive=recursive, include=include, exclude=exclude, skip_dirs=[target_dir]
+            )
+        )
+        manifest = SyncManifest(image_dir, target_dir, sync) if sync is not None else None
+        # the state of the images in flight when they were submitted, recorded in the manifest once processed
+        fingerprints: Dict[str, Fingerprint] = {}
+        if manifest is not None:
+            image_paths = self._fingerprinted(manifest.filter(image_paths, workflow_id), manifest, fingerprints)
+
+        # the instrumentation the client had before the run, given back once the progress is unsubscribed
+        previous_instrumentation = self.instrumentation
+        if progress is not None:
+            image_paths = progress.follow(image_paths)
+            if self.instrumentation is None:
+                self.instrumentation = Instrumentation()
+            self.instrumentation.subscribe(progress)
+            progress.start()
+
+        def on_result(image_path: str, error: Optional[Union[Exception, str]]):
+            _log_result(image_path, error)
+            if progress is not None:
+                progress.finished(image_path, error)
+            if manifest is not None:
+                fingerprint = fingerprints.pop(image_path, None)
+                if error is None:
+                    manifest.record(image_path, workflow_id, fingerprint)
+
+        try:
+            self._run_folder(
+                image_paths, image_dir, target_dir, workflow_id, organization_id, on_result,
+                completion, schedule, upload_workers, download_workers, journal_path, processes,
+                self._cache_workflow_version(workflow_id, organization_id),
             )
-            futures_to_images[future] = path
-        for future in as_completed(futures_to_images):
-            path = futures_to_images[future]
+        finally:
+            if manifest is not None:
+                manifest.close()
+            if progress is not None:
+                self.instrumentation.unsubscribe(progress)
+                self.instrumentation = previous_instrumentation
+                progress.close()
+
+    @staticmethod
+    def _fingerprinted(
+            image_paths: Iterable[str], manifest: SyncManifest, fingerprints: Dict[str, Fingerprint]
+    ) -> Iterator[str]:
+        for image_path in image_paths:
+            fingerprints[image_path] = manifest.fingerprint(image_path)
+            yield image_path
+
+    def _run_folder(
+            self,
+            image_paths: Iterable[str],
+            image_dir: str,
+            target_dir: str,
+            workflow_id: UUID,
+            organization_id: UUID,
+            on_result: Callable[[str, Optional[Union[Exception, str]]], None],
+            completion: str,
+            schedule: Optional[PollSchedule],
+            upload_workers: int,
+            download_workers: int,
+            journal_path: Optional[str],
+            processes: int,
+            workflow_version_id: Optional[UUID],
+    ):
+        if processes > 1:
+            from autoretouch.api_client.sharding import ShardedRunner
+
+            ShardedRunner(
+                self, workflow_id, organization_id, processes,
+                upload_workers=upload_workers,
+                download_workers=download_workers,
+                on_result=on_result,
+                journal_path=journal_path,
+                workflow_version_id=workflow_version_id,
+            ).run(image_paths, target_dir, image_dir)
+            return
+        if completion == COMPLETION_BATCH or journal_path is not None:
+            journal = JobJournal(journal_path) if journal_path is not None else None
+            try:
+                BatchPipeline(
+                    self, workflow_id, organization_id,
+                    upload_workers=upload_workers,
+                    download_workers=download_workers,
+                    max_in_flight=self.pool_size,
+                    on_result=on_result,
+                    journal=journal,
+                    workflow_version_id=workflow_version_id,
+                ).run(image_paths, target_dir, image_dir)
+            finally:
+                if journal is not None:
+                    journal.close()
+            return
+        # submit images only as fast as threads become free, instead of queueing the whole folder
+        slots = threading.BoundedSemaphore(self.pool_size)
+
+        def report(path: str, future: Future):
+            slots.release()
+            try:
+                on_result(path, future.exception())
+            except Exception as e:
+                logger.error(f"result callback for {path} failed: {e}")
+
+        with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+            for path in image_paths:
+                slots.acquire()
+                output_dir = os.path.join(target_dir, os.path.relpath(os.path.dirname(path), image_dir))
+                future = executor.submit(
+                    self.process_image, path, output_dir, workflow_id, organization_id,
+                    completion=completion, schedule=schedule, workflow_version_id=workflow_version_id,
+                )
+                future.add_done_callback(partial(report, path))
+
+    def process_images(
+            self,
+            images: Iterable[Union[str, bytes, BinaryIO]],
+            workflow_id: Optional[UUID] = None,
+            organization_id: Optional[UUID] = None,
+            output_dir: Optional[str] = None,
+            completion: str = COMPLETION_POLL,
+            schedule: Optional[PollSchedule] = None,
+            max_in_flight: Optional[int] = None,
+    ) -> Iterator[ProcessedImage]:
+        """
+        apply a workflow to images and yield a `ProcessedImage` for each as soon as it is finished
+
+        The images are read from `images` only as fast as they are processed and the records are yielded in the
+        order the images finish, not the order they were passed. A failed image is yielded with its `error`
+        instead of interrupting the others. Closing the generator early stops taking new images.
+
+        :param images: paths, `http(s)://` URLs the server downloads the image from, `bytes` or binary file objects.
+            With a `result_cache`, the results of all but URLs are served from it when possible
+        :param output_dir: optional directory to stream the results to, see `ProcessedImage.result_path`.
+            Default: None, hold each result in memory as `ProcessedImage.result`
+        :param completion: how to wait for the executions: `"poll"`, `"stream"`, `"webhook"` or `"batch"`:
+            resolve all statuses through paged listing requests. Default: `"poll"`
+        :param schedule: the `PollSchedule` when polling. Default: the client's `poll_schedule`
+        :param max_in_flight: maximum number of images processed at the same time. Default: `pool_size`
+        """
+        organization_id = self._get_organization_id(organization_id)
+        workflow_id = self._get_workflow_id(workflow_id)
+        max_in_flight = max_in_flight or self.pool_size
+        workflow_version_id = self._cache_workflow_version(workflow_id, organization_id)
+        poller = None
+        if completion == COMPLETION_BATCH:
+            poller = ExecutionStatusPoller(self, workflow_id, organization_id).start()
+        finished: "queue.Queue[ProcessedImage]" = queue.Queue()
+        executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="autoretouch-image")
+        images = iter(images)
+        # the names given so far, so that inputs with the same file name do not overwrite each other's results
+        names: Set[str] = set()
+        in_flight = index = 0
+
+        def process(record: ProcessedImage):
+            # every record must be handed back, or the generator waits for it forever
             try:
-                future.result()
-                logger.info(f"Processed {path} successfully")
+                self._process_input(
+                    record, workflow_id, organization_id, output_dir, completion, poller, schedule,
+                    workflow_version_id,
+                )
             except Exception as e:
-                logger.error(f"Execution failed for {path}: {e}")
+                logger.error(f"Execution failed for {record.name}: {e}")
+                record.error = e
+            finally:
+                finished.put(record)
+
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and in_flight < max_in_flight:
+                    try:
+                        image = next(images)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    name = _unique_name(_input_name(image, index), index, names)
+                    executor.submit(process, ProcessedImage(input=image, index=index, name=name))
+                    in_flight += 1
+                    index += 1
+                if in_flight == 0:
+                    return
+                record = finished.get()
+                in_flight -= 1
+                yield record
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            if poller is not None:
+                poller.stop()
+
+    def _process_input(
+            self,
+            record: ProcessedImage,
+            workflow_id: UUID,
+            organization_id: UUID,
+            output_dir: Optional[str],
+            completion: str,
+            poller: Optional[ExecutionStatusPoller],
+            schedule: Optional[PollSchedule],
+            workflow_version_id: Optional[UUID],
+    ) -> ProcessedImage:
+        image = record.input
+        controller = self.concurrency_controller
+        if controller is not None:
+            controller.acquire()
+        try:
+            content_hash = cache_key = None
+            if self.result_cache is not None:
+                content_hash = _content_hash_of(image)
+            if content_hash is not None:
+                cache_key = ResultCache.key(content_hash, workflow_id, workflow_version_id)
+                if self._cached_result(record, cache_key, output_dir):
+                    logger.info(f"{record.name} was already processed by this workflow version, using the cached result")
+                    return record
+            webhooks = None
+            if completion == COMPLETION_WEBHOOK and poller is None:
+                webhooks = [self._get_webhook_receiver().url]
+            started = monotonic()
+            execution_id = self._create_execution_for_input(
+                workflow_id, image, record.name, organization_id, webhooks, content_hash, workflow_version_id
+            )
+            record.timings[STAGE_UPLOAD] = monotonic() - started
+            started = monotonic()
+            record.execution = self._wait_for_execution(
+                execution_id, workflow_id, organization_id, completion, poller, schedule, webhooks
+            )
+            waited = monotonic() - started
+            queued, processed = execution_stages(record.execution)
+            if queued is not None:
+                record.timings[STAGE_QUEUE] = queued
+            record.timings[STAGE_PROCESSING] = processed if processed is not None else waited - (queued or 0.0)
+            if self.instrumentation is not None:
+                self._emit_stage(record.name, STAGE_UPLOAD, record.timings[STAGE_UPLOAD], execution_id)
+                self._emit_execution_stages(record.name, record.execution, waited)
+            if record.execution.status == "FAILED":
+                raise RuntimeWarning("execution failed on server")
+            self.runtime_stats.record(workflow_id, execution_runtime(record.execution) or waited)
+
+            started = monotonic()
+            if output_dir is None:
+                record.result = self.download_result(record.execution.resultPath, organization_id)
+                size = len(record.result)
+            else:
+                record.result_path = self.download_result_to_file(
+                    record.execution.resultPath,
+                    os.path.join(output_dir, record.name),
+                    organization_id,
+                    expected_content_hash=record.execution.resultContentHash,
+                )
+                size = os.path.getsize(record.result_path)
+            record.timings[STAGE_DOWNLOAD] = monotonic() - started
+            if self.instrumentation is not None:
+                self._emit_stage(record.name, STAGE_DOWNLOAD, record.timings[STAGE_DOWNLOAD], execution_id, size)
+            if cache_key is not None:
+                if record.result is not None:
+                    self.result_cache.put_content(cache_key, record.result)
+                else:
+                    self.result_cache.put(cache_key, record.result_path)
+        except Exception as e:
+            logger.error(f"Execution failed for {record.name}: {e}")
+            record.error = e
+        finally:
+            if controller is not None:
+                controller.release()
+        return record
+
+    def _create_execution_for_input(
+            self, workflow_id: UUID, image: Union[str, bytes, BinaryIO], name: str, organization_id: UUID,
+            webhooks: Optional[List[str]], content_hash: Optional[str] = None,
+            workflow_version_id: Optional[UUID] = None,
+    ) -> UUID:
+        if isinstance(image, str) and not _is_url(image):
+            return self._create_execution_for_image_file(
+                workflow_id, image, organization_id, content_hash, workflow_version_id, webhooks
+            )
+        if isinstance(image, str):
+            content_hash = self.upload_image_from_urls({name: image}, organization_id)[name]
+        elif isinstance(image, (bytes, bytearray)):
+            content_hash = self.upload_image_from_bytes(bytes(image), name, organization_id=organization_id)
+        else:
+            content_hash = self.upload_image_from_stream(image, organization_id)
+        return self.create_workflow_execution_for_image_reference(
+            workflow_id, content_hash, name, workflow_version_id=workflow_version_id,
+            organization_id=organization_id, webhooks=webhooks,
+        )
+
+    def _cache_workflow_version(self, workflow_id: UUID, organization_id: UUID) -> Optional[UUID]:
+        """
+        the current version of the workflow to key the `result_cache` with, None without a `result_cache`
+
+        Resolve it once per run and start the executions with it, so that their results match the keys even if the
+        workflow changes meanwhile.
+        """
+        if self.result_cache is None:
+            return None
+        return self.get_workflow(workflow_id, organization_id).version
+
+    def _cached_result(self, record: ProcessedImage, cache_key: str, output_dir: Optional[str]) -> bool:
+        if output_dir is None:
+            record.result = self.result_cache.read(cache_key)
+            return record.result is not None
+        output_path = os.path.join(output_dir, record.name)
+        if not self.result_cache.get(cache_key, output_path):
+            return False
+        record.result_path = output_path
+        return True
+
+    def invalidate_metadata(self, *kinds: str):
+        """
+        forget cached metadata, e.g. after changing a workflow
+
+        :param kinds: the kinds of metadata to forget: "organizations", "organization", "workflows", "workflow"
+            or "balance". Default: all
+        """
+        if self.metadata_cache is not None:
+            self.metadata_cache.invalidate(*kinds)
 
     # ****** HELPERS ******
 
+    def _get_metadata(self, key: str, url: str, as_json: bool = True):
+        """GET the JSON (or text) at `url`, through the `metadata_cache` under `key` if there is one"""
+        if self.metadata_cache is not None:
+            value = self.metadata_cache.get(key)
+            if value is not None:
+                return value
+        self.authenticated()
+        headers = {**self.base_headers, "Content-Type": "application/json"}
+        response = self._send("GET", url, headers=headers)
+        logger.debug(f"{url} answered with status {response.status_code}")
+        response.raise_for_status()
+        value = response.json() if as_json else response.text
+        if self.metadata_cache is not None:
+            self.metadata_cache.put(key, value)
+        return value
+
+    def _send(self, method: str, url: str, idempotent: bool = True, **kwargs) -> requests.Response:
+        """send a request through the session, retrying it according to the `retry_policy`"""
+        policy = self.retry_policy
+        # uploaded files are read while sending, they must be rewound before sending them again
+        files = [(f, f.tell()) for _, (_, f, *_) in kwargs.get("files") or [] if hasattr(f, "seek")]
+        kwargs.setdefault("timeout", self.timeout)
+        instrumentation = self.instrumentation
+        controller = self.concurrency_controller
+        if controller is not None:
+            route = f"{method} {route_of(url)}"
+            # the time to send a file grows with its size, not with the load of the server
+            sends_file = bool(kwargs.get("files"))
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            if instrumentation is not None:
+                reset_connection_timings()
+                started_at = time()
+            sent = monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                latency = monotonic() - sent
+                if controller is not None:
+                    controller.record(latency, None, route)
+                retry = attempt + 1 < policy.max_attempts and policy.should_retry_error(e, idempotent)
+                if instrumentation is not None:
+                    instrumentation.emit(instrumentation.request_event(
+                        method, url, attempt, started_at, latency, error=e, will_retry=retry
+                    ))
+                if not retry:
+                    raise
+                delay = policy.delay(attempt)
+                logger.warning(f"{method} {url} failed ({e}), retrying in {delay:.1f}s")
+            else:
+                latency = monotonic() - sent
+                if controller is not None:
+                    # `elapsed` ends with the headers, a large body does not count as latency either
+                    first_byte = response.elapsed.total_seconds()
+                    controller.record(None if sends_file else first_byte, response.status_code, route)
+                retry = (
+                    attempt + 1 < policy.max_attempts
+                    and policy.should_retry_status(response.status_code, idempotent)
+                )
+                if instrumentation is not None:
+                    instrumentation.emit(instrumentation.request_event(
+                        method, url, attempt, started_at, latency, response=response,
+                        streamed=kwargs.get("stream", False), will_retry=retry,
+                    ))
+                if not retry:
+                    return response
+                delay = policy.delay(attempt, response)
+                logger.warning(f"{url} answered with status {response.status_code}, retrying in {delay:.1f}s")
+                response.close()
+            sleep(delay)
+            attempt += 1
+            for f, position in files:
+                f.seek(position)
+
+    def _wait_for_execution(
+            self,
+            execution_id: UUID,
+            workflow_id: UUID,
+            organization_id: UUID,
+            completion: str,
+            poller: Optional[ExecutionStatusPoller],
+            schedule: Optional[PollSchedule],
+            webhooks: Optional[List[str]],
+    ) -> WorkflowExecution:
+        """wait until the execution is COMPLETED or FAILED, retrying it as often as the `retry_policy` allows"""
+        retries = 0
+        while True:
+            if poller is not None:
+                execution = poller.wait(execution_id)
+            elif webhooks is not None:
+                execution = self._wait_for_webhook(execution_id, workflow_id, organization_id)
+            else:
+                streamed = completion == COMPLETION_STREAM and retries == 0
+                if streamed:
+                    self._wait_for_status_stream(execution_id, organization_id)
+                delays = (schedule or self.poll_schedule).delays(self.runtime_stats.median(workflow_id))
+                while True:
+                    # after a finished stream, the first request most likely finds the execution completed
+                    if not streamed:
+                        sleep(next(delays))
+                    streamed = False
+                    execution = self.get_workflow_execution_details(execution_id, organization_id)
+                    if execution.status in ("COMPLETED", "FAILED"):
+                        break
+            if execution.status != "FAILED" or not self._retry_failed_execution(execution_id, organization_id, retries):
+                return execution
+            retries += 1
+
+    def _emit_stage(
+            self, image_path: str, stage: str, duration: float, execution_id: Optional[UUID] = None,
+            size: Optional[int] = None, credits: Optional[int] = None,
+    ):
+        self.instrumentation.emit(StageEvent(image_path, stage, duration, execution_id, size, credits))
+
+    def _emit_execution_stages(self, image_path: str, execution: WorkflowExecution, waited: float):
+        """
+        emit how long the execution waited and was processed on the server, as far as its timestamps tell
+
+        :param waited: seconds the client waited for the execution, the fallback for a missing processing time
+        """
+        queued, processed = execution_stages(execution)
+        if queued is not None:
+            self._emit_stage(image_path, STAGE_QUEUE, queued, execution.id)
+        if processed is None:
+            processed = max(0.0, waited - (queued or 0.0))
+        self._emit_stage(image_path, STAGE_PROCESSING, processed, execution.id, credits=execution.chargedCredits)
+
+    def _retry_failed_execution(self, execution_id: UUID, organization_id: UUID, retries: int) -> bool:
+        """ask the server to run a FAILED execution again, return whether it accepted"""
+        if retries >= self.retry_policy.execution_retries:
+            return False
+        logger.info(f"execution {execution_id} failed, retrying it ({retries + 1}/{self.retry_policy.execution_retries})")
+        return 200 <= self.retry_workflow_execution(execution_id, organization_id) < 300
+
+    def _download_to_file(self, url: str, target_path: str, expected_content_hash: Optional[str] = None) -> str:
+        with self._send("GET", url, headers=self.base_headers, stream=True) as response:
+            logger.debug(f"{url} answered with status {response.status_code}")
+            response.raise_for_status()
+            write_atomically(response.iter_content(DOWNLOAD_CHUNK_SIZE), target_path, expected_content_hash)
+        return target_path
+
+    def _create_execution_for_image_file(
+            self, workflow_id: UUID, image_path: str, organization_id: UUID, content_hash: Optional[str] = None,
+            workflow_version_id: Optional[UUID] = None, webhooks: Optional[List[str]] = None,
+    ) -> UUID:
+        """
+        start an execution, by content hash if the `upload_index` knows the image, else by uploading it
+
+        Only executions of an already uploaded image take `webhooks`: with webhooks, the image is uploaded first.
+        """
+        if self.upload_index is None and webhooks is None:
+            return self.create_workflow_execution_for_image_file(
+                workflow_id, image_path, workflow_version_id=workflow_version_id, organization_id=organization_id
+            )
+        image_name = os.path.basename(image_path)
+        if self.upload_index is not None:
+            content_hash = content_hash or sha256_file(image_path)
+            if self.upload_index.contains(organization_id, content_hash):
+                logger.info(f"{image_path} was already uploaded, skipping upload")
+                try:
+                    return self.create_workflow_execution_for_image_reference(
+                        workflow_id, content_hash, image_name, workflow_version_id=workflow_version_id,
+                        organization_id=organization_id, webhooks=webhooks,
+                    )
+                except requests.HTTPError as e:
+                    if e.response is None or e.response.status_code not in (400, 404, 422):
+                        raise
+                    logger.info(f"server does not know {content_hash} anymore, uploading {image_path} again")
+                    self.upload_index.discard(organization_id, content_hash)
+        if webhooks is None:
+            execution_id = self.create_workflow_execution_for_image_file(
+                workflow_id, image_path, workflow_version_id=workflow_version_id, organization_id=organization_id
+            )
+            # the server stores the file under the same SHA-256
+            self.upload_index.add(organization_id, content_hash)
+            return execution_id
+        content_hash = self.upload_image(image_path, organization_id)
+        if self.upload_index is not None:
+            self.upload_index.add(organization_id, content_hash)
+        return self.create_workflow_execution_for_image_reference(
+            workflow_id, content_hash, image_name, workflow_version_id=workflow_version_id,
+            organization_id=organization_id, webhooks=webhooks,
+        )
+
+    def _get_webhook_receiver(self) -> "WebhookReceiver":
+        from autoretouch.api_client.webhook import WebhookReceiver
+
+        with self._webhook_receiver_lock:
+            if (self.webhook_receiver is None or self.webhook_receiver.public_url is None) \
+                    and not _is_local_url(self.api_config.BASE_API_URL):
+                raise RuntimeError(
+                    f"{self.api_config.BASE_API_URL} cannot post callbacks to a local webhook receiver, "
+                    f"pass a webhook_receiver with the public_url of a tunnel or reverse proxy forwarding to it"
+                )
+            if self.webhook_receiver is None:
+                self.webhook_receiver = WebhookReceiver().start()
+                self._owns_webhook_receiver = True
+            return self.webhook_receiver
+
+    def _wait_for_webhook(self, execution_id: UUID, workflow_id: UUID, organization_id: UUID) -> WorkflowExecution:
+        """wait for the execution's callback, checking its status whenever none arrived for a while"""
+        receiver = self._get_webhook_receiver()
+        # a callback is only missed once the execution should long have finished
+        expected_runtime = self.runtime_stats.median(workflow_id)
+        timeout = max(receiver.fallback_interval, 2 * expected_runtime if expected_runtime is not None else 0.0)
+        while True:
+            payload = receiver.wait(execution_id, timeout)
+            timeout = receiver.fallback_interval
+            execution = None
+            if payload is not None:
+                try:
+                    execution = WorkflowExecution.from_dict(payload)
+                except (TypeError, ValueError, AttributeError):
+                    # a callback without the execution's details only tells that something happened
+                    pass
+            else:
+                logger.debug(f"no webhook of execution {execution_id} yet, checking its status")
+            if execution is None or execution.status not in ("COMPLETED", "FAILED"):
+                execution = self.get_workflow_execution_details(execution_id, organization_id)
+            if execution.status in ("COMPLETED", "FAILED"):
+                return execution
+
+    @staticmethod
+    def _status_from_event(event: ServerSentEvent) -> str:
+        try:
+            return event.json()["status"]
+        except (ValueError, KeyError, TypeError):
+            return event.data.strip()
+
+    def _wait_for_status_stream(self, execution_id: UUID, organization_id: Optional[UUID] = None):
+        """return once the status stream reports a final status or ends, polling then picks up the result"""
+        try:
+            for event in self.stream_workflow_execution_status(execution_id, organization_id):
+                if self._status_from_event(event) in ("COMPLETED", "FAILED"):
+                    return
+        except requests.RequestException as e:
+            logger.warning(f"status stream of {execution_id} failed, falling back to polling: {e}")
+
     def _get_organization_id(self, passed_in_value):
         value = self.organization_id or passed_in_value
         if value is None:
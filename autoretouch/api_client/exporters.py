@@ -0,0 +1,221 @@
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from autoretouch.api_client.instrumentation import Event, RequestEvent, StageEvent, route_of
+
+logger = logging.getLogger("autoretouch-python-client")
+
+__all__ = [
+    "PrometheusExporter",
+    "OpenTelemetryExporter",
+]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class PrometheusExporter:
+    """
+    aggregate the events of an `Instrumentation` into Prometheus metrics
+
+    Subscribe it with `Instrumentation(exporter)`, then scrape :meth:`render` from your own endpoint or serve it
+    at `/metrics` with :meth:`serve`. URLs are reduced to routes, e.g. `/v1/workflow/execution/{id}`.
+
+    :param buckets: upper bounds of the duration histograms in seconds
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def __call__(self, event: Event):
+        if isinstance(event, RequestEvent):
+            self._observe_request(event)
+        elif isinstance(event, StageEvent):
+            labels = (("stage", event.stage),)
+            with self._lock:
+                self._observe("autoretouch_stage_duration_seconds", labels, event.duration)
+                if event.bytes is not None:
+                    self._increment("autoretouch_stage_bytes_total", labels, event.bytes)
+
+    def _observe_request(self, event: RequestEvent):
+        route = (("method", event.method), ("route", route_of(event.url)))
+        status = str(event.status) if event.status is not None else "error"
+        with self._lock:
+            self._increment("autoretouch_requests_total", route + (("status", status),))
+            self._observe("autoretouch_request_duration_seconds", route, event.duration)
+            if event.time_to_first_byte is not None:
+                self._observe("autoretouch_request_time_to_first_byte_seconds", route, event.time_to_first_byte)
+            if event.attempt > 0:
+                self._increment("autoretouch_request_retries_total", route)
+            if event.dns is not None:
+                self._observe("autoretouch_dns_duration_seconds", (), event.dns)
+            if event.connect is not None:
+                self._observe("autoretouch_connect_duration_seconds", (), event.connect)
+            if event.tls is not None:
+                self._observe("autoretouch_tls_handshake_duration_seconds", (), event.tls)
+            self._increment("autoretouch_request_bytes_sent_total", route, event.bytes_sent)
+            if event.bytes_received is not None:
+                self._increment("autoretouch_request_bytes_received_total", route, event.bytes_received)
+
+    def _increment(self, name: str, labels: Labels, value: float = 1):
+        series = self._counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + value
+
+    def _observe(self, name: str, labels: Labels, value: float):
+        series = self._histograms.setdefault(name, {})
+        if labels not in series:
+            series[labels] = _Histogram(self.buckets)
+        series[labels].observe(value)
+
+    def render(self) -> str:
+        """the metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(series.items(), key=lambda item: item[0]):
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        le = labels + (("le", _format_value(bound)),)
+                        lines.append(f"{name}_bucket{_format_labels(le)} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = 0, host: str = "127.0.0.1") -> "PrometheusExporter":
+        """serve the metrics at `http://host:port/metrics` from a background thread"""
+        self._server = ThreadingHTTPServer((host, port), _handler_for(self))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="autoretouch-metrics", daemon=True).start()
+        logger.debug(f"serving metrics at {self.url}")
+        return self
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("the exporter is not serving")
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _handler_for(exporter: PrometheusExporter):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = exporter.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+class OpenTelemetryExporter:
+    """
+    turn the events of an `Instrumentation` into OpenTelemetry spans
+
+    Every request attempt becomes an `HTTP <method>` span and every stage of an image an `autoretouch.<stage>` span,
+    with the measured start and end times. Requires `pip install opentelemetry-api` and a configured SDK to
+    export the spans anywhere.
+
+    :param tracer: the tracer to create the spans with. Default: the global tracer provider's
+    """
+
+    def __init__(self, tracer=None):
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ImportError(
+                "OpenTelemetryExporter requires opentelemetry-api. Install it with `pip install opentelemetry-api`"
+            ) from e
+        self._trace = trace
+        self.tracer = tracer or trace.get_tracer("autoretouch")
+
+    def __call__(self, event: Event):
+        if isinstance(event, RequestEvent):
+            attributes = {
+                "http.request.method": event.method,
+                "url.full": event.url,
+                "http.route": route_of(event.url),
+                "http.request.resend_count": event.attempt,
+                "http.request.body.size": event.bytes_sent,
+            }
+            if event.status is not None:
+                attributes["http.response.status_code"] = event.status
+            if event.bytes_received is not None:
+                attributes["http.response.body.size"] = event.bytes_received
+            for key in ("dns", "connect", "tls", "time_to_first_byte", "transfer"):
+                if getattr(event, key) is not None:
+                    attributes[f"autoretouch.{key}_seconds"] = getattr(event, key)
+            failed = event.error is not None or (event.status is not None and event.status >= 400)
+            self._span(f"HTTP {event.method}", event.started_at, event.duration, attributes, failed, event.error)
+        elif isinstance(event, StageEvent):
+            attributes = {"autoretouch.image_path": event.image_path}
+            if event.execution_id is not None:
+                attributes["autoretouch.execution_id"] = str(event.execution_id)
+            if event.bytes is not None:
+                attributes["autoretouch.bytes"] = event.bytes
+            # stages are reported when they end
+            started_at = time.time() - event.duration
+            self._span(f"autoretouch.{event.stage}", started_at, event.duration, attributes, False, None)
+
+    def _span(self, name: str, started_at: float, duration: float, attributes: dict, failed: bool,
+              description: Optional[str]):
+        start = int(started_at * 1e9)
+        span = self.tracer.start_span(name, kind=self._trace.SpanKind.CLIENT, start_time=start, attributes=attributes)
+        if failed:
+            span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, description))
+        span.end(end_time=start + int(duration * 1e9))
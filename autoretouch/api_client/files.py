@@ -0,0 +1,110 @@
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+__all__ = [
+    "AtomicFile",
+    "write_atomically",
+    "file_lock",
+]
+
+
+class AtomicFile:
+    """
+    a temporary file next to `target_path` that :meth:`commit` fsyncs and renames into place
+
+    `target_path` never holds a partial file: :meth:`discard`, or a content hash mismatch on :meth:`commit`,
+    removes the temporary file and leaves `target_path` untouched.
+
+    :param target_path: the final path of the file
+    :param expected_sha256: optional hex SHA-256 the content is verified against
+    """
+
+    def __init__(self, target_path: str, expected_sha256: Optional[str] = None):
+        self.target_path = target_path
+        self.expected_sha256 = expected_sha256
+        directory = os.path.dirname(os.path.abspath(target_path))
+        os.makedirs(directory, exist_ok=True)
+        self._digest = hashlib.sha256()
+        fd, self._tmp_path = tempfile.mkstemp(
+            dir=directory, prefix=f".{os.path.basename(target_path)}.", suffix=".part"
+        )
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        self._digest.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self) -> str:
+        """move the content to `target_path` and return its hex SHA-256"""
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            content_hash = self._digest.hexdigest()
+            if self.expected_sha256 is not None and content_hash != self.expected_sha256:
+                raise RuntimeError(
+                    f"content hash of {self.target_path} is {content_hash}, expected {self.expected_sha256}"
+                )
+            os.replace(self._tmp_path, self.target_path)
+        except BaseException:
+            self.discard()
+            raise
+        return content_hash
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def write_atomically(chunks: Iterable[bytes], target_path: str, expected_sha256: Optional[str] = None) -> str:
+    """
+    write chunks to `target_path` through an `AtomicFile`
+
+    :param chunks: the content, one chunk at a time
+    :param target_path: the final path of the file
+    :param expected_sha256: optional hex SHA-256 the content is verified against while writing
+    :return: the hex SHA-256 of the written content
+    """
+    file = AtomicFile(target_path, expected_sha256)
+    try:
+        for chunk in chunks:
+            file.write(chunk)
+    except BaseException:
+        file.discard()
+        raise
+    return file.commit()
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """
+    hold an exclusive lock on `path` (created if missing) shared between processes
+
+    the lock is advisory: it only excludes other processes that also lock `path`
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,236 @@
+import logging
+import re
+import socket
+import threading
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Callable, List, Optional, Union
+from urllib.parse import urlparse
+from uuid import UUID
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NameResolutionError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+logger = logging.getLogger("autoretouch-python-client")
+
+__all__ = [
+    "Instrumentation",
+    "InstrumentedHTTPAdapter",
+    "RequestEvent",
+    "StageEvent",
+    "STAGE_UPLOAD",
+    "STAGE_QUEUE",
+    "STAGE_PROCESSING",
+    "STAGE_DOWNLOAD",
+    "route_of",
+]
+
+#: reading the image, uploading it and creating its execution
+STAGE_UPLOAD = "upload"
+#: from the creation of the execution until the server starts processing it
+STAGE_QUEUE = "queue"
+#: from the start to the end of the processing on the server
+STAGE_PROCESSING = "processing"
+#: streaming the result to disk
+STAGE_DOWNLOAD = "download"
+
+
+# ids, content hashes and file names in paths would make one route per image
+_ID_SEGMENT = re.compile(r"^([0-9a-fA-F-]{36}|[0-9a-fA-F]{64})$")
+
+
+def route_of(url: str) -> str:
+    """the path of `url` with ids and the segments following content hashes replaced by placeholders"""
+    segments = urlparse(url).path.split("/")
+    route = []
+    for segment in segments:
+        if route and route[-1] == "{hash}":
+            route.append("{name}")
+        elif _ID_SEGMENT.match(segment):
+            route.append("{hash}" if len(segment) == 64 else "{id}")
+        else:
+            route.append(segment)
+    return "/".join(route)
+
+
+@dataclass
+class RequestEvent:
+    """
+    one attempt of a request
+
+    :param started_at: epoch seconds when the attempt was sent
+    :param duration: seconds until the response was read, or only its headers for streamed responses
+    :param dns: seconds to resolve the host of a new connection, `None` when a pooled connection was reused
+    :param connect: seconds to connect to the resolved host, `None` when a pooled connection was reused
+    :param tls: seconds of the TLS handshake of a new connection
+    :param time_to_first_byte: seconds from sending the request to parsing the response headers
+    :param transfer: seconds reading the response body, `None` for streamed responses
+    :param bytes_received: size of the response body, `None` for streamed responses
+    :param will_retry: whether the request is sent again after this attempt
+    """
+    method: str
+    url: str
+    attempt: int
+    started_at: float
+    duration: float
+    status: Optional[int] = None
+    error: Optional[str] = None
+    dns: Optional[float] = None
+    connect: Optional[float] = None
+    tls: Optional[float] = None
+    time_to_first_byte: Optional[float] = None
+    transfer: Optional[float] = None
+    bytes_sent: int = 0
+    bytes_received: Optional[int] = None
+    will_retry: bool = False
+
+
+@dataclass
+class StageEvent:
+    """
+    one stage of processing an image: `STAGE_UPLOAD`, `STAGE_QUEUE`, `STAGE_PROCESSING` or `STAGE_DOWNLOAD`
+
+    :param bytes: size of the uploaded image or the downloaded result
+    :param credits: credits charged for the execution, on `STAGE_PROCESSING` events
+    """
+    image_path: str
+    stage: str
+    duration: float
+    execution_id: Optional[UUID] = None
+    bytes: Optional[int] = None
+    credits: Optional[int] = None
+
+
+Event = Union[RequestEvent, StageEvent]
+
+
+class Instrumentation:
+    """
+    hand the measurements of a client to listeners, e.g. a `PrometheusExporter` or an `OpenTelemetryExporter`
+
+    Listeners are called with every `RequestEvent` and `StageEvent` from the thread that measured it, so they
+    must be fast and thread-safe. A client without instrumentation measures nothing.
+    """
+
+    def __init__(self, *listeners: Callable[[Event], None]):
+        self.listeners: List[Callable[[Event], None]] = list(listeners)
+
+    def subscribe(self, listener: Callable[[Event], None]) -> Callable[[Event], None]:
+        self.listeners.append(listener)
+        return listener
+
+    def unsubscribe(self, listener: Callable[[Event], None]):
+        self.listeners.remove(listener)
+
+    def emit(self, event: Event):
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"instrumentation listener {listener} failed: {e}")
+
+    def request_event(
+            self,
+            method: str,
+            url: str,
+            attempt: int,
+            started_at: float,
+            duration: float,
+            response: Optional[requests.Response] = None,
+            error: Optional[Exception] = None,
+            streamed: bool = False,
+            will_retry: bool = False,
+    ) -> RequestEvent:
+        """measure an attempt from its response or error and the connection it opened, if any"""
+        dns, connect, tls = (getattr(_connection_timings, key, None) for key in ("dns", "connect", "tls"))
+        reset_connection_timings()
+        event = RequestEvent(
+            method=method, url=url, attempt=attempt, started_at=started_at, duration=duration,
+            error=None if error is None else repr(error), dns=dns, connect=connect, tls=tls, will_retry=will_retry,
+        )
+        request = response.request if response is not None else getattr(error, "request", None)
+        body = getattr(request, "body", None)
+        if isinstance(body, (bytes, str)):
+            event.bytes_sent = len(body)
+        if response is not None:
+            event.status = response.status_code
+            event.time_to_first_byte = response.elapsed.total_seconds()
+            if not streamed:
+                event.transfer = max(0.0, duration - event.time_to_first_byte)
+                event.bytes_received = len(response.content)
+        return event
+
+
+_connection_timings = threading.local()
+
+
+def reset_connection_timings():
+    _connection_timings.dns = _connection_timings.connect = _connection_timings.tls = None
+
+
+def _timed_new_conn(connection: HTTPConnection, new_conn: Callable[[], socket.socket]) -> socket.socket:
+    """
+    open the socket of `connection` with `new_conn`, timing the name resolution apart from connecting
+
+    The host is resolved here and `new_conn` connects to each of its addresses in turn, so that it is only resolved
+    once.
+    """
+    host = connection._dns_host
+    started = perf_counter()
+    try:
+        addresses = socket.getaddrinfo(host.strip("[]"), connection.port, allowed_gai_family(), socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise NameResolutionError(connection.host, connection, e) from e
+    finally:
+        _connection_timings.dns = perf_counter() - started
+    started = perf_counter()
+    try:
+        for index, (*_, address) in enumerate(addresses):
+            connection._dns_host = address[0]
+            try:
+                return new_conn()
+            except NewConnectionError:
+                if index == len(addresses) - 1:
+                    raise
+    finally:
+        connection._dns_host = host
+        _connection_timings.connect = perf_counter() - started
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def _new_conn(self):
+        return _timed_new_conn(self, super()._new_conn)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def _new_conn(self):
+        return _timed_new_conn(self, super()._new_conn)
+
+    def connect(self):
+        started = perf_counter()
+        super().connect()
+        opened = sum(getattr(_connection_timings, key, None) or 0.0 for key in ("dns", "connect"))
+        _connection_timings.tls = perf_counter() - started - opened
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class InstrumentedHTTPAdapter(HTTPAdapter):
+    """`HTTPAdapter` whose new connections record how long resolving, connecting and the TLS handshake took"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from uuid import UUID
+
+__all__ = [
+    "JobJournal",
+    "JournalEntry",
+]
+
+
+@dataclass
+class JournalEntry:
+    image_path: str
+    content_hash: Optional[str] = None
+    execution_id: Optional[UUID] = None
+    status: Optional[str] = None
+    output_path: Optional[str] = None
+    downloaded: bool = False
+
+
+class JobJournal:
+    """
+    on-disk record of the progress of every image of a batch run
+
+    Each image goes through: hashed -> execution created -> final status -> downloaded.
+    Every step is committed to a sqlite file so that an interrupted run can be resumed without
+    creating (and paying for) executions twice. Safe to share between threads.
+
+    :param path: path of the sqlite database, created if missing
+    """
+
+    def __init__(self, path: str):
+        import sqlite3
+
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # the worker processes of a sharded run write concurrently: wait up to 30 seconds for the lock and let
+        # readers go on while one of them writes
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "image_path TEXT PRIMARY KEY, content_hash TEXT, execution_id TEXT, status TEXT, "
+                "output_path TEXT, downloaded INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL)"
+            )
+
+    def get(self, image_path: str) -> Optional[JournalEntry]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT image_path, content_hash, execution_id, status, output_path, downloaded "
+                "FROM jobs WHERE image_path = ?",
+                (os.path.abspath(image_path),),
+            ).fetchone()
+        if row is None:
+            return None
+        return JournalEntry(
+            image_path=row[0],
+            content_hash=row[1],
+            execution_id=UUID(row[2]) if row[2] else None,
+            status=row[3],
+            output_path=row[4],
+            downloaded=bool(row[5]),
+        )
+
+    def record_hash(self, image_path: str, content_hash: str):
+        """start the image over: a new hash invalidates its execution and download"""
+        self._upsert(
+            image_path,
+            "content_hash = excluded.content_hash, execution_id = NULL, status = NULL, downloaded = 0",
+            content_hash=content_hash,
+        )
+
+    def record_execution(self, image_path: str, execution_id: UUID):
+        self._upsert(
+            image_path, "execution_id = excluded.execution_id, status = 'CREATED', downloaded = 0",
+            execution_id=str(execution_id), status="CREATED",
+        )
+
+    def record_status(self, image_path: str, status: str):
+        self._upsert(image_path, "status = excluded.status", status=status)
+
+    def record_downloaded(self, image_path: str, output_path: str):
+        self._upsert(
+            image_path, "output_path = excluded.output_path, downloaded = 1",
+            output_path=output_path, downloaded=1,
+        )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _upsert(self, image_path: str, on_conflict: str, **values):
+        columns = {"image_path": os.path.abspath(image_path), "updated_at": time.time(), **values}
+        placeholders = ", ".join("?" for _ in columns)
+        with self._lock, self._connection:
+            self._connection.execute(
+                f"INSERT INTO jobs ({', '.join(columns)}) VALUES ({placeholders}) "
+                f"ON CONFLICT (image_path) DO UPDATE SET {on_conflict}, updated_at = excluded.updated_at",
+                tuple(columns.values()),
+            )
@@ -0,0 +1,101 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger("autoretouch-python-client")
+
+__all__ = [
+    "MetadataCache",
+]
+
+
+class MetadataCache:
+    """
+    time-to-live cache of the API's metadata: organizations, workflows and balance
+
+    Entries are JSON values under keys like `"workflow/<organization_id>/<workflow_id>"`, whose first segment is
+    their kind. They are kept in memory and, with a `path`, in a sqlite file shared by later runs and processes.
+    Safe to share between threads.
+
+    :param ttl: seconds an entry stays valid. Default: 300
+    :param ttls: optional seconds an entry stays valid per kind. Default: 30 for `"balance"`
+    :param path: optional path of a sqlite database to also keep the entries in, created if missing
+    """
+
+    def __init__(self, ttl: float = 300.0, ttls: Optional[Dict[str, float]] = None, path: Optional[str] = None):
+        self.ttl = ttl
+        self.ttls = {"balance": 30.0} if ttls is None else ttls
+        self.path = path
+        self._entries: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        self._connection: Optional["sqlite3.Connection"] = None
+        if path is not None:
+            import sqlite3
+
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            # shared by the worker processes of a sharded run, see `JobJournal`
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            with self._connection:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                    "expires_at REAL NOT NULL)"
+                )
+
+    def get(self, key: str) -> Optional[Any]:
+        """the value of `key`, `None` if missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._connection is not None:
+                row = self._connection.execute(
+                    "SELECT expires_at, value FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = row[0], json.loads(row[1])
+                    self._entries[key] = entry
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                self._entries.pop(key, None)
+                return None
+        logger.debug(f"{key} served from the metadata cache")
+        return entry[1]
+
+    def put(self, key: str, value: Any):
+        expires_at = time.time() + self.ttls.get(key.split("/")[0], self.ttl)
+        with self._lock:
+            self._entries[key] = expires_at, value
+            if self._connection is not None:
+                with self._connection:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(value), expires_at),
+                    )
+
+    def invalidate(self, *kinds: str):
+        """drop the entries of the given kinds, e.g. `"workflow"`, or all entries if none is given"""
+        with self._lock:
+            if not kinds:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key.split("/")[0] in kinds]:
+                    del self._entries[key]
+            if self._connection is not None:
+                with self._connection:
+                    if not kinds:
+                        self._connection.execute("DELETE FROM entries")
+                    for kind in kinds:
+                        self._connection.execute(
+                            "DELETE FROM entries WHERE key = ? OR key LIKE ?", (kind, f"{kind}/%")
+                        )
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
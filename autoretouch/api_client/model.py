@@ -1,9 +1,10 @@
 import dataclasses
+import json
 from datetime import datetime
-from typing import List, Dict, Optional, Union
+from typing import Any, List, Dict, Optional, Union
 from uuid import UUID
 import inspect
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 @dataclass
@@ -112,3 +113,43 @@ class WorkflowExecution(BaseModel):
     def __post_init__(self):
         for attr in ["id", "workflow", "workflowVersion", "organizationId"]:
             setattr(self, attr, self.to_uuid(getattr(self, attr)))
+
+
+@dataclass
+class ProcessedImage:
+    """
+    the outcome of one image of `process_images`
+
+    :param input: the path, URL, bytes or file object as it was passed
+    :param index: the position of the input among the inputs
+    :param name: the file name the image was uploaded as and its result is written as, numbered by `index` if an
+        earlier input has the same file name
+    :param execution: the finished execution, `None` if it could not be created
+    :param result: the content of the result, unless it was written to a directory
+    :param result_path: the path of the result written to a directory
+    :param timings: seconds spent in each stage: "upload", "queue", "processing" and "download"
+    :param error: why the image failed, `None` if it succeeded
+    """
+    input: Any
+    index: int
+    name: str
+    execution: Optional[WorkflowExecution] = None
+    result: Optional[bytes] = None
+    result_path: Optional[str] = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class ServerSentEvent:
+    data: str
+    event: str = "message"
+    id: Optional[str] = None
+    retry: Optional[int] = None
+
+    def json(self):
+        return json.loads(self.data)
@@ -0,0 +1,111 @@
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import AsyncIterator, Awaitable, Callable, Iterator
+
+from autoretouch.api_client.model import Page
+
+logger = logging.getLogger("autoretouch-python-client")
+
+__all__ = [
+    "iter_pages",
+    "aiter_pages",
+    "DEFAULT_PAGE_SIZE",
+]
+
+DEFAULT_PAGE_SIZE = 50
+
+
+def iter_pages(
+        fetch_page: Callable[[int, int], Page],
+        page_size: int = DEFAULT_PAGE_SIZE,
+        prefetch: int = 0,
+) -> Iterator:
+    """
+    lazily yield the entries of every page of a listing
+
+    The first page tells the total number of entries, the following ones are fetched by offset. At most
+    `1 + prefetch` pages are held in memory, however long the listing. Entries added or removed while paging
+    may shift the following pages, so an entry can be skipped or yielded twice.
+
+    :param fetch_page: returns the page of at most `limit` entries starting at `offset`, called as
+        `fetch_page(offset, limit)`
+    :param page_size: number of entries requested per page. Default: 50
+    :param prefetch: number of following pages fetched concurrently in threads while the current one is consumed.
+        Default: 0
+    """
+    if page_size < 1:
+        raise ValueError(f"page_size must be positive, got {page_size}")
+    first = fetch_page(0, page_size)
+    offsets = iter(range(page_size, first.total, page_size))
+    if prefetch <= 0:
+        yield from first.entries
+        for offset in offsets:
+            page = fetch_page(offset, page_size)
+            if not page.entries:
+                # the listing shrank while paging
+                return
+            yield from page.entries
+        return
+    executor = ThreadPoolExecutor(prefetch, thread_name_prefix="autoretouch-prefetch")
+    pending = deque(executor.submit(fetch_page, offset, page_size) for offset in islice(offsets, prefetch))
+    try:
+        yield from first.entries
+        while pending:
+            future = pending.popleft()
+            offset = next(offsets, None)
+            if offset is not None:
+                pending.append(executor.submit(fetch_page, offset, page_size))
+            page = future.result()
+            if not page.entries:
+                return
+            yield from page.entries
+    finally:
+        # the consumer may stop early: do not fetch the remaining pages
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+async def aiter_pages(
+        fetch_page: Callable[[int, int], Awaitable[Page]],
+        page_size: int = DEFAULT_PAGE_SIZE,
+        prefetch: int = 0,
+) -> AsyncIterator:
+    """
+    like `iter_pages`, for a coroutine `fetch_page`: the prefetched pages are fetched in concurrent tasks
+    """
+    # imported here, importing asyncio takes longer than the rest of the synchronous client's dependencies
+    import asyncio
+
+    if page_size < 1:
+        raise ValueError(f"page_size must be positive, got {page_size}")
+    first = await fetch_page(0, page_size)
+    offsets = iter(range(page_size, first.total, page_size))
+    pending = deque(
+        asyncio.ensure_future(fetch_page(offset, page_size)) for offset in islice(offsets, max(prefetch, 0))
+    )
+    try:
+        for entry in first.entries:
+            yield entry
+        while True:
+            if pending:
+                task = pending.popleft()
+                offset = next(offsets, None)
+                if offset is not None:
+                    pending.append(asyncio.ensure_future(fetch_page(offset, page_size)))
+                page = await task
+            else:
+                offset = next(offsets, None)
+                if offset is None:
+                    return
+                page = await fetch_page(offset, page_size)
+            if not page.entries:
+                # the listing shrank while paging
+                return
+            for entry in page.entries:
+                yield entry
+    finally:
+        for task in pending:
+            task.cancel()
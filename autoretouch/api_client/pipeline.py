@@ -0,0 +1,311 @@
+import logging
+import os
+import queue
+import threading
+from collections import Counter
+from time import monotonic
+from typing import Callable, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from autoretouch.api_client.instrumentation import STAGE_DOWNLOAD, STAGE_UPLOAD
+from autoretouch.api_client.journal import JobJournal
+from autoretouch.api_client.model import WorkflowExecution
+from autoretouch.api_client.poller import ExecutionStatusPoller
+from autoretouch.api_client.result_cache import ResultCache
+from autoretouch.api_client.schedule import execution_runtime
+from autoretouch.api_client.upload_index import sha256_file
+
+logger = logging.getLogger("autoretouch-python-client")
+
+__all__ = [
+    "BatchPipeline",
+]
+
+_DONE = object()
+
+
+def _log_result(image_path: str, error: Optional[Exception]):
+    if error is None:
+        logger.info(f"Processed {image_path} successfully")
+    else:
+        logger.error(f"Execution failed for {image_path}: {error}")
+
+
+class BatchPipeline:
+    """
+    process many images through three separately sized stages connected by queues
+
+    1. `upload_workers` threads start an execution per image (uploading it if needed)
+    2. one `ExecutionStatusPoller` thread waits for all executions at once
+    3. `download_workers` threads stream the results to disk
+
+    At most `max_in_flight` images are between stage 1 and the end of stage 3: uploads block until
+    downloads catch up, and images are only read from the input iterable as fast as they can be uploaded.
+    With a `concurrency_controller` on the client, its adaptive limit further bounds the images in flight.
+
+    With a `journal`, every step is recorded and a later run over the same images resumes: downloaded
+    images are skipped, images with an execution are reattached to it, and only the others are uploaded.
+    With a `result_cache` on the client, the images it holds a result for are not uploaded either.
+
+    :param client: the `AutoRetouchAPIClient` to send requests with
+    :param workflow_id:
+    :param organization_id:
+    :param upload_workers: number of concurrent uploads. Default: 8
+    :param download_workers: number of concurrent downloads. Default: 8
+    :param max_in_flight: maximum number of images started but not yet downloaded. Default: 200
+    :param poll_interval: seconds between two status polling rounds. Default: 2.0
+    :param on_result: called with each image path and `None` or the exception it failed with.
+        Default: log the outcome
+    :param journal: optional `JobJournal` to record progress into and resume from
+    :param execution_timeout: optional seconds after which an execution that did not finish fails, and after
+        which the end of the run stops waiting for images that make no progress. Default: 3600
+    :param workflow_version_id: version of the workflow to start the executions with and to look the images up in
+        the `result_cache` for. Default: the current version, resolved once when the run starts
+    """
+
+    def __init__(
+            self,
+            client: "AutoRetouchAPIClient",
+            workflow_id: UUID,
+            organization_id: Optional[UUID] = None,
+            upload_workers: int = 8,
+            download_workers: int = 8,
+            max_in_flight: int = 200,
+            poll_interval: float = 2.0,
+            on_result: Callable[[str, Optional[Exception]], None] = _log_result,
+            journal: Optional[JobJournal] = None,
+            execution_timeout: Optional[float] = 3600.0,
+            workflow_version_id: Optional[UUID] = None,
+    ):
+        self.client = client
+        self.workflow_id = workflow_id
+        self.organization_id = organization_id
+        self.upload_workers = upload_workers
+        self.download_workers = download_workers
+        self.max_in_flight = max_in_flight
+        self.poll_interval = poll_interval
+        self.on_result = on_result
+        self.journal = journal
+        self.execution_timeout = execution_timeout
+        self.workflow_version_id = workflow_version_id
+
+    def run(self, image_paths: Iterable[str], target_dir: str, input_dir: Optional[str] = None):
+        """
+        process every image of `image_paths` and download its result into `target_dir`
+
+        :param input_dir: optional directory containing the images. Given it, the results mirror the input tree
+            below `target_dir` instead of all being written directly into it
+        """
+        uploads: queue.Queue = queue.Queue(maxsize=2 * self.upload_workers)
+        # unbounded, so that the poller never blocks on slow downloads: it holds at most `max_in_flight` images
+        downloads: queue.Queue = queue.Queue()
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        # images holding a permit of `in_flight` (an image may be given more than once), each is finished once
+        started_images: Counter = Counter()
+        started_lock = threading.Lock()
+        workflow_version_id = self.workflow_version_id or self.client._cache_workflow_version(
+            self.workflow_id, self.client._get_organization_id(self.organization_id)
+        )
+        poller = ExecutionStatusPoller(
+            self.client, self.workflow_id, self.organization_id, interval=self.poll_interval,
+            timeout=self.execution_timeout,
+        ).start()
+
+        controller = self.client.concurrency_controller
+
+        def finish(image_path: str, error: Optional[Exception]):
+            with started_lock:
+                if started_images[image_path] <= 0:
+                    return
+                started_images[image_path] -= 1
+            if controller is not None:
+                controller.release()
+            in_flight.release()
+            report(image_path, error)
+
+        def report(image_path: str, error: Optional[Exception]):
+            try:
+                self.on_result(image_path, error)
+            except Exception as e:
+                logger.error(f"result callback for {image_path} failed: {e}")
+
+        def upload():
+            while True:
+                image_path = uploads.get()
+                if image_path is _DONE:
+                    return
+                if self._already_downloaded(image_path, target_dir, input_dir):
+                    logger.info(f"Skipping {image_path}, its result was already downloaded")
+                    report(image_path, None)
+                    continue
+                in_flight.acquire()
+                if controller is not None:
+                    controller.acquire()
+                with started_lock:
+                    started_images[image_path] += 1
+                started = monotonic()
+                try:
+                    execution_id, execution, cache_key = self._start_or_resume(
+                        image_path, self._output_path(image_path, target_dir, input_dir), workflow_version_id
+                    )
+                except Exception as e:
+                    finish(image_path, e)
+                    continue
+                if execution_id is None:
+                    finish(image_path, None)
+                    continue
+                if self.client.instrumentation is not None:
+                    self.client._emit_stage(
+                        image_path, STAGE_UPLOAD, monotonic() - started, execution_id, os.path.getsize(image_path)
+                    )
+                started = monotonic()
+                if execution is not None:
+                    downloads.put((image_path, execution, started, 0, cache_key))
+                else:
+                    track(image_path, execution_id, started, 0, cache_key)
+
+        def track(image_path: str, execution_id: UUID, started: float, retries: int, cache_key: Optional[str]):
+            poller.track(
+                execution_id,
+                lambda execution: downloads.put((image_path, execution, started, retries, cache_key)),
+                on_error=lambda error: finish(image_path, error),
+            )
+
+        def download():
+            while True:
+                item = downloads.get()
+                if item is _DONE:
+                    return
+                image_path, execution, started, retries, cache_key = item
+                try:
+                    if execution.status == "FAILED" and self.client._retry_failed_execution(
+                            execution.id, self.client._get_organization_id(self.organization_id), retries
+                    ):
+                        track(image_path, execution.id, started, retries + 1, cache_key)
+                        continue
+                    self._download(image_path, execution, started, target_dir, input_dir, cache_key)
+                except Exception as e:
+                    finish(image_path, e)
+                else:
+                    finish(image_path, None)
+
+        upload_threads = self._start(upload, self.upload_workers, "upload")
+        download_threads = self._start(download, self.download_workers, "download")
+        try:
+            for image_path in image_paths:
+                uploads.put(image_path)
+        finally:
+            for _ in upload_threads:
+                uploads.put(_DONE)
+            for thread in upload_threads:
+                thread.join()
+            # every permit is back once the last started image is downloaded
+            drained = all(in_flight.acquire(timeout=self.execution_timeout) for _ in range(self.max_in_flight))
+            poller.stop()
+            if not drained:
+                # the download threads may be stuck on these images, they are daemons and left behind
+                with started_lock:
+                    stuck = list(started_images.elements())
+                logger.error(f"gave up waiting for {len(stuck)} images after {self.execution_timeout} seconds")
+                for image_path in stuck:
+                    finish(image_path, TimeoutError(
+                        f"{image_path} made no progress within {self.execution_timeout} seconds"
+                    ))
+            else:
+                for _ in download_threads:
+                    downloads.put(_DONE)
+                for thread in download_threads:
+                    thread.join()
+
+    @staticmethod
+    def _output_path(image_path: str, target_dir: str, input_dir: Optional[str]) -> str:
+        if input_dir is None:
+            return os.path.join(target_dir, os.path.split(image_path)[-1])
+        return os.path.join(target_dir, os.path.relpath(image_path, input_dir))
+
+    def _already_downloaded(self, image_path: str, target_dir: str, input_dir: Optional[str]) -> bool:
+        if self.journal is None:
+            return False
+        entry = self.journal.get(image_path)
+        return (
+            entry is not None
+            and entry.downloaded
+            and os.path.isfile(self._output_path(image_path, target_dir, input_dir))
+        )
+
+    def _start_or_resume(
+            self, image_path: str, output_path: str, workflow_version_id: Optional[UUID]
+    ) -> Tuple[Optional[UUID], Optional[WorkflowExecution], Optional[str]]:
+        """
+        return the execution of the image, reattaching to the journaled one if possible, and the key to store its
+        result under in the client's `result_cache`
+
+        the execution details are returned as well when the reattached execution is already finished, and no
+        execution at all when the result was served from the `result_cache`
+        """
+        organization_id = self.client._get_organization_id(self.organization_id)
+        result_cache = self.client.result_cache
+        entry = self.journal.get(image_path) if self.journal is not None else None
+        if entry is not None and entry.execution_id is not None and entry.status != "FAILED":
+            logger.info(f"Reattaching {image_path} to execution {entry.execution_id}")
+            execution = self.client.get_workflow_execution_details(entry.execution_id, organization_id)
+            if execution.status in ("COMPLETED", "FAILED"):
+                return execution.id, execution, None
+            return execution.id, None, None
+        content_hash = cache_key = None
+        if self.journal is not None or result_cache is not None:
+            content_hash = sha256_file(image_path)
+        if self.journal is not None:
+            self.journal.record_hash(image_path, content_hash)
+        if result_cache is not None:
+            cache_key = ResultCache.key(content_hash, self.workflow_id, workflow_version_id)
+            if result_cache.get(cache_key, output_path):
+                logger.info(f"{image_path} was already processed by this workflow version, using the cached result")
+                if self.journal is not None:
+                    self.journal.record_downloaded(image_path, output_path)
+                return None, None, None
+        execution_id = self.client._create_execution_for_image_file(
+            self.workflow_id, image_path, organization_id, content_hash, workflow_version_id
+        )
+        if self.journal is not None:
+            self.journal.record_execution(image_path, execution_id)
+        return execution_id, None, cache_key
+
+    def _download(
+            self, image_path: str, execution: WorkflowExecution, started: float, target_dir: str,
+            input_dir: Optional[str], cache_key: Optional[str],
+    ):
+        if self.journal is not None:
+            self.journal.record_status(image_path, execution.status)
+        if self.client.instrumentation is not None:
+            self.client._emit_execution_stages(image_path, execution, monotonic() - started)
+        if execution.status == "FAILED":
+            raise RuntimeWarning("execution failed on server")
+        self.client.runtime_stats.record(
+            self.workflow_id, execution_runtime(execution) or monotonic() - started
+        )
+        output_path = self._output_path(image_path, target_dir, input_dir)
+        downloading = monotonic()
+        self.client.download_result_to_file(
+            execution.resultPath,
+            output_path,
+            self.organization_id,
+            expected_content_hash=execution.resultContentHash,
+        )
+        if self.client.instrumentation is not None:
+            self.client._emit_stage(
+                image_path, STAGE_DOWNLOAD, monotonic() - downloading, execution.id, os.path.getsize(output_path)
+            )
+        if cache_key is not None:
+            self.client.result_cache.put(cache_key, output_path)
+        if self.journal is not None:
+            self.journal.record_downloaded(image_path, output_path)
+
+    @staticmethod
+    def _start(target: Callable, n_threads: int, name: str) -> List[threading.Thread]:
+        threads = [
+            threading.Thread(target=target, name=f"autoretouch-{name}-{i}", daemon=True) for i in range(n_threads)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
@@ -0,0 +1,239 @@
+import logging
+import threading
+from time import monotonic
+from typing import Callable, Dict, Optional, Set
+from uuid import UUID
+
+from autoretouch.api_client.model import WorkflowExecution
+
+logger = logging.getLogger("autoretouch-python-client")
+
+__all__ = [
+    "ExecutionStatusPoller"
+]
+
+_FINAL_STATUSES = ("COMPLETED", "FAILED")
+
+
+class ExecutionStatusPoller:
+    """
+    resolve the status of many executions of one workflow with a few listing requests
+
+    Executions are tracked with :meth:`track` and awaited with :meth:`wait` or a callback. A background
+    thread pages through the workflow's executions (newest first) every `interval` seconds and stops paging
+    once every tracked execution has been seen. Executions missing from the listing are looked up individually.
+
+    An execution fails instead of staying tracked forever once `max_failures` lookups of it failed in a row,
+    or once it was tracked for `timeout` seconds.
+
+    :param client: the `AutoRetouchAPIClient` to send requests with
+    :param workflow_id: the workflow all tracked executions belong to
+    :param organization_id:
+    :param interval: seconds between two polling rounds. Default: 2.0
+    :param page_size: number of executions per listing request. Default: 50
+    :param max_failures: number of consecutive failed lookups after which an execution fails. Default: 5
+    :param timeout: optional seconds after which a tracked execution that did not finish fails. Default: None
+    """
+
+    def __init__(
+            self,
+            client: "AutoRetouchAPIClient",
+            workflow_id: UUID,
+            organization_id: Optional[UUID] = None,
+            interval: float = 2.0,
+            page_size: int = 50,
+            max_failures: int = 5,
+            timeout: Optional[float] = None,
+    ):
+        self.client = client
+        self.workflow_id = workflow_id
+        self.organization_id = organization_id
+        self.interval = interval
+        self.page_size = page_size
+        self.max_failures = max_failures
+        self.timeout = timeout
+        self._pending: Set[UUID] = set()
+        self._done: Dict[UUID, threading.Event] = {}
+        self._results: Dict[UUID, WorkflowExecution] = {}
+        self._errors: Dict[UUID, Exception] = {}
+        self._callbacks: Dict[UUID, Callable[[WorkflowExecution], None]] = {}
+        self._error_callbacks: Dict[UUID, Callable[[Exception], None]] = {}
+        self._tracked_at: Dict[UUID, float] = {}
+        self._failures: Dict[UUID, int] = {}
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "ExecutionStatusPoller":
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="autoretouch-status-poller", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify_all()
+        for event in list(self._done.values()):
+            event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def track(
+            self,
+            execution_id: UUID,
+            callback: Optional[Callable[[WorkflowExecution], None]] = None,
+            on_error: Optional[Callable[[Exception], None]] = None,
+    ):
+        """
+        start resolving the status of an execution
+
+        :param callback: optional function called from the polling thread with the finished execution,
+            instead of handing it to :meth:`wait`. A slow callback delays the next polling round
+        :param on_error: optional function called from the polling thread with the error the execution failed
+            with, see `max_failures` and `timeout`. Default: log it
+        """
+        with self._condition:
+            if execution_id in self._done:
+                return
+            self._done[execution_id] = threading.Event()
+            if callback is not None:
+                self._callbacks[execution_id] = callback
+            if on_error is not None:
+                self._error_callbacks[execution_id] = on_error
+            self._tracked_at[execution_id] = monotonic()
+            self._pending.add(execution_id)
+            self._condition.notify_all()
+
+    def wait(self, execution_id: UUID, timeout: Optional[float] = None) -> WorkflowExecution:
+        """block until the execution reached a final status and return its details"""
+        self.track(execution_id)
+        if not self._done[execution_id].wait(timeout):
+            raise TimeoutError(f"execution {execution_id} did not finish within {timeout} seconds")
+        with self._condition:
+            self._done.pop(execution_id)
+            execution = self._results.pop(execution_id, None)
+            error = self._errors.pop(execution_id, None)
+        if error is not None:
+            raise error
+        if execution is None:
+            raise RuntimeError(f"poller stopped before execution {execution_id} finished")
+        return execution
+
+    def poll_once(self):
+        """resolve all executions that reached a final status since the last round"""
+        with self._condition:
+            unseen = set(self._pending)
+        offset = 0
+        try:
+            while unseen:
+                page = self.client.get_workflow_executions(
+                    self.workflow_id, self.organization_id, limit=self.page_size, offset=offset
+                )
+                for execution in page.entries:
+                    if execution.id in unseen:
+                        unseen.discard(execution.id)
+                        self._failures.pop(execution.id, None)
+                        self._resolve_if_final(execution)
+                offset += len(page.entries)
+                if not page.entries or offset >= page.total:
+                    break
+        except Exception as e:
+            logger.warning(f"listing executions failed: {e}")
+            for execution_id in unseen:
+                self._lookup_failed(execution_id, e)
+            unseen = set()
+        for execution_id in unseen:
+            logger.debug(f"execution {execution_id} missing from listing, getting its details")
+            try:
+                execution = self.client.get_workflow_execution_details(execution_id, self.organization_id)
+            except Exception as e:
+                logger.warning(f"getting execution {execution_id} failed: {e}")
+                self._lookup_failed(execution_id, e)
+                continue
+            self._failures.pop(execution_id, None)
+            self._resolve_if_final(execution)
+        if self.timeout is not None:
+            with self._condition:
+                expired = [
+                    execution_id for execution_id in self._pending
+                    if monotonic() - self._tracked_at[execution_id] > self.timeout
+                ]
+            for execution_id in expired:
+                self._fail(execution_id, TimeoutError(
+                    f"execution {execution_id} did not finish within {self.timeout} seconds"
+                ))
+
+    def _resolve_if_final(self, execution: WorkflowExecution):
+        if execution.status not in _FINAL_STATUSES:
+            return
+        with self._condition:
+            if execution.id not in self._pending:
+                return
+            self._forget(execution.id)
+            callback = self._callbacks.pop(execution.id, None)
+            if callback is None:
+                self._results[execution.id] = execution
+                self._done[execution.id].set()
+            else:
+                self._done.pop(execution.id)
+        if callback is not None:
+            try:
+                callback(execution)
+            except Exception as e:
+                logger.error(f"callback for execution {execution.id} failed: {e}")
+
+    def _lookup_failed(self, execution_id: UUID, error: Exception):
+        failures = self._failures.get(execution_id, 0) + 1
+        self._failures[execution_id] = failures
+        if failures >= self.max_failures:
+            self._fail(execution_id, RuntimeError(
+                f"getting execution {execution_id} failed {failures} times in a row, last with: {error}"
+            ))
+
+    def _fail(self, execution_id: UUID, error: Exception):
+        with self._condition:
+            if execution_id not in self._pending:
+                return
+            on_error = self._error_callbacks.pop(execution_id, None)
+            callback = self._callbacks.pop(execution_id, None)
+            self._forget(execution_id)
+            if callback is None and on_error is None:
+                self._errors[execution_id] = error
+                self._done[execution_id].set()
+            else:
+                self._done.pop(execution_id)
+        if on_error is None:
+            if callback is not None:
+                logger.error(str(error))
+            return
+        try:
+            on_error(error)
+        except Exception as e:
+            logger.error(f"error callback for execution {execution_id} failed: {e}")
+
+    def _forget(self, execution_id: UUID):
+        self._pending.discard(execution_id)
+        self._tracked_at.pop(execution_id, None)
+        self._failures.pop(execution_id, None)
+        self._error_callbacks.pop(execution_id, None)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            with self._condition:
+                while not self._pending and not self._stopped.is_set():
+                    self._condition.wait()
+            if self._stopped.is_set():
+                return
+            try:
+                self.poll_once()
+            except Exception as e:
+                logger.warning(f"polling execution statuses failed: {e}")
+            self._stopped.wait(self.interval)
@@ -0,0 +1,238 @@
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from time import monotonic
+from typing import Callable, Deque, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+from autoretouch.api_client.instrumentation import (
+    Event, StageEvent, STAGE_DOWNLOAD, STAGE_PROCESSING, STAGE_UPLOAD
+)
+
+logger = logging.getLogger("autoretouch-python-client")
+
+__all__ = [
+    "Progress",
+    "ProgressSnapshot",
+]
+
+
+@dataclass
+class ProgressSnapshot:
+    """
+    the state of a run at one moment
+
+    :param found: images handed to the run so far
+    :param total: number of images of the run, `None` while they are still being found
+    :param uploading: images waiting for or in their upload
+    :param processing: images queued or processed on the server
+    :param downloading: images whose result is being downloaded
+    :param credits: credits charged for the finished executions
+    :param images_per_second: finished images per second over the last `window` seconds, or the whole run once
+        it is finished
+    :param eta: seconds until all images are finished at the current rate, `None` while unknown
+    """
+    found: int
+    total: Optional[int]
+    uploading: int
+    processing: int
+    downloading: int
+    completed: int
+    failed: int
+    uploaded_bytes: int
+    downloaded_bytes: int
+    credits: int
+    elapsed: float
+    images_per_second: float
+    upload_bytes_per_second: float
+    download_bytes_per_second: float
+    eta: Optional[float]
+    finished: bool
+
+    @property
+    def done(self) -> int:
+        return self.completed + self.failed
+
+    def summary(self) -> str:
+        """one line describing the snapshot, e.g. for a terminal"""
+        total = self.total if self.total is not None else f"{self.found}+"
+        parts = [
+            f"{self.done}/{total} done" + (f", {self.failed} failed" if self.failed else ""),
+            f"uploading {self.uploading}, processing {self.processing}, downloading {self.downloading}",
+            f"{self.images_per_second:.1f} img/s, up {self.upload_bytes_per_second / 1e6:.1f} MB/s, "
+            f"down {self.download_bytes_per_second / 1e6:.1f} MB/s",
+            f"{self.credits} credits",
+        ]
+        if self.finished:
+            parts.append(f"took {_format_duration(self.elapsed)}")
+        elif self.eta is not None:
+            parts.append(f"ETA {_format_duration(self.eta)}")
+        return " | ".join(parts)
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = int(round(seconds))
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
+
+
+class Progress:
+    """
+    follow a run of `process_folder`: how many images are in which stage, the throughput, credits and ETA
+
+    Pass it to `process_folder(..., progress=progress)`, which reports every image it finds and finishes, and
+    subscribes the progress to the client's `Instrumentation` for the stages in between. Read it with
+    :meth:`snapshot`, iterate :meth:`updates` from another thread, or have `callback` called every `interval`
+    seconds and once at the end of the run.
+
+    :param total: number of images of the run if known beforehand, otherwise it is known once all are found
+    :param callback: optional function called with a `ProgressSnapshot` from a background thread
+    :param interval: seconds between two calls of `callback`. Default: 1
+    :param window: seconds over which the rates are measured. Default: 30
+    """
+
+    def __init__(
+            self,
+            total: Optional[int] = None,
+            callback: Optional[Callable[[ProgressSnapshot], None]] = None,
+            interval: float = 1.0,
+            window: float = 30.0,
+    ):
+        self.total = total
+        self.callback = callback
+        self.interval = interval
+        self.window = window
+        self._lock = threading.Lock()
+        self._stages: Dict[str, str] = {}
+        self._found = self._completed = self._failed = 0
+        self._uploaded_bytes = self._downloaded_bytes = self._credits = 0
+        self._started: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        # (time, done, uploaded bytes, downloaded bytes) over the last `window` seconds
+        self._samples: Deque[Tuple[float, int, int, int]] = deque()
+        self._finished = threading.Event()
+        self._reporter: Optional[threading.Thread] = None
+
+    def start(self) -> "Progress":
+        with self._lock:
+            if self._started is not None:
+                return self
+            self._started = monotonic()
+            self._samples.append((self._started, 0, 0, 0))
+        if self.callback is not None:
+            self._reporter = threading.Thread(target=self._report, name="autoretouch-progress", daemon=True)
+            self._reporter.start()
+        return self
+
+    def found(self, image_path: str):
+        """an image was handed to the run"""
+        with self._lock:
+            self._found += 1
+            self._stages[image_path] = STAGE_UPLOAD
+
+    def all_found(self):
+        """all images were handed to the run"""
+        with self._lock:
+            self.total = self._found
+
+    def follow(self, image_paths: Iterable[str]) -> Iterator[str]:
+        """yield the images of `image_paths`, reporting each as found and, at the end, all as found"""
+        for image_path in image_paths:
+            self.found(image_path)
+            yield image_path
+        self.all_found()
+
+    def finished(self, image_path: str, error: Optional[Union[Exception, str]] = None):
+        """an image was processed, or failed with `error`"""
+        with self._lock:
+            self._stages.pop(image_path, None)
+            if error is None:
+                self._completed += 1
+            else:
+                self._failed += 1
+
+    def __call__(self, event: Event):
+        if not isinstance(event, StageEvent):
+            return
+        with self._lock:
+            # the client may be running other images at the same time
+            if event.image_path not in self._stages:
+                return
+            if event.stage == STAGE_UPLOAD:
+                self._stages[event.image_path] = STAGE_PROCESSING
+                self._uploaded_bytes += event.bytes or 0
+            elif event.stage == STAGE_PROCESSING:
+                self._stages[event.image_path] = STAGE_DOWNLOAD
+                self._credits += event.credits or 0
+            elif event.stage == STAGE_DOWNLOAD:
+                self._downloaded_bytes += event.bytes or 0
+
+    def close(self):
+        """end the run: stop the reports after a last one"""
+        with self._lock:
+            if self._finished_at is None:
+                self._finished_at = monotonic()
+        self._finished.set()
+        if self._reporter is not None:
+            self._reporter.join()
+            self._reporter = None
+
+    def snapshot(self) -> ProgressSnapshot:
+        with self._lock:
+            now = self._finished_at or monotonic()
+            started = self._started if self._started is not None else now
+            done = self._completed + self._failed
+            sample = (now, done, self._uploaded_bytes, self._downloaded_bytes)
+            if self._finished_at is not None or not self._samples:
+                # the rates of a finished run are its averages
+                oldest = (started, 0, 0, 0)
+            else:
+                while len(self._samples) > 1 and self._samples[1][0] <= now - self.window:
+                    self._samples.popleft()
+                oldest = self._samples[0]
+                self._samples.append(sample)
+            seconds = now - oldest[0]
+            images_per_second, up, down = (
+                ((new - old) / seconds if seconds > 0 else 0.0) for new, old in zip(sample[1:], oldest[1:])
+            )
+            stages = list(self._stages.values())
+            eta = None
+            if self.total is not None and images_per_second > 0:
+                eta = max(0, self.total - done) / images_per_second
+            return ProgressSnapshot(
+                found=self._found,
+                total=self.total,
+                uploading=stages.count(STAGE_UPLOAD),
+                processing=stages.count(STAGE_PROCESSING),
+                downloading=stages.count(STAGE_DOWNLOAD),
+                completed=self._completed,
+                failed=self._failed,
+                uploaded_bytes=self._uploaded_bytes,
+                downloaded_bytes=self._downloaded_bytes,
+                credits=self._credits,
+                elapsed=now - started,
+                images_per_second=images_per_second,
+                upload_bytes_per_second=up,
+                download_bytes_per_second=down,
+                eta=eta,
+                finished=self._finished_at is not None,
+            )
+
+    def updates(self, interval: Optional[float] = None) -> Iterator[ProgressSnapshot]:
+        """yield a snapshot every `interval` seconds until the run ends, then a last one"""
+        interval = self.interval if interval is None else interval
+        while not self._finished.wait(interval):
+            yield self.snapshot()
+        yield self.snapshot()
+
+    def _report(self):
+        for snapshot in self.updates():
+            try:
+                self.callback(snapshot)
+            except Exception as e:
+                logger.error(f"progress callback failed: {e}")
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterator, Optional, Union
+from uuid import UUID
+
+from autoretouch.api_client.files import write_atomically
+
+logger = logging.getLogger("autoretouch-python-client")
+
+__all__ = [
+    "ResultCache",
+]
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ResultCache:
+    """
+    size-bounded, content-addressed cache of execution results on disk
+
+    A result is stored under the key of what produced it: the SHA-256 of the input image, the workflow, the
+    workflow version and optional settings. When the cache grows beyond `max_bytes`, the least recently used
+    results are evicted. Safe to share between threads.
+
+    :param directory: directory of the cached results and of their sqlite index, created if missing
+    :param max_bytes: maximum total size of the cached results. Default: 10 GiB
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 10 * 1024 ** 3):
+        import sqlite3
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            os.path.join(directory, "index.sqlite"), timeout=30, check_same_thread=False
+        )
+        # shared by the worker processes of a sharded run, see `JobJournal`
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def key(
+            content_hash: str,
+            workflow_id: Union[str, UUID],
+            workflow_version_id: Union[str, UUID],
+            settings: Optional[Dict] = None,
+    ) -> str:
+        """the cache key of the result of an image processed by a workflow version with some settings"""
+        identity = [content_hash, str(workflow_id), str(workflow_version_id), settings or {}]
+        return hashlib.sha256(json.dumps(identity, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key: str, target_path: str) -> bool:
+        """write the cached result of `key` to `target_path`, return whether there was one"""
+        with self._lock:
+            row = self._connection.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return False
+        try:
+            write_atomically(self._read(key), target_path)
+        except FileNotFoundError:
+            # removed behind the index' back
+            self._forget(key)
+            return False
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return True
+
+    def read(self, key: str) -> Optional[bytes]:
+        """the cached result of `key`, `None` if there is none"""
+        with self._lock:
+            row = self._connection.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        try:
+            content = b"".join(self._read(key))
+        except FileNotFoundError:
+            self._forget(key)
+            return None
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return content
+
+    def put(self, key: str, source_path: str):
+        """store a copy of the result at `source_path` under `key`, evicting old results if needed"""
+        size = os.path.getsize(source_path)
+        if size > self.max_bytes:
+            return
+        with open(source_path, "rb") as f:
+            write_atomically(iter(lambda: f.read(CHUNK_SIZE), b""), self._object_path(key))
+        self._add(key, size)
+
+    def put_content(self, key: str, content: bytes):
+        """store the result `content` under `key`, evicting old results if needed"""
+        if len(content) > self.max_bytes:
+            return
+        write_atomically([content], self._object_path(key))
+        self._add(key, len(content))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _add(self, key: str, size: int):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO results (key, size, last_used) VALUES (?, ?, ?)", (key, size, time.time())
+            )
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            evicted = []
+            for key, size in self._connection.execute("SELECT key, size FROM results ORDER BY last_used"):
+                if total <= self.max_bytes:
+                    break
+                evicted.append(key)
+                total -= size
+            with self._connection:
+                self._connection.executemany("DELETE FROM results WHERE key = ?", [(key,) for key in evicted])
+        for key in evicted:
+            logger.debug(f"evicting {key} from the result cache")
+            self._remove_object(key)
+
+    def _forget(self, key: str):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM results WHERE key = ?", (key,))
+
+    def _read(self, key: str) -> Iterator[bytes]:
+        with open(self._object_path(key), "rb") as f:
+            yield from iter(lambda: f.read(CHUNK_SIZE), b"")
+
+    def _remove_object(self, key: str):
+        try:
+            os.remove(self._object_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _object_path(self, key: str) -> str:
+        return os.path.join(self.directory, "objects", key[:2], key)
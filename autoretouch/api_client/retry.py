@@ -0,0 +1,93 @@
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional, Tuple
+
+import requests
+
+__all__ = [
+    "RetryPolicy",
+]
+
+
+class RetryPolicy:
+    """
+    decide whether and when a failed request is sent again
+
+    Idempotent requests (reads, content-addressed uploads, auth) are retried on connection errors,
+    timeouts and `retry_statuses`. Other requests, like creating an execution, are only retried when the
+    server cannot have acted on them: the connection could not be established, or it answered 429 or 503.
+
+    :param max_attempts: maximum number of times a request is sent. Default: 4
+    :param backoff: base of the exponential backoff in seconds. Default: 0.5
+    :param cap: maximum backoff in seconds. Default: 30.0
+    :param max_retry_after: maximum seconds to wait when the server asks for it with `Retry-After`. Default: 120.0
+    :param retry_statuses: status codes an idempotent request is retried on. Default: 429, 500, 502, 503, 504
+    :param execution_retries: how often a FAILED execution is retried on the server by the high-level
+        methods. Default: 1
+    """
+
+    #: statuses telling that the request was rejected before being processed
+    REJECTED_STATUSES = (429, 503)
+
+    def __init__(
+            self,
+            max_attempts: int = 4,
+            backoff: float = 0.5,
+            cap: float = 30.0,
+            retry_statuses: Tuple[int, ...] = (429, 500, 502, 503, 504),
+            execution_retries: int = 1,
+            max_retry_after: float = 120.0,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.cap = cap
+        self.retry_statuses = retry_statuses
+        self.execution_retries = execution_retries
+        self.max_retry_after = max_retry_after
+
+    def should_retry_status(self, status_code: int, idempotent: bool) -> bool:
+        if idempotent:
+            return status_code in self.retry_statuses
+        return status_code in self.REJECTED_STATUSES
+
+    def should_retry_error(self, error: requests.RequestException, idempotent: bool) -> bool:
+        if isinstance(error, requests.ConnectTimeout):
+            return self.should_retry_failure(False, idempotent)
+        if isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)):
+            return self.should_retry_failure(True, idempotent)
+        return False
+
+    def should_retry_failure(self, sent: bool, idempotent: bool) -> bool:
+        """
+        whether to send again a request that failed without response, whatever the HTTP library
+
+        :param sent: whether the request may have reached the server, i.e. the connection was established
+        """
+        return idempotent or not sent
+
+    def delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """
+        seconds to wait before sending attempt `attempt + 1`, the `Retry-After` header (up to `max_retry_after`)
+        takes precedence. `response` may also be an `aiohttp.ClientResponse`
+        """
+        retry_after = _parse_retry_after(response.headers.get("Retry-After")) if response is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return random.uniform(0, min(self.cap, self.backoff * 2 ** attempt))
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
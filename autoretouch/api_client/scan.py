@@ -0,0 +1,76 @@
+import fnmatch
+import logging
+import os
+from typing import Iterable, Iterator, Sequence
+
+logger = logging.getLogger("autoretouch-python-client")
+
+__all__ = [
+    "IMAGE_EXTENSIONS",
+    "scan_images",
+]
+
+IMAGE_EXTENSIONS = (".jpeg", ".jpg", ".png", ".tif", ".tiff")
+
+
+def scan_images(
+        image_dir: str,
+        recursive: bool = True,
+        include: Sequence[str] = (),
+        exclude: Sequence[str] = (),
+        extensions: Iterable[str] = IMAGE_EXTENSIONS,
+        skip_dirs: Iterable[str] = (),
+) -> Iterator[str]:
+    """
+    yield the images below `image_dir` as they are found, as paths relative to `image_dir`
+
+    Directories are read one entry at a time with `os.scandir`, so the first image is yielded right away and
+    memory does not grow with the number of files. Hidden files and directories (starting with ".") are skipped,
+    symbolic links to directories are not followed.
+
+    Extensions and glob patterns match case-insensitively, against the relative path (with "/" separators) or
+    the name of an entry, e.g. `"*.png"`, `"raw/*"` or `"*_thumb.*"`.
+
+    :param image_dir: the directory to scan
+    :param recursive: whether to descend into subdirectories. Default: True
+    :param include: if given, only files matching one of these patterns are yielded
+    :param exclude: files and directories matching one of these patterns are skipped
+    :param extensions: the extensions of image files. Default: `IMAGE_EXTENSIONS`
+    :param skip_dirs: directories not to descend into, e.g. the output directory when it is inside `image_dir`
+    """
+    extensions = tuple(extension.lower() for extension in extensions)
+    include = [pattern.lower() for pattern in include]
+    exclude = [pattern.lower() for pattern in exclude]
+    skip_dirs = {os.path.normcase(os.path.abspath(directory)) for directory in skip_dirs}
+    pending = [""]
+    while pending:
+        relative_dir = pending.pop()
+        try:
+            entries = os.scandir(os.path.join(image_dir, relative_dir))
+        except OSError as e:
+            if not relative_dir:
+                raise
+            # e.g. a subdirectory removed or made unreadable while scanning
+            logger.warning(f"skipping {relative_dir}: {e}")
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+                if _matches(relative_path, entry.name, exclude):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and os.path.normcase(os.path.abspath(entry.path)) not in skip_dirs:
+                        pending.append(relative_path)
+                elif (
+                        entry.is_file()
+                        and entry.name.lower().endswith(extensions)
+                        and (not include or _matches(relative_path, entry.name, include))
+                ):
+                    yield relative_path.replace("/", os.sep)
+
+
+def _matches(relative_path: str, name: str, patterns: Sequence[str]) -> bool:
+    relative_path, name = relative_path.lower(), name.lower()
+    return any(fnmatch.fnmatchcase(relative_path, p) or fnmatch.fnmatchcase(name, p) for p in patterns)
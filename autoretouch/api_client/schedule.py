@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import random
+import statistics
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Iterator, Optional, Tuple
+from uuid import UUID
+
+from autoretouch.api_client.model import WorkflowExecution
+
+logger = logging.getLogger("autoretouch-python-client")
+
+__all__ = [
+    "PollSchedule",
+    "FixedPollSchedule",
+    "BackoffPollSchedule",
+    "RuntimeStats",
+    "execution_stages",
+    "execution_runtime",
+]
+
+
+class PollSchedule(ABC):
+    """strategy for the delays between the status requests of one execution"""
+
+    @abstractmethod
+    def delays(self, expected_runtime: Optional[float] = None) -> Iterator[float]:
+        """
+        yield the seconds to wait before each status request
+
+        :param expected_runtime: seconds executions of the workflow usually take, if known
+        """
+
+
+class FixedPollSchedule(PollSchedule):
+    """wait `interval` seconds before every status request"""
+
+    def __init__(self, interval: float = 2.0):
+        self.interval = interval
+
+    def delays(self, expected_runtime: Optional[float] = None) -> Iterator[float]:
+        while True:
+            yield self.interval
+
+
+class BackoffPollSchedule(PollSchedule):
+    """
+    wait for the expected runtime, then back off exponentially with full jitter
+
+    :param initial: first delay when the expected runtime is unknown and base of the backoff. Default: 1.0
+    :param factor: growth of the backoff per request. Default: 2.0
+    :param cap: maximum delay. Default: 30.0
+    :param jitter: draw every backoff delay uniformly from [0, delay] so that parallel polls spread out. Default: True
+    """
+
+    def __init__(self, initial: float = 1.0, factor: float = 2.0, cap: float = 30.0, jitter: bool = True):
+        self.initial = initial
+        self.factor = factor
+        self.cap = cap
+        self.jitter = jitter
+
+    def delays(self, expected_runtime: Optional[float] = None) -> Iterator[float]:
+        first = min(self.cap, expected_runtime if expected_runtime is not None else self.initial)
+        yield first * random.uniform(0.9, 1.1) if self.jitter else first
+        attempt = 0
+        while True:
+            delay = min(self.cap, self.initial * self.factor ** attempt)
+            yield random.uniform(0, delay) if self.jitter else delay
+            attempt += 1
+
+
+class RuntimeStats:
+    """
+    thread-safe record of the latest execution runtimes per workflow
+
+    :param window: number of runtimes kept per workflow. Default: 100
+    """
+
+    def __init__(self, window: int = 100):
+        self.window = window
+        self._runtimes: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, workflow_id: UUID, runtime: float):
+        with self._lock:
+            self._runtimes.setdefault(str(workflow_id), deque(maxlen=self.window)).append(runtime)
+
+    def median(self, workflow_id: UUID) -> Optional[float]:
+        with self._lock:
+            runtimes = self._runtimes.get(str(workflow_id))
+            return statistics.median(runtimes) if runtimes else None
+
+    def save(self, path: str):
+        with self._lock:
+            content = {k: list(v) for k, v in self._runtimes.items()}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(content, f)
+
+    @classmethod
+    def load(cls, path: str, window: int = 100) -> "RuntimeStats":
+        stats = cls(window)
+        if os.path.isfile(path):
+            with open(path, "r") as f:
+                for workflow_id, runtimes in json.load(f).items():
+                    stats._runtimes[workflow_id] = deque(runtimes, maxlen=window)
+        return stats
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def execution_runtime(execution: WorkflowExecution) -> Optional[float]:
+    """seconds between the creation and the end of an execution according to the server, if known"""
+    created, finished = _parse_timestamp(execution.createdAt), _parse_timestamp(execution.finishedAt)
+    if created is None or finished is None:
+        return None
+    return (finished - created).total_seconds()
+
+
+def execution_stages(execution: WorkflowExecution) -> Tuple[Optional[float], Optional[float]]:
+    """seconds the execution waited on the server before it started and seconds it was processed, if known"""
+    created, started, finished = (
+        _parse_timestamp(execution.createdAt),
+        _parse_timestamp(execution.startedAt),
+        _parse_timestamp(execution.finishedAt),
+    )
+    queued = (started - created).total_seconds() if created and started else None
+    processed = (finished - started).total_seconds() if started and finished else None
+    return queued, processed
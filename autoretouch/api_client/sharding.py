@@ -0,0 +1,363 @@
+import logging
+import multiprocessing
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+
+from autoretouch.api_client.instrumentation import Instrumentation
+from autoretouch.api_client.journal import JobJournal
+from autoretouch.api_client.metadata_cache import MetadataCache
+from autoretouch.api_client.model import Credentials
+from autoretouch.api_client.pipeline import BatchPipeline, _log_result
+from autoretouch.api_client.result_cache import ResultCache
+from autoretouch.api_client.throttle import AIMDController, TokenBucket
+from autoretouch.api_client.upload_index import UploadIndex
+
+logger = logging.getLogger("autoretouch-python-client")
+
+__all__ = [
+    "ShardedRunner",
+    "ShardedRunSummary",
+]
+
+
+@dataclass
+class ShardedRunSummary:
+    succeeded: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class _Shard:
+    """everything a worker process needs to build its own client, sent to it pickled"""
+    index: int
+    images: "multiprocessing.Queue"
+    target_dir: str
+    input_dir: Optional[str]
+    workflow_id: UUID
+    organization_id: UUID
+    client_kwargs: dict
+    # the factory and arguments of each cache and limiter of the client, recreated in the worker
+    helpers: Dict[str, Tuple[Callable[..., Any], tuple]]
+    # where the worker sends its `Instrumentation` events to, if the client has one
+    events: Optional["multiprocessing.Queue"]
+    credentials: Optional[Credentials]
+    upload_workers: int
+    download_workers: int
+    poll_interval: float
+    journal_path: Optional[str]
+    workflow_version_id: Optional[UUID]
+
+
+class ShardedRunner:
+    """
+    process many images in several worker processes, each running a `BatchPipeline` over its shard
+
+    Hashing, multipart encoding and writing results are CPU-bound in Python; with `processes` workers they
+    run on as many cores. The images are dealt round-robin to the workers as they are read from the input
+    iterable, only as fast as the workers take them. Workers start with the parent's
+    credentials and, when sharing a `credentials_path`, refresh them once for all processes.
+    The outcome of every image is sent back to the parent, which calls `on_result` with it.
+
+    The workers open the client's `upload_index`, `result_cache` and `metadata_cache` from the same files, and
+    split its `rate_limiter` and `concurrency_controller` limits between them. The events of their requests and
+    stages are handed to the client's `instrumentation` in the parent.
+
+    :param client: the `AutoRetouchAPIClient` whose settings the workers' clients are created with
+    :param workflow_id:
+    :param organization_id:
+    :param processes: number of worker processes
+    :param upload_workers: number of concurrent uploads per process. Default: 8
+    :param download_workers: number of concurrent downloads per process. Default: 8
+    :param poll_interval: seconds between two status polling rounds of each process. Default: 2.0
+    :param on_result: called in the parent with each image path and `None` or the error message it failed with.
+        Default: log the outcome
+    :param journal_path: optional path of a `JobJournal` shared by all processes
+    :param workflow_version_id: version of the workflow to start the executions with and to look the images up in
+        the `result_cache` for. Default: the current version, resolved once when the run starts
+    """
+
+    def __init__(
+            self,
+            client: "AutoRetouchAPIClient",
+            workflow_id: UUID,
+            organization_id: UUID,
+            processes: int,
+            upload_workers: int = 8,
+            download_workers: int = 8,
+            poll_interval: float = 2.0,
+            on_result: Callable[[str, Optional[str]], None] = _log_result,
+            journal_path: Optional[str] = None,
+            workflow_version_id: Optional[UUID] = None,
+    ):
+        self.client = client
+        self.workflow_id = workflow_id
+        self.organization_id = organization_id
+        self.processes = processes
+        self.upload_workers = upload_workers
+        self.download_workers = download_workers
+        self.poll_interval = poll_interval
+        self.on_result = on_result
+        self.journal_path = journal_path
+        self.workflow_version_id = workflow_version_id
+
+    def run(self, image_paths: Iterable[str], target_dir: str, input_dir: Optional[str] = None) -> ShardedRunSummary:
+        """
+        process `image_paths` and download their results into `target_dir`, return the outcome of every image
+
+        :param input_dir: optional directory containing the images, to mirror the input tree below `target_dir`
+        """
+        client = self.client
+        # authenticate once here instead of once per worker
+        client.authenticated()
+        processes = max(1, self.processes)
+        # resolved here instead of once per worker
+        workflow_version_id = self.workflow_version_id or client._cache_workflow_version(
+            self.workflow_id, self.organization_id
+        )
+        client_kwargs = dict(
+            api_config=client.api_config,
+            credentials_path=client.auth.credentials_path,
+            refresh_token=client.auth.refresh_token,
+            user_agent=client.user_agent,
+            save_credentials=client.auth.save_credentials,
+            pool_size=max(1, client.pool_size // processes),
+            timeout=client.timeout,
+            poll_schedule=client.poll_schedule,
+            retry_policy=client.retry_policy,
+        )
+        helpers = _helper_factories(client, processes)
+        # spawn: forking a parent with running threads and open connections is not safe
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        events = context.Queue() if client.instrumentation is not None else None
+        workers: Dict[int, _Worker] = {}
+        for index in range(processes):
+            shard = _Shard(
+                index=index,
+                images=context.Queue(maxsize=2 * self.upload_workers),
+                target_dir=target_dir,
+                input_dir=input_dir,
+                workflow_id=self.workflow_id,
+                organization_id=self.organization_id,
+                client_kwargs=client_kwargs,
+                helpers=helpers,
+                events=events,
+                credentials=client.auth.credentials,
+                upload_workers=self.upload_workers,
+                download_workers=self.download_workers,
+                poll_interval=self.poll_interval,
+                journal_path=self.journal_path,
+                workflow_version_id=workflow_version_id,
+            )
+            process = context.Process(
+                target=_run_shard, args=(shard, results), name=f"autoretouch-shard-{index}", daemon=True
+            )
+            process.start()
+            workers[index] = _Worker(process, shard.images)
+
+        if events is not None:
+            forwarder = threading.Thread(
+                target=_forward_events, args=(events, client.instrumentation),
+                name="autoretouch-shard-events", daemon=True,
+            )
+            forwarder.start()
+        summary = ShardedRunSummary()
+        lock = threading.Lock()
+        errors: List[Exception] = []
+        dealer = threading.Thread(
+            target=self._deal, args=(image_paths, workers, lock, summary, errors),
+            name="autoretouch-shard-dealer", daemon=True,
+        )
+        dealer.start()
+        while True:
+            with lock:
+                if not workers:
+                    break
+            try:
+                index, image_path, error = results.get(timeout=0.5)
+            except queue.Empty:
+                with lock:
+                    dead = [index for index, worker in workers.items() if not worker.process.is_alive()]
+                if dead:
+                    self._drain(results, workers, lock, summary)
+                    for index in dead:
+                        self._retire(index, workers, lock, summary)
+                continue
+            self._report(index, image_path, error, workers, lock, summary)
+        dealer.join()
+        if events is not None:
+            # the workers have exited, all their events are queued
+            events.put(None)
+            forwarder.join()
+        if errors:
+            raise errors[0]
+        logger.info(f"{len(summary.succeeded)} images processed, {len(summary.failed)} failed")
+        return summary
+
+    def _deal(self, image_paths: Iterable[str], workers: Dict[int, "_Worker"], lock: threading.Lock,
+              summary: ShardedRunSummary, errors: List[Exception]):
+        """hand the images round-robin to the living workers as fast as they take them, then tell them to finish"""
+        try:
+            for position, image_path in enumerate(image_paths):
+                if not self._hand_over(image_path, position, workers, lock):
+                    self._fail(image_path, "no worker process left", summary)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            with lock:
+                remaining = list(workers.values())
+            for worker in remaining:
+                self._put(worker, None)
+
+    def _hand_over(self, image_path: str, position: int, workers: Dict[int, "_Worker"], lock: threading.Lock) -> bool:
+        while True:
+            with lock:
+                if not workers:
+                    return False
+                indices = sorted(workers)
+                index = indices[position % len(indices)]
+                worker = workers[index]
+                worker.pending.add(image_path)
+            if self._put(worker, image_path):
+                return True
+            with lock:
+                if workers.get(index) is not worker:
+                    # the main loop retired the dead worker and failed its pending images, this one included
+                    return True
+                worker.pending.discard(image_path)
+            position += 1
+
+    @staticmethod
+    def _put(worker: "_Worker", item: Optional[str]) -> bool:
+        while worker.process.is_alive():
+            try:
+                worker.images.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _report(self, index: int, image_path: Optional[str], error: Optional[str], workers: Dict[int, "_Worker"],
+                lock: threading.Lock, summary: ShardedRunSummary):
+        if image_path is None:
+            # the shard is done
+            self._retire(index, workers, lock, summary)
+            return
+        with lock:
+            if index in workers:
+                workers[index].pending.discard(image_path)
+        if error is None:
+            self._succeed(image_path, summary)
+        else:
+            self._fail(image_path, error, summary)
+
+    def _drain(self, results, workers: Dict[int, "_Worker"], lock: threading.Lock, summary: ShardedRunSummary):
+        while True:
+            try:
+                index, image_path, error = results.get(timeout=0.1)
+            except queue.Empty:
+                return
+            self._report(index, image_path, error, workers, lock, summary)
+
+    def _retire(self, index: int, workers: Dict[int, "_Worker"], lock: threading.Lock, summary: ShardedRunSummary):
+        with lock:
+            worker = workers.pop(index, None)
+        if worker is None:
+            return
+        worker.process.join()
+        for image_path in sorted(worker.pending):
+            self._fail(
+                image_path, f"worker process {worker.process.name} exited with code {worker.process.exitcode}", summary
+            )
+
+    def _succeed(self, image_path: str, summary: ShardedRunSummary):
+        summary.succeeded.append(image_path)
+        self._notify(image_path, None)
+
+    def _fail(self, image_path: str, error: str, summary: ShardedRunSummary):
+        summary.failed[image_path] = error
+        self._notify(image_path, error)
+
+    def _notify(self, image_path: str, error: Optional[str]):
+        try:
+            self.on_result(image_path, error)
+        except Exception as e:
+            logger.error(f"result callback for {image_path} failed: {e}")
+
+
+def _helper_factories(client: "AutoRetouchAPIClient", processes: int) -> Dict[str, Tuple[Callable[..., Any], tuple]]:
+    """how to recreate the caches and limiters of `client` in a worker process, limits shared by `processes`"""
+    helpers: Dict[str, Tuple[Callable[..., Any], tuple]] = {}
+    if client.upload_index is not None:
+        helpers["upload_index"] = (UploadIndex, (client.upload_index.path,))
+    if client.result_cache is not None:
+        cache = client.result_cache
+        helpers["result_cache"] = (ResultCache, (cache.directory, cache.max_bytes))
+    if client.metadata_cache is not None:
+        cache = client.metadata_cache
+        helpers["metadata_cache"] = (MetadataCache, (cache.ttl, cache.ttls, cache.path))
+    if client.rate_limiter is not None:
+        limiter = client.rate_limiter
+        helpers["rate_limiter"] = (TokenBucket, (limiter.rate / processes, max(1, limiter.burst // processes)))
+    if client.concurrency_controller is not None:
+        controller = client.concurrency_controller
+        helpers["concurrency_controller"] = (AIMDController, (
+            max(controller.minimum, controller.limit // processes),
+            controller.minimum,
+            max(controller.minimum, controller.maximum // processes),
+            controller.increase,
+            controller.decrease,
+            controller.latency_tolerance,
+            controller.cooldown,
+        ))
+    return helpers
+
+
+def _forward_events(events, instrumentation: Instrumentation):
+    for event in iter(events.get, None):
+        instrumentation.emit(event)
+
+
+@dataclass
+class _Worker:
+    process: multiprocessing.Process
+    images: "multiprocessing.Queue"
+    pending: Set[str] = field(default_factory=set)
+
+
+def _run_shard(shard: _Shard, results):
+    from autoretouch.api_client.client import AutoRetouchAPIClient
+
+    def on_result(image_path: str, error: Optional[Exception]):
+        results.put((shard.index, image_path, None if error is None else f"{type(error).__name__}: {error}"))
+
+    journal = JobJournal(shard.journal_path) if shard.journal_path is not None else None
+    helpers = {name: factory(*args) for name, (factory, args) in shard.helpers.items()}
+    client = AutoRetouchAPIClient(
+        organization_id=shard.organization_id, workflow_id=shard.workflow_id,
+        instrumentation=Instrumentation(shard.events.put) if shard.events is not None else None,
+        **shard.client_kwargs, **helpers,
+    )
+    client.auth.credentials = shard.credentials
+    try:
+        BatchPipeline(
+            client, shard.workflow_id, shard.organization_id,
+            upload_workers=shard.upload_workers,
+            download_workers=shard.download_workers,
+            max_in_flight=client.pool_size,
+            poll_interval=shard.poll_interval,
+            on_result=on_result,
+            journal=journal,
+            workflow_version_id=shard.workflow_version_id,
+        ).run(iter(shard.images.get, None), shard.target_dir, shard.input_dir)
+    finally:
+        client.close()
+        if journal is not None:
+            journal.close()
+        for helper in helpers.values():
+            if hasattr(helper, "close"):
+                helper.close()
+        results.put((shard.index, None, None))
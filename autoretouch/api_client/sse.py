@@ -0,0 +1,78 @@
+import re
+from typing import Iterable, Iterator, List, Optional
+
+from autoretouch.api_client.model import ServerSentEvent
+
+__all__ = [
+    "EventStreamParser",
+    "iter_events",
+]
+
+_LINE_END = re.compile(rb"\r\n|\r|\n")
+
+
+class EventStreamParser:
+    """
+    incremental parser for the `text/event-stream` format
+
+    feed it chunks as they arrive over the wire, it returns the events completed by each chunk.
+    Lines and events may be split across chunks arbitrarily.
+    """
+
+    def __init__(self):
+        self.last_event_id: Optional[str] = None
+        self._buffer = b""
+        self._data: List[str] = []
+        self._event = ""
+        self._retry: Optional[int] = None
+
+    def feed(self, chunk: bytes) -> List[ServerSentEvent]:
+        self._buffer += chunk
+        events = []
+        start = 0
+        while True:
+            match = _LINE_END.search(self._buffer, start)
+            # a trailing "\r" may be the first half of a "\r\n" split across chunks
+            if match is None or (match.group() == b"\r" and match.end() == len(self._buffer)):
+                break
+            event = self._process_line(self._buffer[start:match.start()].decode("utf-8"))
+            if event is not None:
+                events.append(event)
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        return events
+
+    def _process_line(self, line: str) -> Optional[ServerSentEvent]:
+        if not line:
+            return self._dispatch()
+        if line.startswith(":"):
+            return None
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "data":
+            self._data.append(value)
+        elif field == "event":
+            self._event = value
+        elif field == "id" and "\0" not in value:
+            self.last_event_id = value
+        elif field == "retry" and value.isdigit():
+            self._retry = int(value)
+        return None
+
+    def _dispatch(self) -> Optional[ServerSentEvent]:
+        data, event, retry = self._data, self._event, self._retry
+        self._data, self._event, self._retry = [], "", None
+        # an empty data buffer means no data field since the last event: nothing to dispatch
+        if not data:
+            return None
+        return ServerSentEvent(
+            data="\n".join(data), event=event or "message", id=self.last_event_id, retry=retry
+        )
+
+
+def iter_events(chunks: Iterable[bytes]) -> Iterator[ServerSentEvent]:
+    """yield the events of a byte stream as soon as they are complete"""
+    parser = EventStreamParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional, Union
+from uuid import UUID
+
+from autoretouch.api_client.upload_index import sha256_file
+
+logger = logging.getLogger("autoretouch-python-client")
+
+__all__ = [
+    "SyncManifest",
+    "Fingerprint",
+    "SYNC_NAME",
+    "SYNC_MTIME",
+    "SYNC_HASH",
+    "MANIFEST_NAME",
+]
+
+#: skip images whose result exists
+SYNC_NAME = "name"
+#: skip images whose result exists, unless the image was modified since it was processed
+SYNC_MTIME = "mtime"
+#: like `SYNC_MTIME`, but a modified image is only processed again if its content changed
+SYNC_HASH = "hash"
+
+#: file name of the manifest in the output directory
+MANIFEST_NAME = ".autoretouch-manifest.sqlite"
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """the state of an image the manifest compares with: size, modification time and, with `SYNC_HASH`, hash"""
+    size: int
+    mtime_ns: int
+    content_hash: Optional[str] = None
+
+
+class SyncManifest:
+    """
+    sidecar record of the images of `input_dir` whose results are in `output_dir`, to process only the changes
+
+    For every processed image the manifest stores its size, modification time, content hash (with `SYNC_HASH`)
+    and workflow. An image is processed again if its result is missing, if it was processed with another workflow
+    or, depending on `mode`, if it changed since. Take the :meth:`fingerprint` of an image when it is submitted and
+    :meth:`record` it once it is processed, so that a change while it is processed is noticed by the next run.
+    Safe to share between threads.
+
+    :param input_dir: the directory of the images
+    :param output_dir: the directory of the results, mirroring `input_dir`
+    :param mode: `SYNC_NAME`, `SYNC_MTIME` or `SYNC_HASH`. Default: `SYNC_MTIME`
+    :param path: path of the sqlite database. Default: `MANIFEST_NAME` in `output_dir`
+    """
+
+    def __init__(self, input_dir: str, output_dir: str, mode: str = SYNC_MTIME, path: Optional[str] = None):
+        import sqlite3
+
+        if mode not in (SYNC_NAME, SYNC_MTIME, SYNC_HASH):
+            raise ValueError(f"unknown sync mode {mode}")
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.mode = mode
+        self.path = path or os.path.join(output_dir, MANIFEST_NAME)
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                "relative_path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+                "content_hash TEXT, workflow_id TEXT NOT NULL)"
+            )
+
+    def filter(self, image_paths: Iterable[str], workflow_id: Union[str, UUID]) -> Iterator[str]:
+        """yield the images of `image_paths` that need processing, logging the others as skipped"""
+        for image_path in image_paths:
+            if self.needs_processing(image_path, workflow_id):
+                yield image_path
+            else:
+                logger.debug(f"Skipping {image_path}, its result is up to date")
+
+    def needs_processing(self, image_path: str, workflow_id: Union[str, UUID]) -> bool:
+        relative_path = os.path.relpath(image_path, self.input_dir)
+        if not os.path.isfile(os.path.join(self.output_dir, relative_path)):
+            return True
+        if self.mode == SYNC_NAME:
+            return False
+        stat = os.stat(image_path)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT size, mtime_ns, content_hash, workflow_id FROM images WHERE relative_path = ?",
+                (relative_path,),
+            ).fetchone()
+        if row is None or row[3] != str(workflow_id):
+            return True
+        size, mtime_ns, content_hash, _ = row
+        if (size, mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            return False
+        if self.mode == SYNC_MTIME or content_hash is None or size != stat.st_size:
+            return True
+        if sha256_file(image_path) != content_hash:
+            return True
+        # touched but unchanged: remember the new modification time to not hash it again
+        self._upsert(relative_path, stat.st_size, stat.st_mtime_ns, content_hash, workflow_id)
+        return False
+
+    def fingerprint(self, image_path: str) -> Fingerprint:
+        """the current state of the image"""
+        stat = os.stat(image_path)
+        content_hash = sha256_file(image_path) if self.mode == SYNC_HASH else None
+        return Fingerprint(stat.st_size, stat.st_mtime_ns, content_hash)
+
+    def record(self, image_path: str, workflow_id: Union[str, UUID], fingerprint: Optional[Fingerprint] = None):
+        """
+        remember that the result of the image is in `output_dir`
+
+        :param fingerprint: the state of the image when it was submitted. Default: its current state
+        """
+        fingerprint = fingerprint or self.fingerprint(image_path)
+        self._upsert(
+            os.path.relpath(image_path, self.input_dir), fingerprint.size, fingerprint.mtime_ns,
+            fingerprint.content_hash, workflow_id,
+        )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def _upsert(self, relative_path: str, size: int, mtime_ns: int, content_hash: Optional[str],
+                workflow_id: Union[str, UUID]):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO images (relative_path, size, mtime_ns, content_hash, workflow_id) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (relative_path, size, mtime_ns, content_hash, str(workflow_id)),
+            )
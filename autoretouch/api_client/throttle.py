@@ -0,0 +1,148 @@
+import logging
+import threading
+from time import monotonic, sleep
+from typing import Dict, Optional
+
+logger = logging.getLogger("autoretouch-python-client")
+
+__all__ = [
+    "TokenBucket",
+    "AIMDController",
+]
+
+
+class TokenBucket:
+    """
+    thread-safe token bucket limiting the rate of requests
+
+    :param rate: tokens added per second, i.e. the sustained requests per second
+    :param burst: maximum number of tokens, i.e. requests that can be sent at once after a pause
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """take a token, waiting for one if the bucket is empty"""
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return
+            sleep(wait)
+
+    def try_acquire(self) -> float:
+        """take a token without waiting, return 0 if there was one, else the seconds until there is one"""
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class AIMDController:
+    """
+    adaptive limit of concurrent executions, additive increase / multiplicative decrease
+
+    Fed with the outcome of every request: each healthy answer raises the limit by `increase / limit`
+    (about `increase` per round of `limit` requests); a 429, a 5xx, a connection error or a latency above
+    `latency_tolerance` times the best latency seen for the same route multiplies it by `decrease`, at most
+    once per `cooldown`. Routes are compared to their own baseline, since a listing answers much faster
+    than a download starts.
+
+    :param initial: limit to start with. Default: 16
+    :param minimum: lowest limit. Default: 1
+    :param maximum: highest limit. Default: 200
+    :param increase: additive increase per round of healthy requests. Default: 1.0
+    :param decrease: multiplicative decrease on congestion. Default: 0.5
+    :param latency_tolerance: factor over the baseline latency considered congestion. Default: 3.0
+    :param cooldown: minimum seconds between two decreases. Default: 1.0
+    """
+
+    def __init__(
+            self,
+            initial: int = 16,
+            minimum: int = 1,
+            maximum: int = 200,
+            increase: float = 1.0,
+            decrease: float = 0.5,
+            latency_tolerance: float = 3.0,
+            cooldown: float = 1.0,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.cooldown = cooldown
+        self._limit = float(initial)
+        self._in_flight = 0
+        # smoothed and best latency per route
+        self._latency: Dict[str, float] = {}
+        self._baseline: Dict[str, float] = {}
+        self._last_decrease = float("-inf")
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        """the current number of concurrent executions allowed"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self):
+        """wait until fewer than `limit` executions are in flight and take a slot"""
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def try_acquire(self) -> bool:
+        """take a slot if fewer than `limit` executions are in flight, without waiting"""
+        with self._condition:
+            if self._in_flight >= self.limit:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def record(self, latency: Optional[float], status_code: Optional[int], route: str = ""):
+        """
+        feed the outcome of a request into the controller
+
+        :param latency: seconds until the response headers arrived, `None` if it says nothing about congestion,
+            e.g. because it mostly measures the time to send a large body
+        :param status_code: the response status, `None` if the request failed without response
+        :param route: the method and route of the request, its latency is compared to others of the same route
+        """
+        with self._condition:
+            congested = status_code is None or status_code == 429 or status_code >= 500
+            if latency is not None and status_code is not None:
+                smoothed = self._latency.get(route)
+                smoothed = latency if smoothed is None else 0.8 * smoothed + 0.2 * latency
+                self._latency[route] = smoothed
+                baseline = min(self._baseline.get(route, smoothed), smoothed)
+                self._baseline[route] = baseline
+                congested = congested or smoothed > self.latency_tolerance * baseline
+            if congested:
+                now = monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self._last_decrease = now
+                    self._limit = max(self.minimum, self._limit * self.decrease)
+                    logger.debug(f"congestion ({route}: {status_code}, {latency}s), concurrency limit: {self.limit}")
+            elif self._in_flight >= self.limit - 1:
+                # only grow while the limit is actually used
+                self._limit = min(self.maximum, self._limit + self.increase / self._limit)
+                self._condition.notify_all()
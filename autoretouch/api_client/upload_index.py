@@ -0,0 +1,77 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Union
+from uuid import UUID
+
+logger = logging.getLogger("autoretouch-python-client")
+
+__all__ = [
+    "UploadIndex",
+    "sha256_file",
+]
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_file(path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    """hex SHA-256 of a file, the content hash under which the API stores uploaded images"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadIndex:
+    """
+    persistent set of the content hashes already uploaded to each organization
+
+    backed by a sqlite file, safe to share between the threads of a client.
+
+    :param path: path of the sqlite database, created if missing
+    """
+
+    def __init__(self, path: str):
+        import sqlite3
+
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # shared by the worker processes of a sharded run, see `JobJournal`
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                "organization_id TEXT NOT NULL, content_hash TEXT NOT NULL, "
+                "PRIMARY KEY (organization_id, content_hash))"
+            )
+
+    def contains(self, organization_id: Union[str, UUID], content_hash: str) -> bool:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM uploads WHERE organization_id = ? AND content_hash = ?",
+                (str(organization_id), content_hash),
+            ).fetchone()
+        return row is not None
+
+    def add(self, organization_id: Union[str, UUID], content_hash: str):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR IGNORE INTO uploads (organization_id, content_hash) VALUES (?, ?)",
+                (str(organization_id), content_hash),
+            )
+
+    def discard(self, organization_id: Union[str, UUID], content_hash: str):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM uploads WHERE organization_id = ? AND content_hash = ?",
+                (str(organization_id), content_hash),
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
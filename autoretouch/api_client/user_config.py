@@ -0,0 +1,40 @@
+import json
+import os
+from typing import Optional
+
+__all__ = [
+    "CONFIG_ROOT",
+    "USER_CONFIG_PATH",
+    "load_user_config",
+    "default_organization_id",
+    "default_workflow_id",
+]
+
+CONFIG_ROOT = os.path.join(os.path.expanduser("~"), ".config")
+USER_CONFIG_PATH = os.path.join(CONFIG_ROOT, "autoretouch-config.json")
+
+
+def load_user_config(path: str = USER_CONFIG_PATH) -> dict:
+    """
+    the organization and workflow used by default, as written by `autoretouch config set`
+
+    The file is read on every call, not at import, so that importing the package stays cheap and a changed
+    configuration is picked up by the next client.
+    """
+    if os.path.isfile(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {
+        "organization": {"id": None, "name": None},
+        "workflow": {"name": None, "id": None}
+    }
+
+
+def default_organization_id() -> Optional[str]:
+    """`AUTORETOUCH_ORGANIZATION_ID` or the organization of the user config"""
+    return os.environ.get("AUTORETOUCH_ORGANIZATION_ID") or load_user_config()["organization"]["id"]
+
+
+def default_workflow_id() -> Optional[str]:
+    """`AUTORETOUCH_WORKFLOW_ID` or the workflow of the user config"""
+    return os.environ.get("AUTORETOUCH_WORKFLOW_ID") or load_user_config()["workflow"]["id"]
@@ -0,0 +1,149 @@
+import json
+import logging
+import secrets
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Union
+from uuid import UUID
+
+logger = logging.getLogger("autoretouch-python-client")
+
+__all__ = [
+    "WebhookReceiver",
+]
+
+# payload keys that may carry the id of the execution a callback is about
+_ID_KEYS = ("id", "workflowExecutionId", "executionId")
+
+
+class WebhookReceiver:
+    """
+    receive the callbacks the API posts when executions finish, to wait for them without polling
+
+    :meth:`start` serves the callbacks with a small HTTP server in a background thread. To plug into a web server
+    of your own instead, do not start the receiver: pass the URL your server receives the callbacks at as
+    `public_url` and hand every callback's JSON body to :meth:`deliver`.
+
+    Callbacks may arrive before their execution is awaited: the last `max_pending` unclaimed ones are kept.
+    Safe to share between threads.
+
+    :param host: interface to listen on. Default: "127.0.0.1"
+    :param port: port to listen on. Default: 0, any free port
+    :param public_url: URL the API posts the callbacks to, e.g. of a tunnel or reverse proxy forwarding to this
+        receiver. Required unless the API runs on this machine. Default: the receiver's local URL
+    :param token: secret last path segment of the local URL, callbacks to other paths are rejected.
+        Default: random
+    :param fallback_interval: seconds to wait for a callback before checking the execution's status, and between
+        two checks. The first check waits at least twice the workflow's usual runtime. Default: 30
+    :param max_pending: number of callbacks kept until their execution is awaited. Default: 10000
+    """
+
+    def __init__(
+            self,
+            host: str = "127.0.0.1",
+            port: int = 0,
+            public_url: Optional[str] = None,
+            token: Optional[str] = None,
+            fallback_interval: float = 30.0,
+            max_pending: int = 10000,
+    ):
+        self.host = host
+        self.port = port
+        self.token = token or secrets.token_urlsafe(16)
+        self.fallback_interval = fallback_interval
+        self.max_pending = max_pending
+        self.public_url = public_url
+        self._received: "OrderedDict[str, dict]" = OrderedDict()
+        self._condition = threading.Condition()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """the URL to register as webhook of the executions"""
+        if self.public_url is not None:
+            return self.public_url
+        if self._server is None:
+            raise RuntimeError("the webhook receiver is not started and has no public_url")
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/{self.token}"
+
+    def start(self) -> "WebhookReceiver":
+        self._server = ThreadingHTTPServer((self.host, self.port), _handler_for(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="autoretouch-webhook-receiver", daemon=True
+        )
+        self._thread.start()
+        logger.debug(f"receiving webhooks at {self.url}")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def deliver(self, payload: dict) -> bool:
+        """hand over the JSON body of a callback, return whether it names an execution"""
+        execution_id = next((payload[key] for key in _ID_KEYS if isinstance(payload.get(key), str)), None)
+        if execution_id is None:
+            logger.warning(f"ignoring webhook without execution id: {payload}")
+            return False
+        with self._condition:
+            self._received.pop(execution_id, None)
+            self._received[execution_id] = payload
+            while len(self._received) > self.max_pending:
+                self._received.popitem(last=False)
+            self._condition.notify_all()
+        logger.debug(f"received webhook of execution {execution_id}")
+        return True
+
+    def wait(self, execution_id: Union[str, UUID], timeout: Optional[float] = None) -> Optional[Dict]:
+        """
+        block until a callback of the execution arrives and return its payload
+
+        :return: the payload, or `None` if no callback arrived within `timeout` seconds
+        """
+        execution_id = str(execution_id)
+        with self._condition:
+            if not self._condition.wait_for(lambda: execution_id in self._received, timeout):
+                return None
+            return self._received.pop(execution_id)
+
+
+def _handler_for(receiver: WebhookReceiver):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int):
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if self.path.split("?")[0].rstrip("/").rsplit("/", 1)[-1] != receiver.token:
+                return self._send(404)
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                return self._send(400)
+            if not isinstance(payload, dict) or not receiver.deliver(payload):
+                return self._send(400)
+            self._send(204)
+
+    return Handler
@@ -1,14 +1,17 @@
-import contextlib
 import json
 import os
+import shutil
+import sys
 import click
 import click_log
 import logging
 
-from typing import Optional
+from functools import partial
+from typing import Optional, Tuple
 from uuid import UUID
 
-from autoretouch.api_client.client import AutoRetouchAPIClient, USER_CONFIG, USER_CONFIG_PATH
+from autoretouch.api_client.user_config import USER_CONFIG_PATH, default_organization_id, load_user_config
+from autoretouch.cli import completion
 
 logger = logging.getLogger("autoretouch-python-client")
 logger.setLevel("INFO")
@@ -27,6 +30,12 @@ class UUIDEncoder(json.JSONEncoder):
 CONTEXT_SETTINGS = dict(help_option_names=['--help', '-h'])
 
 
+def api_client() -> "AutoRetouchAPIClient":
+    # imported on first use: the client pulls in requests, which would slow down --help and completion
+    from autoretouch.api_client.client import AutoRetouchAPIClient
+    return AutoRetouchAPIClient()
+
+
 @click.group(context_settings=CONTEXT_SETTINGS)
 def autoretouch_cli():
     pass
@@ -45,7 +54,7 @@ def login():
     or trigger Auth0 device flow if none of the above are set and store the obtained credentials
     in AUTORETOUCH_CREDENTIALS_PATH
     """
-    AutoRetouchAPIClient().login()
+    api_client().login()
 
 
 @click.command()
@@ -54,7 +63,7 @@ def logout():
     """
     revoke and remove stored refresh token from disk
     """
-    AutoRetouchAPIClient().revoke_credentials().logout()
+    api_client().revoke_credentials().logout()
 
 
 @click.group()
@@ -71,26 +80,18 @@ def config_get():
     """
     show the organization and workflow that are currently used by default
     """
-    for key, value in USER_CONFIG.items():
+    for key, value in load_user_config().items():
         click.echo(key)
         for k, v in value.items():
             click.echo(f"\t{k}: {v}")
 
 
 def autocomplete_user_organizations(ctx: click.core.Context, param: click.core.Argument, incomplete: str):
-    with contextlib.redirect_stderr(open(os.devnull, 'w')), contextlib.redirect_stdout(open(os.devnull, 'w')):
-        try:
-            return [str(k.id) for k in AutoRetouchAPIClient().get_organizations() if k.name.startswith(incomplete)]
-        except Exception as e:
-            return []
+    return completion.organizations(incomplete)
 
 
 def autocomplete_user_workflows(ctx: click.core.Context, param: click.core.Argument, incomplete: str):
-    with contextlib.redirect_stderr(open(os.devnull, 'w')), contextlib.redirect_stdout(open(os.devnull, 'w')):
-        try:
-            return [str(k.id) for k in AutoRetouchAPIClient().get_workflows() if k.name.startswith(incomplete)]
-        except Exception as e:
-            return []
+    return completion.workflows(ctx.params.get("organization_id") or default_organization_id(), incomplete)
 
 
 @click.command(name="set")
@@ -103,20 +104,22 @@ def config_set(organization_id, workflow_id):
     """
     configure the organization and/or workflow that are used by default
     """
-    client = AutoRetouchAPIClient()
+    client = api_client()
+    user_config = load_user_config()
     if organization_id is not None:
         org = client.get_organization(organization_id)
         new_org = {"organization": {"name": org.name, "id": org.id}}
     else:
-        new_org = {"organization": USER_CONFIG["organization"]}
+        new_org = {"organization": user_config["organization"]}
     if workflow_id is not None:
         wf = client.get_workflow(workflow_id)
         new_wf = {"workflow": {"name": wf.name, "id": wf.id}}
     else:
-        new_wf = {"workflow": USER_CONFIG["workflow"]}
+        new_wf = {"workflow": user_config["workflow"]}
     new_config = {**new_org, **new_wf}
     with open(USER_CONFIG_PATH, "w") as f:
         f.write(json.dumps(new_config, cls=UUIDEncoder))
+    completion.refresh_in_background()
 
 
 @click.command()
@@ -127,7 +130,8 @@ def organizations(format):
     """
     list all your organizations
     """
-    orgs = AutoRetouchAPIClient().get_organizations()
+    orgs = api_client().get_organizations()
+    completion.update_cache(organizations=orgs)
     if format == 'text':
         for org in orgs:
             click.echo(f"{org.name}: {org.id}")
@@ -147,7 +151,7 @@ def organization(organization_id, format):
 
     ORGANIZATION_ID: id of the organization you want to get. If not provided, default to the organization set in your config
     """
-    org = AutoRetouchAPIClient().get_organization(organization_id)
+    org = api_client().get_organization(organization_id)
     if format == 'text':
         click.echo(f"{org.name}: {org.id}")
     if format == 'json':
@@ -162,7 +166,7 @@ def upload(images):
     upload an image/images to autoretouch
     IMAGES: path to the images to upload
     """
-    client = AutoRetouchAPIClient()
+    client = api_client()
     for file in images:
         click.echo(f"{file.name} is uploaded as {client.upload_image_from_stream(file)}")
 
@@ -175,7 +179,7 @@ def balance():
 
     default format: autoretouch credits - corresponds to € cents excl. VAT
     """
-    click.echo(AutoRetouchAPIClient().get_balance())
+    click.echo(api_client().get_balance())
 
 
 @click.command()
@@ -183,10 +187,26 @@ def balance():
 @click.argument('output', type=click.Path(exists=True), required=True)
 @click.option('--workflow-id', '-w', required=False, shell_complete=autocomplete_user_workflows,
               help="id of the workflow to use for processing. Default to the workflow set in your config")
+@click.option('--processes', '-p', default=1, type=click.IntRange(min=1),
+              help="number of worker processes to share a folder of images between. Default=1")
+@click.option('--recursive', '-r', is_flag=True,
+              help="also process the images in the subfolders of INPUT, mirroring them in OUTPUT")
+@click.option('--include', '-i', multiple=True,
+              help="only process images matching this glob pattern, e.g. '*.png'. Can be repeated")
+@click.option('--exclude', '-e', multiple=True,
+              help="skip images and folders matching this glob pattern, e.g. 'raw/*'. Can be repeated")
+@click.option('--sync', '-s', default=None, type=click.Choice(['name', 'mtime', 'hash'], case_sensitive=False),
+              help="only process images that are new or changed since the last run into OUTPUT: compared by "
+                   "'name' (result exists), 'mtime' (and image not modified) or 'hash' (and content unchanged)")
+@click.option('--progress/--no-progress', default=None,
+              help="show the throughput, credits and ETA of a folder while it is processed. "
+                   "Default: live in a terminal, otherwise off")
 @click.option('--yes', '-y', required=False, is_flag=True,
               help="skip confirmation")
 @click_log.simple_verbosity_option(logger)
-def process(input: str, output: str, workflow_id: Optional[UUID], yes: bool = False):
+def process(input: str, output: str, workflow_id: Optional[UUID], processes: int = 1, recursive: bool = False,
+            include: Tuple[str, ...] = (), exclude: Tuple[str, ...] = (), sync: Optional[str] = None,
+            progress: Optional[bool] = None, yes: bool = False):
     """
     process an image or a folder of images and wait for the result
 
@@ -195,18 +215,48 @@ def process(input: str, output: str, workflow_id: Optional[UUID], yes: bool = Fa
     OUTPUT: destination folder for processed image(s)
 
     """
-    client = AutoRetouchAPIClient()
+    client = api_client()
     if os.path.isfile(input):
         client.process_image(input, output, workflow_id=workflow_id)
     else:
-        images = client.find_images(input)
+        total = None
         if not yes:
-            click.confirm(f"Are you sure you want to process {len(images)} images?", abort=True)
-        logger.info(f"Uploading and processing {len(images)} images ...")
-        client.process_folder(input, output, workflow_id=workflow_id)
+            count = sum(1 for _ in client.iter_images(input, recursive, include, exclude))
+            # with --sync, unchanged images are only skipped once processing starts
+            up_to = "up to " if sync is not None else ""
+            click.confirm(f"Are you sure you want to process {up_to}{count} images?", abort=True)
+            total = count if sync is None else None
+        logger.info("Uploading and processing images ...")
+        live = sys.stderr.isatty()
+        if progress is None:
+            progress = live
+        run_progress = None
+        level = logger.level
+        if progress:
+            from autoretouch.api_client.progress import Progress
+            run_progress = Progress(total, callback=partial(show_progress, live), interval=1 if live else 10)
+            if live and level == logging.INFO:
+                # the per-image lines would scroll the live view away, failures are still shown
+                logger.setLevel(logging.WARNING)
+        try:
+            client.process_folder(
+                input, output, workflow_id=workflow_id, processes=processes,
+                recursive=recursive, include=include, exclude=exclude, sync=sync, progress=run_progress,
+            )
+        finally:
+            logger.setLevel(level)
     logger.info("Done.")
 
 
+def show_progress(live: bool, snapshot: "ProgressSnapshot"):
+    if not live:
+        click.echo(snapshot.summary(), err=True)
+        return
+    # redraw a single line, cut to the terminal so that it does not wrap
+    width = shutil.get_terminal_size().columns - 1
+    click.echo("\r\033[K" + snapshot.summary()[:width], err=True, nl=snapshot.finished)
+
+
 @click.command()
 @click.option('--organization-id', "-o", default=None, shell_complete=autocomplete_user_organizations,
               help="id of the organization you want to get. "
@@ -218,8 +268,9 @@ def workflows(organization_id, format):
     """
     list the workflows defined in an organization
     """
-    client = AutoRetouchAPIClient()
+    client = api_client()
     workflows = client.get_workflows(organization_id)
+    completion.update_cache(workflows={organization_id or client.organization_id: workflows})
     if format == 'text':
         for workflow in workflows:
             click.echo(f"{workflow.name}: {workflow.id}")
@@ -0,0 +1,138 @@
+"""
+local cache of the organizations and workflows offered by shell completion
+
+Completion runs on every TAB: it only reads the cache file and, when the file is missing or stale, refreshes it in
+a detached background process. The commands fetching organizations and workflows also update it.
+"""
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, Iterable, List, Optional
+
+from autoretouch.api_client.user_config import CONFIG_ROOT
+
+logger = logging.getLogger("autoretouch-python-client")
+
+COMPLETION_CACHE_PATH = os.environ.get(
+    "AUTORETOUCH_COMPLETION_CACHE_PATH",
+    os.path.join(CONFIG_ROOT, "autoretouch-completion.json")
+)
+# refresh in the background when older than this
+MAX_AGE = 3600
+# do not start another background refresh during this many seconds
+REFRESH_INTERVAL = 60
+
+
+def read_cache(path: str = COMPLETION_CACHE_PATH) -> dict:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_cache(
+        organizations: Optional[Iterable] = None,
+        workflows: Optional[Dict[str, Iterable]] = None,
+        path: str = COMPLETION_CACHE_PATH,
+):
+    """
+    merge organizations and the workflows of some organizations into the cache
+
+    :param organizations: `Organization`s replacing the cached ones
+    :param workflows: `Workflow`s per organization id, replacing the cached ones of these organizations
+    """
+    from autoretouch.api_client.files import write_atomically
+
+    cache = read_cache(path)
+    if organizations is not None:
+        cache["organizations"] = [{"id": str(o.id), "name": o.name} for o in organizations]
+    for organization_id, organization_workflows in (workflows or {}).items():
+        cache.setdefault("workflows", {})[str(organization_id)] = [
+            {"id": str(w.id), "name": w.name} for w in organization_workflows
+        ]
+    cache["updated_at"] = time.time()
+    try:
+        write_atomically([json.dumps(cache, indent=4).encode()], path)
+    except OSError as e:
+        logger.debug(f"could not update the completion cache {path}: {e}")
+
+
+def complete(entries: List[dict], incomplete: str) -> List:
+    """the entries whose name or id starts with `incomplete`, as ids described by their name"""
+    from click.shell_completion import CompletionItem
+
+    incomplete = incomplete.lower()
+    return [
+        CompletionItem(entry["id"], help=entry["name"])
+        for entry in entries
+        if entry["name"].lower().startswith(incomplete) or entry["id"].startswith(incomplete)
+    ]
+
+
+def organizations(incomplete: str, path: str = COMPLETION_CACHE_PATH) -> List:
+    cache = read_cache(path)
+    refresh_in_background_if_stale(cache, path)
+    return complete(cache.get("organizations", []), incomplete)
+
+
+def workflows(organization_id: Optional[str], incomplete: str, path: str = COMPLETION_CACHE_PATH) -> List:
+    cache = read_cache(path)
+    refresh_in_background_if_stale(cache, path)
+    cached = cache.get("workflows", {})
+    entries = cached.get(str(organization_id)) if organization_id else None
+    if entries is None:
+        # unknown or no organization: offer the workflows of all organizations
+        entries = [entry for organization_workflows in cached.values() for entry in organization_workflows]
+    return complete(entries, incomplete)
+
+
+def refresh_in_background_if_stale(cache: dict, path: str = COMPLETION_CACHE_PATH):
+    if time.time() - cache.get("updated_at", 0) >= MAX_AGE:
+        refresh_in_background(path)
+
+
+def refresh_in_background(path: str = COMPLETION_CACHE_PATH):
+    """start a detached process refreshing the cache, unless one was started less than `REFRESH_INTERVAL` ago"""
+    # imported here, only completing with a stale cache pays for it
+    import subprocess
+
+    marker = f"{path}.refreshing"
+    try:
+        if time.time() - os.path.getmtime(marker) < REFRESH_INTERVAL:
+            return
+    except OSError:
+        pass
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(marker)), exist_ok=True)
+        with open(marker, "w"):
+            pass
+        subprocess.Popen(
+            [sys.executable, "-m", "autoretouch.cli.completion", path],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError:
+        pass
+
+
+def refresh(path: str = COMPLETION_CACHE_PATH):
+    """fetch all organizations and their workflows into the cache, if logged in"""
+    from autoretouch.api_client.client import AutoRetouchAPIClient, AR_CREDENTIALS, AR_REFRESH_TOKEN
+
+    # never start the interactive device flow from the background
+    if AR_REFRESH_TOKEN is None and not os.path.isfile(AR_CREDENTIALS):
+        return
+    with AutoRetouchAPIClient() as client:
+        all_organizations = client.get_organizations()
+        update_cache(
+            all_organizations,
+            {organization.id: client.get_workflows(organization.id) for organization in all_organizations},
+            path,
+        )
+
+
+if __name__ == "__main__":
+    refresh(*sys.argv[1:])
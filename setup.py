@@ -78,15 +78,22 @@ setup(
     long_description_content_type="text/markdown",
     license="BSD Zero",
     packages=find_packages(exclude=["test", "assets", "tmp"]),
+    python_requires=">=3.9",
     install_requires=[
         "requests",
         "click==8.1.3",
         "click-log==0.4.0"
     ],
-    extra_requires={
+    extras_require={
         "test": [
             "assertpy"
         ],
+        "async": [
+            "aiohttp"
+        ],
+        "opentelemetry": [
+            "opentelemetry-api"
+        ],
     },
     include_package_data=True,
     package_data={
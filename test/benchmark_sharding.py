@@ -0,0 +1,55 @@
+"""
+throughput of `process_folder` with 1 to n worker processes against a local stand-in API
+
+run with `python -m test.benchmark_sharding [--images 400] [--size-kib 1024] [--processes 1 2 4]`
+"""
+import argparse
+import os
+import shutil
+import tempfile
+from time import monotonic
+
+from autoretouch.api_client.client import AutoRetouchAPIClient, COMPLETION_BATCH
+from autoretouch.api_client.model import ApiConfig
+from test.fake_server import ORGANIZATION_ID, WORKFLOW_ID, server_process
+
+
+def _run(api_config: ApiConfig, input_dir: str, output_dir: str, processes: int) -> float:
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    with AutoRetouchAPIClient(
+            organization_id=ORGANIZATION_ID, workflow_id=WORKFLOW_ID, api_config=api_config,
+            refresh_token="refresh", credentials_path=None, save_credentials=False, user_agent="benchmark"
+    ) as client:
+        started = monotonic()
+        client.process_folder(input_dir, output_dir, completion=COMPLETION_BATCH, processes=processes)
+        return monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=400)
+    parser.add_argument("--size-kib", type=int, default=1024)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        with server_process() as config:
+            input_dir = os.path.join(tmp, "input")
+            os.makedirs(input_dir)
+            for i in range(args.images):
+                with open(os.path.join(input_dir, f"image_{i}.jpg"), "wb") as f:
+                    f.write(os.urandom(args.size_kib * 1024))
+            print(f"{args.images} images of {args.size_kib} KiB, {os.cpu_count()} cores")
+            baseline = None
+            for processes in sorted(set(args.processes)):
+                elapsed = _run(config, input_dir, os.path.join(tmp, "output"), processes)
+                throughput = args.images / elapsed
+                baseline = baseline or throughput
+                print(f"{processes:3d} processes: {throughput:8.1f} images/s ({throughput / baseline:.2f}x)")
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+end-to-end throughput of `process_image` and `process_folder` against a local stand-in API
+
+run with `python -m test.benchmark_throughput [--images 10 1000 10000] [--scenarios image folder]
+[--completion poll] [--latency 0.02] [--processing-time 0.5] [--rate-limit 500] [--error-rate 0.01]`
+
+Every run happens in a fresh process, which reports images/second, the p50/p99 latency from the creation of an
+execution to the download of its result, the requests sent per image, its peak RSS and its peak thread count.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import statistics
+import tempfile
+import threading
+from dataclasses import asdict, dataclass
+from time import monotonic
+from typing import List
+
+import requests
+
+from autoretouch.api_client.client import AutoRetouchAPIClient, COMPLETION_POLL
+from autoretouch.api_client.model import ApiConfig
+from autoretouch.api_client.schedule import FixedPollSchedule
+from test.fake_server import ORGANIZATION_ID, WORKFLOW_ID, server_process
+
+SCENARIO_IMAGE = "image"
+SCENARIO_FOLDER = "folder"
+
+
+@dataclass
+class BenchmarkResult:
+    scenario: str
+    images: int
+    seconds: float
+    images_per_second: float
+    p50_latency: float
+    p99_latency: float
+    requests_per_image: float
+    peak_rss_mib: float
+    peak_threads: int
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(percent) - 1]
+
+
+def _stats(api_config: ApiConfig) -> dict:
+    return requests.get(f"{api_config.BASE_API_URL}/_stats").json()
+
+
+class _ThreadSampler:
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
+
+
+def _run(
+        api_config: ApiConfig, scenario: str, input_dir: str, output_dir: str, completion: str,
+        poll_interval: float, results: "multiprocessing.Queue",
+):
+    images = sorted(os.listdir(input_dir))
+    before = _stats(api_config)
+    with AutoRetouchAPIClient(
+            organization_id=ORGANIZATION_ID, workflow_id=WORKFLOW_ID, api_config=api_config,
+            refresh_token="refresh", credentials_path=None, save_credentials=False, user_agent="benchmark",
+            poll_schedule=FixedPollSchedule(poll_interval),
+    ) as client:
+        client.authenticated()
+        with _ThreadSampler() as threads:
+            started = monotonic()
+            if scenario == SCENARIO_IMAGE:
+                for image in images:
+                    client.process_image(os.path.join(input_dir, image), output_dir, completion=completion)
+            else:
+                client.process_folder(input_dir, output_dir, completion=completion)
+            seconds = monotonic() - started
+    after = _stats(api_config)
+    latencies = after["latencies"][len(before["latencies"]):]
+    requests_sent = sum(after["requests"].values()) - sum(before["requests"].values())
+    results.put(BenchmarkResult(
+        scenario=scenario,
+        images=len(images),
+        seconds=seconds,
+        images_per_second=len(images) / seconds,
+        p50_latency=_percentile(latencies, 50),
+        p99_latency=_percentile(latencies, 99),
+        requests_per_image=requests_sent / len(images),
+        # KiB on Linux
+        peak_rss_mib=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        peak_threads=threads.peak,
+    ))
+
+
+def run_benchmark(
+        api_config: ApiConfig, scenario: str, input_dir: str, output_dir: str,
+        completion: str = COMPLETION_POLL, poll_interval: float = 0.1,
+) -> BenchmarkResult:
+    """process the images of `input_dir` in a fresh process and measure it"""
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(
+        target=_run, args=(api_config, scenario, input_dir, output_dir, completion, poll_interval, results)
+    )
+    process.start()
+    try:
+        return results.get()
+    finally:
+        process.join()
+
+
+def create_images(directory: str, n_images: int, size_kib: int):
+    os.makedirs(directory)
+    for i in range(n_images):
+        with open(os.path.join(directory, f"image_{i}.jpg"), "wb") as f:
+            f.write(os.urandom(size_kib * 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--scenarios", nargs="+", choices=[SCENARIO_IMAGE, SCENARIO_FOLDER],
+                        default=[SCENARIO_IMAGE, SCENARIO_FOLDER])
+    parser.add_argument("--completion", default=COMPLETION_POLL, choices=["poll", "stream", "batch", "webhook"])
+    parser.add_argument("--size-kib", type=int, default=8)
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the stand-in API takes per request")
+    parser.add_argument("--processing-time", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=None, help="requests per second, 429 beyond")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--json", default=None, help="optional path to write the results to")
+    args = parser.parse_args()
+
+    server_kwargs = dict(
+        latency=args.latency, processing_time=args.processing_time, rate_limit=args.rate_limit,
+        error_rate=args.error_rate, seed=0,
+    )
+    results: List[BenchmarkResult] = []
+    tmp = tempfile.mkdtemp()
+    try:
+        with server_process(**server_kwargs) as api_config:
+            print(f"{args.size_kib} KiB images, completion={args.completion}, {os.cpu_count()} cores, {server_kwargs}")
+            print(f"{'scenario':>8} {'images':>7} {'img/s':>8} {'p50 s':>7} {'p99 s':>7} "
+                  f"{'req/img':>7} {'RSS MiB':>8} {'threads':>7}")
+            for n_images in args.images:
+                input_dir = os.path.join(tmp, f"input_{n_images}")
+                create_images(input_dir, n_images, args.size_kib)
+                for scenario in args.scenarios:
+                    result = run_benchmark(
+                        api_config, scenario, input_dir, os.path.join(tmp, "output"),
+                        args.completion, args.poll_interval,
+                    )
+                    results.append(result)
+                    print(f"{result.scenario:>8} {result.images:7d} {result.images_per_second:8.1f} "
+                          f"{result.p50_latency:7.3f} {result.p99_latency:7.3f} {result.requests_per_image:7.2f} "
+                          f"{result.peak_rss_mib:8.1f} {result.peak_threads:7d}")
+                shutil.rmtree(input_dir)
+    finally:
+        shutil.rmtree(tmp)
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump([asdict(result) for result in results], f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,491 @@
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+from unittest import TestCase
+from urllib.parse import urlparse, parse_qs
+
+from autoretouch.api_client.client import AutoRetouchAPIClient
+from autoretouch.api_client.model import ApiConfig
+
+ORGANIZATION_ID = "d92fe1cd-7166-4f5d-b43f-a100758d42c9"
+WORKFLOW_ID = "26740cd0-3a04-4329-8ba2-e0d6de5a4aaf"
+WORKFLOW_VERSION = "3c0cd2a2-1a3b-4c5c-9d1e-4a5f6b7c8d9e"
+USER_AGENT = "Python-Unit-Test-0.1.0"
+INPUT_IMAGE = os.path.join(os.path.dirname(__file__), "..", "assets", "input_image.jpeg")
+
+
+class _Server(ThreadingHTTPServer):
+    # the default backlog of 5 resets connections when hundreds of clients connect at once
+    request_queue_size = 1024
+
+
+class FakeAutoRetouchServer:
+    """
+    local stand-in for the autoRetouch API
+
+    executions complete `processing_time` seconds after their creation and their result is the input image.
+    executions created with webhooks post their details to them once they finished.
+
+    :param processing_time: seconds an execution stays ACTIVE
+    :param failing_executions: number of executions that end FAILED until they are retried
+    :param latency: seconds every request waits before it is answered
+    :param rate_limit: optional number of requests per second answered, the others get a 429. Default: unlimited
+    :param error_rate: share of requests answered with a 503 at random
+    :param seed: optional seed of the random errors
+    """
+
+    def __init__(
+            self,
+            processing_time: float = 0.0,
+            failing_executions: int = 0,
+            latency: float = 0.0,
+            rate_limit: Optional[float] = None,
+            error_rate: float = 0.0,
+            seed: Optional[int] = None,
+    ):
+        self.processing_time = processing_time
+        self.failing_executions = failing_executions
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._tokens = rate_limit or 0.0
+        self._tokens_at = time.monotonic()
+        # seconds from the creation of an execution to the download of its result
+        self.latencies: List[float] = []
+        self._created: Dict[str, List[float]] = {}
+        self.workflow_version = WORKFLOW_VERSION
+        self.injected: Dict[str, List[Tuple[int, Dict[str, str]]]] = {}
+        self.stalls: Dict[str, List[float]] = {}
+        self.images: Dict[str, bytes] = {}
+        self.executions: Dict[str, dict] = {}
+        self.webhooks: Dict[str, List[str]] = {}
+        # number of webhook callbacks to drop instead of sending them
+        self.dropped_webhooks = 0
+        self.requests: Dict[str, int] = {}
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), _handler_for(self))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    @property
+    def api_config(self) -> ApiConfig:
+        return ApiConfig(
+            BASE_API_URL=self.url, BASE_API_URL_CURRENT=f"{self.url}/v1", CLIENT_ID="client",
+            SCOPE="offline_access", AUDIENCE=self.url, AUTH_DOMAIN=self.url
+        )
+
+    def start(self) -> "FakeAutoRetouchServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def count(self, route: str) -> Optional[Tuple[int, Dict[str, str]]]:
+        """count a request to `route` and return the error to answer it with, if any"""
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+            injected = self.injected.get(route)
+            if injected:
+                return injected.pop(0)
+            if self.rate_limit is not None:
+                now = time.monotonic()
+                self._tokens = min(self.rate_limit, self._tokens + (now - self._tokens_at) * self.rate_limit)
+                self._tokens_at = now
+                if self._tokens < 1:
+                    self.requests["throttled"] = self.requests.get("throttled", 0) + 1
+                    return 429, {"Retry-After": "1"}
+                self._tokens -= 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                return 503, {}
+            return None
+
+    def stats(self) -> dict:
+        """the number of requests per route and the latencies of the executions"""
+        with self.lock:
+            return {"requests": dict(self.requests), "latencies": list(self.latencies)}
+
+    def inject(self, route: str, *statuses: int, headers: Optional[Dict[str, str]] = None):
+        """answer the next requests to `route` with `statuses` instead of handling them"""
+        with self.lock:
+            self.injected.setdefault(route, []).extend((status, headers or {}) for status in statuses)
+
+    def stall(self, route: str, *seconds: float):
+        """leave the next requests to `route` unanswered for `seconds` each, then close their connection"""
+        with self.lock:
+            self.stalls.setdefault(route, []).extend(seconds)
+
+    def store_image(self, content: bytes) -> str:
+        content_hash = hashlib.sha256(content).hexdigest()
+        with self.lock:
+            self.images[content_hash] = content
+        return content_hash
+
+    def create_execution(
+            self, content_hash: str, name: str, workflow_id: str, labels: Dict[str, str],
+            version: Optional[str] = None,
+    ) -> str:
+        execution_id = str(uuid.uuid4())
+        with self.lock:
+            self._created.setdefault(content_hash, []).append(time.monotonic())
+            self.executions[execution_id] = {
+                "id": execution_id,
+                "workflow": workflow_id,
+                "workflowVersion": version or self.workflow_version,
+                "workflowName": "fake workflow",
+                "organizationId": ORGANIZATION_ID,
+                "userId": "user",
+                "createdAt": time.time(),
+                "inputFileName": name,
+                "inputContentHash": content_hash,
+                "labels": labels,
+                "failed": self.failing_executions > 0,
+            }
+            self.failing_executions = max(0, self.failing_executions - 1)
+        return execution_id
+
+    def schedule_webhooks(self, execution_id: str):
+        if self.webhooks.get(execution_id):
+            timer = threading.Timer(self.processing_time, self._call_webhooks, [execution_id])
+            timer.daemon = True
+            timer.start()
+
+    def _call_webhooks(self, execution_id: str):
+        with self.lock:
+            payload = json.dumps(self.execution_json(execution_id)).encode()
+            drop = self.dropped_webhooks > 0
+            self.dropped_webhooks = max(0, self.dropped_webhooks - 1)
+        if drop:
+            return
+        for url in self.webhooks[execution_id]:
+            request = urllib.request.Request(url, payload, {"Content-Type": "application/json"}, method="POST")
+            try:
+                urllib.request.urlopen(request, timeout=5).close()
+            except OSError:
+                pass
+
+    def record_download(self, content_hash: str):
+        with self.lock:
+            created = self._created.get(content_hash)
+            if created:
+                self.latencies.append(time.monotonic() - created.pop(0))
+
+    def workflow_json(self) -> dict:
+        return {
+            "id": WORKFLOW_ID, "version": self.workflow_version, "name": "fake workflow", "date": _iso(0),
+            "author": {}, "workflowComponents": [], "executionPrice": 10,
+        }
+
+    def organization_json(self) -> dict:
+        return {"id": ORGANIZATION_ID, "version": WORKFLOW_VERSION, "name": "fake organization", "members": []}
+
+    def execution_json(self, execution_id: str) -> dict:
+        execution = dict(self.executions[execution_id])
+        done = time.time() - execution["createdAt"] >= self.processing_time
+        if done and execution.pop("failed"):
+            return {**execution, **{
+                "status": "FAILED", "startedAt": None, "finishedAt": None, "resultContentHash": None,
+                "resultContentType": None, "resultFileName": None, "resultPath": None, "chargedCredits": 0,
+                "createdAt": _iso(execution["createdAt"]),
+            }}
+        execution.pop("failed", None)
+        execution.update({
+            "status": "COMPLETED" if done else "ACTIVE",
+            "startedAt": _iso(execution["createdAt"]),
+            "finishedAt": _iso(execution["createdAt"] + self.processing_time) if done else None,
+            "resultContentHash": execution["inputContentHash"] if done else None,
+            "resultContentType": "image/jpeg" if done else None,
+            "resultFileName": execution["inputFileName"] if done else None,
+            "resultPath": f"/image/{execution['inputContentHash']}/{execution['inputFileName']}" if done else None,
+            "chargedCredits": 10 if done else 0,
+            "createdAt": _iso(execution["createdAt"]),
+        })
+        return execution
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _parse_multipart_file(content_type: str, body: bytes):
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    for part in message.iter_parts():
+        if part.get_param("name", header="content-disposition") == "file":
+            return part.get_filename(), part.get_payload(decode=True)
+    raise ValueError("no file in multipart body")
+
+
+def _handler_for(server: FakeAutoRetouchServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            with server.lock:
+                server.connections += 1
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: bytes = b"", content_type: str = "text/plain"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _injected(self, route: str) -> bool:
+            if server.latency:
+                time.sleep(server.latency)
+            injected = server.count(route)
+            with server.lock:
+                stalls = server.stalls.get(route)
+                stall = stalls.pop(0) if stalls else None
+            if stall is not None:
+                time.sleep(stall)
+                self.close_connection = True
+                return True
+            if injected is None:
+                return False
+            status, headers = injected
+            self.send_response(status)
+            for key, value in {**headers, "Content-Length": "0"}.items():
+                self.send_header(key, value)
+            self.end_headers()
+            return True
+
+        def _json(self, payload, status: int = 200):
+            self._send(status, json.dumps(payload).encode(), "application/json")
+
+        def _page(self, entries: list, query: Dict[str, List[str]]):
+            offset, limit = int(query.get("offset", ["0"])[0]), int(query.get("limit", ["50"])[0])
+            return self._json({"entries": entries[offset:offset + limit], "total": len(entries)})
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == "/_stats":
+                return self._json(server.stats())
+            if url.path == "/health":
+                if self._injected("health"):
+                    return
+                return self._send(200)
+            if url.path == "/v1/organization/balance":
+                if self._injected("balance"):
+                    return
+                return self._send(200, b"1000")
+            if url.path == "/v1/organization":
+                if self._injected("organizations"):
+                    return
+                return self._page([server.organization_json()], query)
+            if url.path == f"/v1/organization/{ORGANIZATION_ID}":
+                if self._injected("organization"):
+                    return
+                return self._json(server.organization_json())
+            if url.path == "/v1/workflow":
+                if self._injected("workflows"):
+                    return
+                return self._page([server.workflow_json()], query)
+            if url.path == f"/v1/workflow/{WORKFLOW_ID}":
+                if self._injected("workflow"):
+                    return
+                return self._json(server.workflow_json())
+            if url.path == "/v1/workflow/execution":
+                if self._injected("list"):
+                    return
+                with server.lock:
+                    entries = [server.execution_json(e) for e in server.executions]
+                entries = [e for e in entries if e["workflow"] == query["workflow"][0]]
+                entries.sort(key=lambda e: e["createdAt"], reverse=True)
+                return self._page(entries, query)
+            match = re.fullmatch(r"/v1/workflow/execution/([^/]+)/status", url.path)
+            if match:
+                if self._injected("status"):
+                    return
+                return self._stream_status(match.group(1))
+            match = re.fullmatch(r"/v1/workflow/execution/([^/]+)", url.path)
+            if match:
+                if self._injected("details"):
+                    return
+                with server.lock:
+                    if match.group(1) not in server.executions:
+                        return self._send(404)
+                    return self._json(server.execution_json(match.group(1)))
+            match = re.fullmatch(r"/v1/image/([^/]+)/(.+)", url.path)
+            if match:
+                if self._injected("download"):
+                    return
+                content = server.images.get(match.group(1))
+                if content is None:
+                    return self._send(404)
+                server.record_download(match.group(1))
+                return self._send(200, content, "image/jpeg")
+            self._send(404)
+
+        def _stream_status(self, execution_id: str):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            while True:
+                with server.lock:
+                    status = server.execution_json(execution_id)["status"]
+                event = f"event: status\ndata: {json.dumps({'status': status})}\n\n".encode()
+                self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+                if status in ("COMPLETED", "FAILED"):
+                    break
+                time.sleep(min(0.05, server.processing_time))
+            self.wfile.write(b"0\r\n\r\n")
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            body = self._body()
+            if url.path == "/oauth/token":
+                if self._injected("token"):
+                    return
+                return self._json({
+                    "access_token": "access", "scope": "offline_access", "expires_in": 3600, "token_type": "Bearer"
+                })
+            if url.path == "/v1/upload":
+                if self._injected("upload"):
+                    return
+                if self.headers["Content-Type"].startswith("application/json"):
+                    urls = json.loads(body)["urls"]
+                    return self._json({
+                        "urls": {
+                            name: server.store_image(urllib.request.urlopen(url, timeout=10).read())
+                            for name, url in urls.items()
+                        }
+                    })
+                _, content = _parse_multipart_file(self.headers["Content-Type"], body)
+                return self._send(200, server.store_image(content).encode())
+            if url.path == "/v1/workflow/execution/create":
+                if self._injected("create"):
+                    return
+                labels = {
+                    k[len("label["):-1]: v[0] for k, v in query.items() if k.startswith("label[")
+                }
+                if self.headers["Content-Type"].startswith("multipart/form-data"):
+                    server.count("create_upload")
+                    name, content = _parse_multipart_file(self.headers["Content-Type"], body)
+                    content_hash = server.store_image(content)
+                    webhooks = []
+                else:
+                    payload = json.loads(body)
+                    name, content_hash = payload["image"]["name"], payload["image"]["contentHash"]
+                    webhooks = payload.get("webhooks") or []
+                    if content_hash not in server.images:
+                        return self._send(400)
+                execution_id = server.create_execution(
+                    content_hash, name, query["workflow"][0], labels, query.get("version", [None])[0]
+                )
+                server.webhooks[execution_id] = webhooks
+                server.schedule_webhooks(execution_id)
+                return self._send(200, execution_id.encode())
+            match = re.fullmatch(r"/v1/workflow/execution/([^/]+)/retry", url.path)
+            if match:
+                if self._injected("retry"):
+                    return
+                with server.lock:
+                    server.executions[match.group(1)].update(failed=False, createdAt=time.time())
+                server.schedule_webhooks(match.group(1))
+                return self._send(200)
+            self._send(404)
+
+    return Handler
+
+
+def _serve(server_kwargs: dict, api_config: "multiprocessing.Queue", stop: "multiprocessing.Event"):
+    with FakeAutoRetouchServer(**server_kwargs) as server:
+        api_config.put(server.api_config)
+        stop.wait()
+
+
+@contextlib.contextmanager
+def server_process(**server_kwargs) -> Iterator[ApiConfig]:
+    """
+    run a `FakeAutoRetouchServer` in its own process, so that it does not compete with the client for the GIL
+
+    yields the `ApiConfig` of the server, whose stats are served at `/_stats`
+    """
+    context = multiprocessing.get_context("spawn")
+    api_config, stop = context.Queue(), context.Event()
+    process = context.Process(target=_serve, args=(server_kwargs, api_config, stop), daemon=True)
+    process.start()
+    try:
+        yield api_config.get(timeout=30)
+    finally:
+        stop.set()
+        process.join()
+
+
+class FakeServerTestCase(TestCase):
+    """
+    run every test against its own `FakeAutoRetouchServer` in `server`, with a temporary directory in `tmp` and a
+    client of the server in `client`
+
+    Subclasses set `server_kwargs` and override `client_kwargs` to change the server and the client. With
+    `create_client = False`, tests build their own clients from `client_kwargs`.
+    """
+
+    #: keyword arguments of the `FakeAutoRetouchServer`
+    server_kwargs: dict = {}
+    create_client = True
+
+    def setUp(self) -> None:
+        self.server = FakeAutoRetouchServer(**self.server_kwargs).start()
+        self.addCleanup(self.server.stop)
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        if self.create_client:
+            self.client = AutoRetouchAPIClient(**self.client_kwargs())
+            self.addCleanup(self.client.close)
+
+    def client_kwargs(self, **kwargs) -> dict:
+        """the keyword arguments of a client of the server, with `kwargs` added or replacing the defaults"""
+        return {
+            "organization_id": ORGANIZATION_ID,
+            "workflow_id": WORKFLOW_ID,
+            "api_config": self.server.api_config,
+            "refresh_token": "refresh",
+            "credentials_path": None,
+            "save_credentials": False,
+            "user_agent": USER_AGENT,
+            **kwargs,
+        }
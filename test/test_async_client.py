@@ -0,0 +1,83 @@
+import asyncio
+import os
+import shutil
+
+import aiohttp
+from assertpy import assert_that
+
+from autoretouch.api_client.async_client import AsyncAutoRetouchAPIClient
+from autoretouch.api_client.retry import RetryPolicy
+from autoretouch.api_client.schedule import FixedPollSchedule
+from test.fake_server import FakeServerTestCase, INPUT_IMAGE, WORKFLOW_ID
+
+
+class AsyncClientTest(FakeServerTestCase):
+
+    create_client = False
+
+    def _client(self, **kwargs) -> AsyncAutoRetouchAPIClient:
+        return AsyncAutoRetouchAPIClient(**self.client_kwargs(poll_schedule=FixedPollSchedule(0.05), **kwargs))
+
+    def test_upload_image_returns_content_hash(self):
+        async def run():
+            async with self._client() as client:
+                return await client.upload_image(INPUT_IMAGE)
+
+        assert_that(asyncio.run(run())).is_equal_to(
+            "8bcac2125bd98cd96ba75667b9a8832024970ac05bf4123f864bb63bcfefbcf7"
+        )
+
+    def test_process_folder_downloads_every_result(self):
+        input_dir = os.path.join(self.tmp, "in")
+        os.makedirs(input_dir)
+        for i in range(20):
+            shutil.copy(INPUT_IMAGE, os.path.join(input_dir, f"image_{i}.jpeg"))
+
+        async def run():
+            async with self._client() as client:
+                await client.process_folder(input_dir, os.path.join(self.tmp, "out"), concurrency=5)
+
+        asyncio.run(run())
+
+        assert_that(sorted(os.listdir(os.path.join(self.tmp, "out")))).is_equal_to(sorted(os.listdir(input_dir)))
+        assert_that(self.server.requests["create"]).is_equal_to(20)
+        assert_that(self.server.requests["token"]).is_equal_to(1)
+
+    def test_uploads_streams_and_streams_results_to_disk(self):
+        async def run():
+            async with self._client() as client:
+                with open(INPUT_IMAGE, "rb") as f:
+                    content_hash = await client.upload_image_from_stream(f)
+                await client.process_image(INPUT_IMAGE, self.tmp)
+                return content_hash, await client.get_balance()
+
+        content_hash, balance = asyncio.run(run())
+
+        with open(INPUT_IMAGE, "rb") as f, open(os.path.join(self.tmp, "input_image.jpeg"), "rb") as result:
+            assert_that(result.read()).is_equal_to(f.read())
+        assert_that(content_hash).is_equal_to("8bcac2125bd98cd96ba75667b9a8832024970ac05bf4123f864bb63bcfefbcf7")
+        assert_that(balance).is_equal_to(1000)
+        assert_that([name for name in os.listdir(self.tmp) if name.endswith(".part")]).is_empty()
+
+    def test_requests_follow_the_retry_policy(self):
+        self.server.inject("upload", 502, 503)
+        self.server.inject("create", 429, headers={"Retry-After": "0"})
+        self.server.stall("details", 1.0)
+
+        async def run():
+            async with self._client(retry_policy=RetryPolicy(backoff=0.01), timeout=(1.0, 0.2)) as client:
+                content_hash = await client.upload_image(INPUT_IMAGE)
+                execution_id = await client.create_workflow_execution_for_image_file(WORKFLOW_ID, INPUT_IMAGE)
+                await client.get_workflow_execution_details(execution_id)
+                self.server.inject("create", 502)
+                try:
+                    await client.create_workflow_execution_for_image_file(WORKFLOW_ID, INPUT_IMAGE)
+                except aiohttp.ClientResponseError as e:
+                    return content_hash, e.status
+
+        content_hash, status = asyncio.run(run())
+
+        assert_that(content_hash).is_equal_to("8bcac2125bd98cd96ba75667b9a8832024970ac05bf4123f864bb63bcfefbcf7")
+        assert_that(status).is_equal_to(502)
+        # the bad gateway of a non-idempotent request is not retried
+        assert_that(self.server.requests).contains_entry({"upload": 3}, {"create": 3}, {"details": 2})
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+
+from assertpy import assert_that
+
+from autoretouch.cli import completion
+
+
+class CompletionCacheTest(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "completion.json")
+        completion.update_cache(
+            organizations=[SimpleNamespace(id="0a1b", name="Acme"), SimpleNamespace(id="9f8e", name="Other")],
+            workflows={
+                "0a1b": [SimpleNamespace(id="1111", name="Packshots"), SimpleNamespace(id="2222", name="Portraits")],
+                "9f8e": [SimpleNamespace(id="3333", name="Shoes")],
+            },
+            path=self.path,
+        )
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+
+    def test_completes_names_and_ids_from_the_cache_without_refreshing(self):
+        with patch("subprocess.Popen") as popen:
+            start = time.perf_counter()
+            by_name = completion.organizations("ac", self.path)
+            by_id = completion.organizations("9f", self.path)
+            elapsed = time.perf_counter() - start
+
+        assert_that([(item.value, item.help) for item in by_name]).is_equal_to([("0a1b", "Acme")])
+        assert_that([item.value for item in by_id]).is_equal_to(["9f8e"])
+        assert_that(elapsed).is_less_than(0.1)
+        popen.assert_not_called()
+
+    def test_completes_the_workflows_of_the_organization_or_of_all(self):
+        assert_that([item.value for item in completion.workflows("0a1b", "P", self.path)]) \
+            .is_equal_to(["1111", "2222"])
+        assert_that([item.value for item in completion.workflows(None, "", self.path)]) \
+            .is_equal_to(["1111", "2222", "3333"])
+
+    def test_update_keeps_the_workflows_of_other_organizations(self):
+        completion.update_cache(workflows={"9f8e": [SimpleNamespace(id="4444", name="Bags")]}, path=self.path)
+
+        cache = completion.read_cache(self.path)
+        assert_that(cache["organizations"]).is_length(2)
+        assert_that([w["id"] for w in cache["workflows"]["0a1b"]]).is_equal_to(["1111", "2222"])
+        assert_that([w["id"] for w in cache["workflows"]["9f8e"]]).is_equal_to(["4444"])
+
+    def test_a_stale_or_missing_cache_is_refreshed_in_the_background_once(self):
+        missing = os.path.join(self.tmp, "missing.json")
+        with patch("subprocess.Popen") as popen:
+            assert_that(completion.organizations("", missing)).is_empty()
+            assert_that(completion.workflows(None, "", missing)).is_empty()
+
+        popen.assert_called_once()
+        assert_that(popen.call_args[0][0][-2:]).is_equal_to(["autoretouch.cli.completion", missing])
@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+import requests
+from assertpy import assert_that
+
+from test.benchmark_throughput import SCENARIO_FOLDER, create_images, run_benchmark
+from test.fake_server import FakeAutoRetouchServer, server_process
+
+
+class FakeServerTest(TestCase):
+
+    def test_throttles_beyond_the_rate_limit(self):
+        with FakeAutoRetouchServer(rate_limit=5) as server:
+            statuses = [requests.get(f"{server.url}/health").status_code for _ in range(10)]
+
+        assert_that(statuses[:5]).is_equal_to([200] * 5)
+        assert_that(statuses).contains(429)
+        assert_that(server.requests["throttled"]).is_equal_to(statuses.count(429))
+
+    def test_answers_a_share_of_requests_with_errors(self):
+        with FakeAutoRetouchServer(error_rate=0.5, seed=1) as server:
+            statuses = [requests.get(f"{server.url}/health").status_code for _ in range(40)]
+
+        assert_that(statuses.count(503)).is_between(5, 35)
+
+    def test_delays_every_request(self):
+        with FakeAutoRetouchServer(latency=0.05) as server:
+            start = time.perf_counter()
+            for _ in range(3):
+                requests.get(f"{server.url}/health")
+            elapsed = time.perf_counter() - start
+
+        assert_that(elapsed).is_greater_than_or_equal_to(0.15)
+
+
+class BenchmarkTest(TestCase):
+
+    def test_measures_a_folder_run(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            input_dir = os.path.join(tmp, "input")
+            create_images(input_dir, 3, size_kib=1)
+            with server_process() as api_config:
+                result = run_benchmark(api_config, SCENARIO_FOLDER, input_dir, os.path.join(tmp, "output"))
+            outputs = os.listdir(os.path.join(tmp, "output"))
+        finally:
+            shutil.rmtree(tmp)
+
+        assert_that(outputs).is_length(3)
+        assert_that(result.images).is_equal_to(3)
+        assert_that(result.images_per_second).is_positive()
+        assert_that(result.requests_per_image).is_greater_than_or_equal_to(3)
+        assert_that(result.peak_threads).is_greater_than(1)
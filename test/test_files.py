@@ -0,0 +1,41 @@
+import hashlib
+import os
+import tempfile
+from unittest import TestCase
+
+from assertpy import assert_that
+
+from autoretouch.api_client.files import write_atomically
+
+
+class WriteAtomicallyTest(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.target = os.path.join(self.tmp, "out", "result.jpeg")
+
+    def test_writes_chunks_and_returns_their_hash(self):
+        content_hash = write_atomically([b"abc", b"def"], self.target, hashlib.sha256(b"abcdef").hexdigest())
+
+        assert_that(content_hash).is_equal_to(hashlib.sha256(b"abcdef").hexdigest())
+        with open(self.target, "rb") as f:
+            assert_that(f.read()).is_equal_to(b"abcdef")
+        assert_that(os.listdir(os.path.dirname(self.target))).is_equal_to(["result.jpeg"])
+
+    def test_hash_mismatch_keeps_previous_file(self):
+        write_atomically([b"previous"], self.target)
+
+        assert_that(write_atomically).raises(RuntimeError).when_called_with([b"corrupt"], self.target, "0" * 64)
+
+        with open(self.target, "rb") as f:
+            assert_that(f.read()).is_equal_to(b"previous")
+        assert_that(os.listdir(os.path.dirname(self.target))).is_equal_to(["result.jpeg"])
+
+    def test_interrupted_stream_leaves_no_partial_file(self):
+        def chunks():
+            yield b"partial"
+            raise ConnectionError("reset")
+
+        assert_that(write_atomically).raises(ConnectionError).when_called_with(chunks(), self.target)
+
+        assert_that(os.listdir(os.path.dirname(self.target))).is_empty()
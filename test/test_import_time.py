@@ -0,0 +1,61 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Dict
+from unittest import TestCase
+
+from assertpy import assert_that
+
+# cumulative microseconds `import autoretouch.cli.commands` may take, e.g. for `autoretouch --help`
+IMPORT_BUDGET_US = int(os.environ.get("AUTORETOUCH_IMPORT_BUDGET_US", 100_000))
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module: str, env: Dict[str, str] = None) -> Dict[str, int]:
+    """the cumulative import time in microseconds of every module imported by `import module`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=ROOT, env=env, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class ImportTimeTest(TestCase):
+
+    def test_cli_does_not_import_the_client(self):
+        times = import_times("autoretouch.cli.commands")
+
+        assert_that(times).does_not_contain_key("requests", "aiohttp", "autoretouch.api_client.client")
+
+    def test_cli_import_within_budget(self):
+        # best of a few runs, to not fail on a busy machine
+        best = min(import_times("autoretouch.cli.commands")["autoretouch.cli.commands"] for _ in range(3))
+
+        assert_that(best).is_less_than(IMPORT_BUDGET_US)
+
+    def test_client_does_not_import_what_only_some_features_need(self):
+        times = import_times("autoretouch.api_client.client")
+
+        assert_that(times).does_not_contain_key("asyncio", "sqlite3", "multiprocessing", "http.server")
+
+    def test_user_config_is_not_read_at_import(self):
+        home = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(home, ".config"))
+            with open(os.path.join(home, ".config", "autoretouch-config.json"), "w") as f:
+                f.write("not json")
+            env = {**os.environ, "HOME": home}
+
+            times = import_times("autoretouch.api_client.client", env)
+        finally:
+            shutil.rmtree(home)
+
+        assert_that(times).contains_key("autoretouch.api_client.client")
@@ -0,0 +1,98 @@
+import os
+import urllib.request
+from dataclasses import replace
+from unittest import TestCase
+
+from assertpy import assert_that
+
+from autoretouch.api_client.exporters import PrometheusExporter, route_of
+from autoretouch.api_client.instrumentation import (
+    Instrumentation, RequestEvent, StageEvent, STAGE_DOWNLOAD, STAGE_PROCESSING, STAGE_QUEUE, STAGE_UPLOAD
+)
+from test.fake_server import FakeServerTestCase, INPUT_IMAGE
+
+
+class InstrumentationTest(FakeServerTestCase):
+
+    server_kwargs = {"processing_time": 0.1}
+
+    def setUp(self) -> None:
+        self.events = []
+        self.exporter = PrometheusExporter()
+        self.addCleanup(self.exporter.stop)
+        super().setUp()
+
+    def client_kwargs(self, **kwargs) -> dict:
+        return super().client_kwargs(instrumentation=Instrumentation(self.events.append, self.exporter), **kwargs)
+
+    def test_reports_every_request(self):
+        self.client.process_image(INPUT_IMAGE, self.tmp)
+
+        requests = [event for event in self.events if isinstance(event, RequestEvent)]
+        assert_that(requests).is_not_empty()
+        assert_that([event.status for event in requests]).contains_only(200)
+        assert_that([event.attempt for event in requests]).contains_only(0)
+        create = next(event for event in requests if "/workflow/execution/create" in event.url)
+        assert_that(create.bytes_sent).is_greater_than(os.path.getsize(INPUT_IMAGE))
+        # the first request opens the connection, later ones reuse it
+        assert_that(requests[0].connect).is_not_none()
+        assert_that(requests[0].dns).is_not_none()
+        assert_that(requests[-1].connect).is_none()
+        assert_that(requests[-1].dns).is_none()
+
+    def test_times_the_name_resolution_apart_from_connecting(self):
+        url = self.server.api_config.BASE_API_URL_CURRENT.replace("127.0.0.1", "localhost")
+        self.client.api_config = replace(self.server.api_config, BASE_API_URL_CURRENT=url)
+
+        self.client.get_balance()
+
+        balance = next(event for event in self.events if isinstance(event, RequestEvent) and "balance" in event.url)
+        assert_that(balance.url).starts_with("http://localhost:")
+        assert_that(balance.status).is_equal_to(200)
+        assert_that(balance.dns).is_not_none().is_greater_than_or_equal_to(0)
+        assert_that(balance.connect).is_not_none().is_greater_than_or_equal_to(0)
+        assert_that(balance.dns + balance.connect).is_less_than_or_equal_to(balance.duration)
+
+    def test_reports_the_stages_of_an_image(self):
+        self.client.process_image(INPUT_IMAGE, self.tmp)
+
+        stages = [event for event in self.events if isinstance(event, StageEvent)]
+        assert_that([event.stage for event in stages]).is_equal_to(
+            [STAGE_UPLOAD, STAGE_QUEUE, STAGE_PROCESSING, STAGE_DOWNLOAD]
+        )
+        assert_that(stages[0].bytes).is_equal_to(os.path.getsize(INPUT_IMAGE))
+        assert_that(stages[-1].bytes).is_positive()
+
+    def test_a_failing_listener_does_not_fail_the_client(self):
+        def fail(event):
+            raise ValueError(event)
+
+        self.client.instrumentation.subscribe(fail)
+
+        self.client.process_image(INPUT_IMAGE, self.tmp)
+
+        assert_that(os.path.isfile(os.path.join(self.tmp, "input_image.jpeg"))).is_true()
+
+    def test_serves_prometheus_metrics(self):
+        self.client.process_image(INPUT_IMAGE, self.tmp)
+        self.exporter.serve()
+
+        with urllib.request.urlopen(self.exporter.url, timeout=5) as response:
+            metrics = response.read().decode()
+
+        assert_that(metrics).contains('autoretouch_requests_total{method="POST",route="/v1/workflow/execution/create",status="200"} 1')
+        assert_that(metrics).contains('autoretouch_stage_duration_seconds_count{stage="download"} 1')
+        assert_that(metrics).contains("# TYPE autoretouch_request_duration_seconds histogram")
+        assert_that(metrics).contains("autoretouch_dns_duration_seconds_count 1")
+
+
+class RouteTest(TestCase):
+
+    def test_replaces_ids_and_hashes(self):
+        execution_id = "e722e62e-5b2e-48e1-8638-25890e7279e3"
+        content_hash = "a" * 64
+
+        assert_that(route_of(f"https://api.example.com/v1/workflow/execution/{execution_id}?organization=x")) \
+            .is_equal_to("/v1/workflow/execution/{id}")
+        assert_that(route_of(f"https://api.example.com/v1/image/{content_hash}/image.jpeg")) \
+            .is_equal_to("/v1/image/{hash}/{name}")
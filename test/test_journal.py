@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from uuid import uuid4
+
+from assertpy import assert_that
+
+from autoretouch.api_client.journal import JobJournal
+from autoretouch.api_client.pipeline import BatchPipeline
+from test.fake_server import FakeServerTestCase, INPUT_IMAGE, ORGANIZATION_ID, WORKFLOW_ID
+
+
+class JobJournalTest(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.journal = JobJournal(os.path.join(self.tmp, "journal.sqlite"))
+
+    def tearDown(self) -> None:
+        self.journal.close()
+        shutil.rmtree(self.tmp)
+
+    def test_records_every_step(self):
+        execution_id = uuid4()
+        self.journal.record_hash("a.jpeg", "hash")
+        self.journal.record_execution("a.jpeg", execution_id)
+        self.journal.record_status("a.jpeg", "COMPLETED")
+        self.journal.record_downloaded("a.jpeg", "out/a.jpeg")
+
+        entry = self.journal.get("a.jpeg")
+
+        assert_that(entry.content_hash).is_equal_to("hash")
+        assert_that(entry.execution_id).is_equal_to(execution_id)
+        assert_that(entry.status).is_equal_to("COMPLETED")
+        assert_that(entry.downloaded).is_true()
+        assert_that(self.journal.get("b.jpeg")).is_none()
+
+    def test_new_hash_starts_image_over(self):
+        self.journal.record_execution("a.jpeg", uuid4())
+        self.journal.record_downloaded("a.jpeg", "out/a.jpeg")
+
+        self.journal.record_hash("a.jpeg", "new hash")
+
+        entry = self.journal.get("a.jpeg")
+        assert_that(entry.execution_id).is_none()
+        assert_that(entry.downloaded).is_false()
+
+
+class ResumeTest(FakeServerTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.journal = JobJournal(os.path.join(self.tmp, "journal.sqlite"))
+        self.images = []
+        for i in range(4):
+            self.images.append(os.path.join(self.tmp, f"image_{i}.jpeg"))
+            shutil.copy(INPUT_IMAGE, self.images[-1])
+
+    def tearDown(self) -> None:
+        self.journal.close()
+
+    def _run(self, **kwargs):
+        BatchPipeline(
+            self.client, WORKFLOW_ID, ORGANIZATION_ID, poll_interval=0.05, journal=self.journal, **kwargs
+        ).run(self.images, os.path.join(self.tmp, "out"))
+
+    def test_resume_only_does_what_is_missing(self):
+        self._run()
+        assert_that(self.server.requests["create"]).is_equal_to(4)
+
+        # image 0 was interrupted before its result was downloaded, image 1 lost its output
+        self.journal.record_execution(self.images[0], self.journal.get(self.images[0]).execution_id)
+        os.remove(os.path.join(self.tmp, "out", "image_0.jpeg"))
+        os.remove(os.path.join(self.tmp, "out", "image_1.jpeg"))
+
+        self._run()
+
+        assert_that(self.server.requests["create"]).is_equal_to(4)
+        assert_that(self.server.requests["details"]).is_equal_to(2)
+        assert_that(self.server.requests["download"]).is_equal_to(6)
+        assert_that(sorted(os.listdir(os.path.join(self.tmp, "out")))).is_length(4)
+
+    def test_a_failing_callback_does_not_stop_skipping_downloaded_images(self):
+        self._run()
+        reported = []
+
+        def on_result(path, error):
+            reported.append(path)
+            raise ValueError(path)
+
+        self._run(upload_workers=1, on_result=on_result)
+
+        assert_that(sorted(reported)).is_equal_to(sorted(self.images))
+        assert_that(self.server.requests["create"]).is_equal_to(4)
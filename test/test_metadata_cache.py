@@ -0,0 +1,110 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from time import sleep
+from unittest import TestCase
+
+from assertpy import assert_that
+
+from autoretouch.api_client.async_client import AsyncAutoRetouchAPIClient
+from autoretouch.api_client.client import AutoRetouchAPIClient
+from autoretouch.api_client.metadata_cache import MetadataCache
+from test.fake_server import FakeServerTestCase, ORGANIZATION_ID, WORKFLOW_ID, WORKFLOW_VERSION
+
+
+class MetadataCacheTest(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+
+    def test_entries_expire_after_their_kinds_ttl(self):
+        cache = MetadataCache(ttl=60, ttls={"balance": 0.05})
+        cache.put("workflow/org/id", {"id": "id"})
+        cache.put("balance/org", "100")
+
+        sleep(0.1)
+
+        assert_that(cache.get("workflow/org/id")).is_equal_to({"id": "id"})
+        assert_that(cache.get("balance/org")).is_none()
+
+    def test_invalidate_by_kind_or_all(self):
+        path = os.path.join(self.tmp, "metadata.sqlite")
+        cache = MetadataCache(path=path)
+        cache.put("workflow/org/id", {"id": "id"})
+        cache.put("workflows/org", {"entries": []})
+        cache.put("organizations", {"entries": []})
+
+        cache.invalidate("workflow")
+        assert_that(cache.get("workflow/org/id")).is_none()
+        assert_that(cache.get("workflows/org")).is_not_none()
+        cache.invalidate()
+        assert_that(cache.get("organizations")).is_none()
+        cache.close()
+
+        assert_that(MetadataCache(path=path).get("workflows/org")).is_none()
+
+    def test_entries_on_disk_outlive_the_process(self):
+        path = os.path.join(self.tmp, "metadata.sqlite")
+        cache = MetadataCache(path=path)
+        cache.put("organizations", {"entries": [1]})
+        cache.close()
+
+        assert_that(MetadataCache(path=path).get("organizations")).is_equal_to({"entries": [1]})
+
+
+class ClientMetadataCacheTest(FakeServerTestCase):
+
+    create_client = False
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.cache_path = os.path.join(self.tmp, "metadata.sqlite")
+
+    def client(self) -> AutoRetouchAPIClient:
+        return AutoRetouchAPIClient(**self.client_kwargs(metadata_cache=MetadataCache(path=self.cache_path)))
+
+    def test_repeated_lookups_are_served_from_the_cache(self):
+        with self.client() as client:
+            for _ in range(3):
+                assert_that(str(client.get_workflow(WORKFLOW_ID).version)).is_equal_to(WORKFLOW_VERSION)
+                assert_that(client.get_workflows()).is_length(1)
+                assert_that(str(client.get_organization().id)).is_equal_to(ORGANIZATION_ID)
+                assert_that(client.get_balance()).is_equal_to(1000)
+
+        assert_that(self.server.requests).contains_entry(
+            {"workflow": 1}, {"workflows": 1}, {"organization": 1}, {"balance": 1}
+        )
+
+    def test_new_client_needs_no_network_round_trip(self):
+        with self.client() as client:
+            client.get_organizations()
+        self.server.requests.clear()
+
+        with self.client() as client:
+            assert_that(client.get_organizations()).is_length(1)
+
+        assert_that(self.server.requests).is_empty()
+
+    def test_invalidated_metadata_is_fetched_again(self):
+        with self.client() as client:
+            client.get_workflow(WORKFLOW_ID)
+            self.server.workflow_version = "9b6f3e2a-7c1d-4e8f-a5b4-3c2d1e0f9a8b"
+            assert_that(str(client.get_workflow(WORKFLOW_ID).version)).is_equal_to(WORKFLOW_VERSION)
+
+            client.invalidate_metadata("workflow")
+
+            assert_that(str(client.get_workflow(WORKFLOW_ID).version)).is_equal_to(self.server.workflow_version)
+
+    def test_async_client_shares_the_cache(self):
+        async def run():
+            async with AsyncAutoRetouchAPIClient(**self.client_kwargs(metadata_cache=MetadataCache())) as client:
+                for _ in range(3):
+                    await client.get_workflow(WORKFLOW_ID)
+                return await client.get_balance()
+
+        assert_that(asyncio.run(run())).is_equal_to(1000)
+        assert_that(self.server.requests["workflow"]).is_equal_to(1)
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+from typing import List
+from unittest import TestCase
+
+from assertpy import assert_that
+
+from autoretouch.api_client.async_client import AsyncAutoRetouchAPIClient
+from autoretouch.api_client.client import AutoRetouchAPIClient
+from autoretouch.api_client.model import Page
+from autoretouch.api_client.pagination import aiter_pages, iter_pages
+from test.fake_server import FakeServerTestCase, WORKFLOW_ID
+
+
+class Listing:
+    """a listing of `total` numbers remembering the offsets it was asked for"""
+
+    def __init__(self, total: int):
+        self.entries = list(range(total))
+        self.offsets: List[int] = []
+        self.lock = threading.Lock()
+
+    def fetch_page(self, offset: int, limit: int) -> Page:
+        with self.lock:
+            self.offsets.append(offset)
+        return Page(entries=self.entries[offset:offset + limit], total=len(self.entries))
+
+    async def fetch_page_async(self, offset: int, limit: int) -> Page:
+        await asyncio.sleep(0)
+        return self.fetch_page(offset, limit)
+
+
+class IterPagesTest(TestCase):
+
+    def test_yields_all_entries_in_order(self):
+        for prefetch in (0, 1, 3):
+            listing = Listing(23)
+
+            assert_that(list(iter_pages(listing.fetch_page, page_size=5, prefetch=prefetch))) \
+                .is_equal_to(listing.entries)
+            assert_that(sorted(listing.offsets)).is_equal_to([0, 5, 10, 15, 20])
+
+    def test_is_lazy(self):
+        listing = Listing(100)
+        entries = iter_pages(listing.fetch_page, page_size=10)
+
+        assert_that([next(entries) for _ in range(12)]).is_equal_to(list(range(12)))
+        assert_that(listing.offsets).is_equal_to([0, 10])
+
+    def test_prefetches_a_bounded_number_of_pages(self):
+        listing = Listing(100)
+        entries = iter_pages(listing.fetch_page, page_size=10, prefetch=2)
+
+        next(entries)
+        entries.close()
+
+        assert_that(len(listing.offsets)).is_less_than_or_equal_to(3)
+
+    def test_stops_when_the_listing_shrinks(self):
+        listing = Listing(20)
+        entries = iter_pages(listing.fetch_page, page_size=5)
+        next(entries)
+        del listing.entries[3:]
+
+        assert_that(list(entries)).is_equal_to([1, 2, 3, 4])
+
+    def test_async_yields_all_entries_in_order(self):
+        async def collect(prefetch: int):
+            return [entry async for entry in aiter_pages(listing.fetch_page_async, page_size=5, prefetch=prefetch)]
+
+        for prefetch in (0, 2):
+            listing = Listing(23)
+
+            assert_that(asyncio.run(collect(prefetch))).is_equal_to(listing.entries)
+
+
+class ClientPaginationTest(FakeServerTestCase):
+
+    create_client = False
+
+    def setUp(self) -> None:
+        super().setUp()
+        content_hash = self.server.store_image(b"image")
+        self.execution_ids = [
+            self.server.create_execution(content_hash, f"{i}.jpg", WORKFLOW_ID, {}) for i in range(23)
+        ]
+
+    def test_iterates_over_all_executions(self):
+        with AutoRetouchAPIClient(**self.client_kwargs()) as client:
+            executions = list(client.iter_workflow_executions(WORKFLOW_ID, page_size=5, prefetch=2))
+
+        assert_that([str(e.id) for e in executions]).contains_only(*self.execution_ids).is_length(23)
+        assert_that(self.server.requests["list"]).is_equal_to(5)
+
+    def test_async_iterates_over_all_executions(self):
+        async def run():
+            async with AsyncAutoRetouchAPIClient(**self.client_kwargs()) as client:
+                return [e async for e in client.iter_workflow_executions(WORKFLOW_ID, page_size=5, prefetch=2)]
+
+        executions = asyncio.run(run())
+
+        assert_that([str(e.id) for e in executions]).contains_only(*self.execution_ids).is_length(23)
+
+    def test_get_organizations_and_workflows_page_through_everything(self):
+        with AutoRetouchAPIClient(**self.client_kwargs()) as client:
+            assert_that(list(client.iter_organizations(page_size=1))).is_length(1)
+            assert_that(client.get_workflows()).is_length(1)
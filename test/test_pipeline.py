@@ -0,0 +1,77 @@
+import os
+import threading
+from time import monotonic
+
+from assertpy import assert_that
+
+from autoretouch.api_client.pipeline import BatchPipeline
+from test.fake_server import FakeServerTestCase, INPUT_IMAGE, ORGANIZATION_ID, WORKFLOW_ID
+
+
+class BatchPipelineTest(FakeServerTestCase):
+
+    server_kwargs = {"processing_time": 0.2}
+
+    def test_bounds_images_in_flight_and_reads_input_lazily(self):
+        results = []
+        lock = threading.Lock()
+        max_seen = [0]
+
+        def on_result(path, error):
+            results.append((path, error))
+
+        def image_paths():
+            for i in range(30):
+                with lock:
+                    in_flight = self.server.requests.get("create", 0) - len(results)
+                    max_seen[0] = max(max_seen[0], in_flight)
+                yield INPUT_IMAGE
+
+        BatchPipeline(
+            self.client, WORKFLOW_ID, ORGANIZATION_ID,
+            upload_workers=2, download_workers=2, max_in_flight=5, poll_interval=0.05, on_result=on_result
+        ).run(image_paths(), os.path.join(self.tmp, "out"))
+
+        assert_that(results).is_length(30)
+        assert_that([error for _, error in results]).contains_only(None)
+        assert_that(max_seen[0]).is_less_than_or_equal_to(5)
+
+    def test_reports_failures_without_stopping(self):
+        results = []
+        missing = os.path.join(self.tmp, "missing.jpeg")
+
+        BatchPipeline(
+            self.client, WORKFLOW_ID, ORGANIZATION_ID, poll_interval=0.05,
+            on_result=lambda path, error: results.append((path, error))
+        ).run([missing, INPUT_IMAGE], os.path.join(self.tmp, "out"))
+
+        errors = dict(results)
+        assert_that(errors[missing]).is_instance_of(FileNotFoundError)
+        assert_that(errors[INPUT_IMAGE]).is_none()
+
+    def test_fails_images_whose_execution_does_not_finish_in_time(self):
+        self.server.processing_time = 60
+        results = []
+
+        BatchPipeline(
+            self.client, WORKFLOW_ID, ORGANIZATION_ID, poll_interval=0.05, execution_timeout=0.3,
+            on_result=lambda path, error: results.append((path, error))
+        ).run([INPUT_IMAGE], os.path.join(self.tmp, "out"))
+
+        assert_that(results).is_length(1)
+        assert_that(results[0][1]).is_instance_of(TimeoutError)
+
+    def test_gives_up_on_stuck_downloads_without_waiting_for_them(self):
+        self.server.stall("download", 5.0)
+        results = []
+        started = monotonic()
+
+        BatchPipeline(
+            self.client, WORKFLOW_ID, ORGANIZATION_ID, download_workers=1, poll_interval=0.05, execution_timeout=1.0,
+            on_result=lambda path, error: results.append((path, error))
+        ).run([INPUT_IMAGE] * 6, os.path.join(self.tmp, "out"))
+
+        assert_that(monotonic() - started).is_less_than(4.0)
+        assert_that(results).is_length(6)
+        # the only download thread is stuck on the first image, the others queue behind it
+        assert_that([type(error) for _, error in results]).contains_only(TimeoutError)
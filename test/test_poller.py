@@ -0,0 +1,89 @@
+from unittest import TestCase
+from uuid import uuid4
+
+from assertpy import assert_that
+
+from autoretouch.api_client.model import Page
+from autoretouch.api_client.poller import ExecutionStatusPoller
+
+
+class _Execution:
+    def __init__(self, status: str):
+        self.id = uuid4()
+        self.status = status
+
+
+class _ListingClient:
+    def __init__(self, executions):
+        self.executions = executions
+        self.offsets = []
+        self.details = []
+
+    def get_workflow_executions(self, workflow_id, organization_id=None, limit=50, offset=0):
+        self.offsets.append(offset)
+        return Page(entries=self.executions[offset:offset + limit], total=len(self.executions))
+
+    def get_workflow_execution_details(self, execution_id, organization_id=None):
+        self.details.append(execution_id)
+        execution = _Execution("COMPLETED")
+        execution.id = execution_id
+        return execution
+
+
+class ExecutionStatusPollerTest(TestCase):
+
+    def test_stops_paging_once_all_tracked_executions_are_seen(self):
+        executions = [_Execution("COMPLETED") for _ in range(25)]
+        client = _ListingClient(executions)
+        poller = ExecutionStatusPoller(client, uuid4(), page_size=10)
+        for execution in executions[:12]:
+            poller.track(execution.id)
+
+        poller.poll_once()
+
+        assert_that(client.offsets).is_equal_to([0, 10])
+        assert_that(client.details).is_empty()
+        assert_that(poller.wait(executions[11].id, timeout=0).status).is_equal_to("COMPLETED")
+
+    def test_keeps_unfinished_executions_pending(self):
+        active = _Execution("ACTIVE")
+        poller = ExecutionStatusPoller(_ListingClient([active]), uuid4())
+        poller.track(active.id)
+
+        poller.poll_once()
+
+        assert_that(poller.wait).raises(TimeoutError).when_called_with(active.id, timeout=0)
+
+    def test_looks_up_executions_missing_from_listing(self):
+        client = _ListingClient([])
+        poller = ExecutionStatusPoller(client, uuid4())
+        missing = uuid4()
+        poller.track(missing)
+
+        poller.poll_once()
+
+        assert_that(client.details).is_equal_to([missing])
+        assert_that(poller.wait(missing, timeout=0).id).is_equal_to(missing)
+
+    def test_fails_executions_whose_lookups_keep_failing(self):
+        client = _ListingClient([])
+        client.get_workflow_execution_details = lambda execution_id, organization_id=None: 1 / 0
+        poller = ExecutionStatusPoller(client, uuid4(), max_failures=3)
+        missing, errors = uuid4(), []
+        poller.track(missing, callback=lambda execution: None, on_error=errors.append)
+
+        for _ in range(3):
+            poller.poll_once()
+
+        assert_that(errors).is_length(1)
+        assert_that(str(errors[0])).contains("failed 3 times in a row")
+
+    def test_fails_executions_that_do_not_finish_in_time(self):
+        active = _Execution("ACTIVE")
+        poller = ExecutionStatusPoller(_ListingClient([active]), uuid4(), timeout=0)
+        poller.track(active.id)
+
+        poller.poll_once()
+
+        assert_that(poller.wait).raises(TimeoutError).when_called_with(active.id, timeout=5) \
+            .contains("within 0 seconds")
@@ -0,0 +1,83 @@
+import os
+import shutil
+import time
+
+from assertpy import assert_that
+
+from autoretouch.api_client.client import COMPLETION_STREAM, COMPLETION_BATCH
+from autoretouch.api_client.upload_index import UploadIndex, sha256_file
+from autoretouch.api_client.schedule import BackoffPollSchedule, FixedPollSchedule
+from test.fake_server import FakeServerTestCase, INPUT_IMAGE, ORGANIZATION_ID, WORKFLOW_ID
+
+
+class ProcessImageTest(FakeServerTestCase):
+    """runs the high-level methods against the local fake server"""
+
+    processing_time = 0.5
+    server_kwargs = {"processing_time": processing_time}
+
+    def client_kwargs(self, **kwargs) -> dict:
+        return super().client_kwargs(poll_schedule=FixedPollSchedule(0.1), **kwargs)
+
+    def _input_dir(self, n_images: int) -> str:
+        input_dir = os.path.join(self.tmp, "in")
+        os.makedirs(input_dir, exist_ok=True)
+        for i in range(n_images):
+            shutil.copy(INPUT_IMAGE, os.path.join(input_dir, f"image_{i}.jpeg"))
+        return input_dir
+
+    def test_stream_completion_picks_up_result_without_polling(self):
+        start = time.perf_counter()
+        self.client.process_image(INPUT_IMAGE, self.tmp, completion=COMPLETION_STREAM)
+        elapsed = time.perf_counter() - start
+
+        assert_that(os.path.isfile(os.path.join(self.tmp, "input_image.jpeg"))).is_true()
+        assert_that(self.server.requests["status"]).is_equal_to(1)
+        assert_that(self.server.requests["details"]).is_equal_to(1)
+        assert_that(elapsed).is_less_than(self.processing_time + 1.0)
+
+    def test_status_blocking_returns_final_status(self):
+        execution_id = self.client.create_workflow_execution_for_image_file(WORKFLOW_ID, INPUT_IMAGE)
+
+        assert_that(self.client.get_workflow_execution_status_blocking(execution_id)).is_equal_to("COMPLETED")
+
+    def test_batch_completion_resolves_statuses_through_listing(self):
+        input_dir = self._input_dir(20)
+
+        self.client.process_folder(
+            input_dir, os.path.join(self.tmp, "out"), completion=COMPLETION_BATCH, upload_workers=3, download_workers=2
+        )
+
+        assert_that(os.listdir(os.path.join(self.tmp, "out"))).is_length(20)
+        assert_that(self.server.requests["download"]).is_equal_to(20)
+        assert_that(self.server.requests.get("details", 0)).is_equal_to(0)
+        assert_that(self.server.requests["list"]).is_less_than(10)
+
+    def test_learned_runtime_lets_backoff_poll_near_completion(self):
+        schedule = BackoffPollSchedule(initial=0.05, jitter=False)
+        self.client.process_image(INPUT_IMAGE, self.tmp, schedule=schedule)
+        requests_first_run = self.server.requests["details"]
+
+        assert_that(self.client.runtime_stats.median(WORKFLOW_ID)).is_close_to(self.processing_time, 0.01)
+
+        self.client.process_image(INPUT_IMAGE, self.tmp, schedule=schedule)
+        assert_that(self.server.requests["details"] - requests_first_run).is_less_than_or_equal_to(2)
+        assert_that(requests_first_run).is_greater_than(2)
+
+    def test_upload_index_skips_upload_of_known_images(self):
+        self.client.upload_index = UploadIndex(os.path.join(self.tmp, "uploads.sqlite"))
+        self.client.process_image(INPUT_IMAGE, self.tmp)
+        self.client.process_image(INPUT_IMAGE, self.tmp)
+
+        assert_that(self.server.requests["create"]).is_equal_to(2)
+        assert_that(self.server.requests["create_upload"]).is_equal_to(1)
+        assert_that(self.client.upload_index.contains(ORGANIZATION_ID, sha256_file(INPUT_IMAGE))).is_true()
+
+    def test_upload_index_uploads_again_when_server_lost_the_image(self):
+        self.client.upload_index = UploadIndex(os.path.join(self.tmp, "uploads.sqlite"))
+        self.client.upload_index.add(ORGANIZATION_ID, sha256_file(INPUT_IMAGE))
+
+        self.client.process_image(INPUT_IMAGE, self.tmp)
+
+        assert_that(self.server.requests["create"]).is_equal_to(2)
+        assert_that(self.server.requests["create_upload"]).is_equal_to(1)
@@ -0,0 +1,106 @@
+import functools
+import os
+import shutil
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from assertpy import assert_that
+
+from autoretouch.api_client.client import COMPLETION_BATCH
+from autoretouch.api_client.throttle import AIMDController
+from test.fake_server import FakeServerTestCase, INPUT_IMAGE
+
+
+class ProcessImagesTest(FakeServerTestCase):
+
+    server_kwargs = {"processing_time": 0.1}
+
+    def setUp(self) -> None:
+        super().setUp()
+        with open(INPUT_IMAGE, "rb") as f:
+            self.content = f.read()
+
+    def serve_files(self) -> str:
+        shutil.copy(INPUT_IMAGE, os.path.join(self.tmp, "served.jpeg"))
+        files = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(SimpleHTTPRequestHandler, directory=self.tmp))
+        threading.Thread(target=files.serve_forever, daemon=True).start()
+        self.addCleanup(files.server_close)
+        self.addCleanup(files.shutdown)
+        return f"http://127.0.0.1:{files.server_address[1]}"
+
+    def test_yields_the_results_of_every_kind_of_input(self):
+        url = f"{self.serve_files()}/served.jpeg"
+        with open(INPUT_IMAGE, "rb") as f:
+            records = list(self.client.process_images([INPUT_IMAGE, url, self.content, f]))
+
+        assert_that(sorted(record.index for record in records)).is_equal_to([0, 1, 2, 3])
+        assert_that([record.error for record in records]).contains_only(None)
+        assert_that([record.result for record in records]).contains_only(self.content)
+        assert_that(sorted(record.name for record in records)).is_equal_to(
+            ["image_2.jpeg", "input_image.jpeg", "input_image_3.jpeg", "served.jpeg"]
+        )
+        assert_that(records[0].timings).contains_key("upload", "processing", "download")
+        assert_that(records[0].execution.status).is_equal_to("COMPLETED")
+
+    def test_yields_in_completion_order_and_reports_failures(self):
+        missing = os.path.join(self.tmp, "missing.jpeg")
+
+        records = list(self.client.process_images([INPUT_IMAGE, missing], max_in_flight=2))
+
+        assert_that(records[0].input).is_equal_to(missing)
+        assert_that(records[0].ok).is_false()
+        assert_that(records[0].error).is_instance_of(FileNotFoundError)
+        assert_that(records[1].ok).is_true()
+
+    def test_reports_failures_outside_of_the_processing(self):
+        class BrokenController(AIMDController):
+            def acquire(self):
+                raise RuntimeError("broken")
+
+        self.client.concurrency_controller = BrokenController()
+
+        records = list(self.client.process_images([INPUT_IMAGE, self.content], max_in_flight=1))
+
+        assert_that(records).is_length(2)
+        assert_that([str(record.error) for record in records]).contains_only("broken")
+
+    def test_writes_results_to_a_directory(self):
+        output_dir = os.path.join(self.tmp, "out")
+        os.makedirs(output_dir)
+
+        records = list(self.client.process_images([INPUT_IMAGE], output_dir=output_dir, completion=COMPLETION_BATCH))
+
+        assert_that(records[0].result).is_none()
+        assert_that(records[0].result_path).is_equal_to(os.path.join(output_dir, "input_image.jpeg"))
+        assert_that(os.path.isfile(records[0].result_path)).is_true()
+
+    def test_results_of_inputs_with_the_same_name_do_not_overwrite_each_other(self):
+        output_dir = os.path.join(self.tmp, "out")
+        os.makedirs(output_dir)
+        other_dir = os.path.join(self.tmp, "other")
+        os.makedirs(other_dir)
+        other_image = os.path.join(other_dir, "input_image.jpeg")
+        shutil.copy(INPUT_IMAGE, other_image)
+
+        records = list(self.client.process_images([INPUT_IMAGE, other_image, INPUT_IMAGE], output_dir=output_dir))
+
+        assert_that([record.error for record in records]).contains_only(None)
+        assert_that(sorted(record.result_path for record in records)).is_equal_to(
+            [os.path.join(output_dir, name) for name in ["input_image.jpeg", "input_image_1.jpeg", "input_image_2.jpeg"]]
+        )
+        assert_that(sorted(os.listdir(output_dir))).is_length(3)
+
+    def test_reads_inputs_as_they_are_processed(self):
+        taken = []
+
+        def images():
+            for i in range(10):
+                taken.append(i)
+                yield self.content
+
+        results = self.client.process_images(images(), max_in_flight=2)
+        first = next(results)
+        results.close()
+
+        assert_that(first.ok).is_true()
+        assert_that(len(taken)).is_less_than_or_equal_to(3)
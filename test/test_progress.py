@@ -0,0 +1,112 @@
+import os
+import shutil
+from unittest import TestCase
+
+from assertpy import assert_that
+
+from autoretouch.api_client.client import COMPLETION_BATCH
+from autoretouch.api_client.instrumentation import Instrumentation, StageEvent, STAGE_DOWNLOAD, STAGE_PROCESSING, STAGE_UPLOAD
+from autoretouch.api_client.progress import Progress
+from test.fake_server import FakeServerTestCase, INPUT_IMAGE
+
+
+class ProgressTest(TestCase):
+
+    def test_follows_images_through_the_stages(self):
+        progress = Progress().start()
+        paths = list(progress.follow(["a", "b", "c"]))
+        progress(StageEvent("a", STAGE_UPLOAD, 0.1, bytes=100))
+        progress(StageEvent("b", STAGE_UPLOAD, 0.1, bytes=100))
+        progress(StageEvent("a", STAGE_PROCESSING, 1.0, credits=10))
+        progress(StageEvent("other", STAGE_UPLOAD, 0.1, bytes=100))
+
+        snapshot = progress.snapshot()
+
+        assert_that(paths).is_equal_to(["a", "b", "c"])
+        assert_that(snapshot.total).is_equal_to(3)
+        assert_that((snapshot.uploading, snapshot.processing, snapshot.downloading)).is_equal_to((1, 1, 1))
+        assert_that(snapshot.uploaded_bytes).is_equal_to(200)
+        assert_that(snapshot.credits).is_equal_to(10)
+
+    def test_estimates_the_remaining_time(self):
+        progress = Progress(total=4, window=60).start()
+        for path in ["a", "b"]:
+            progress.found(path)
+            progress(StageEvent(path, STAGE_DOWNLOAD, 0.1, bytes=1000))
+        progress.finished("a")
+        progress.finished("b", RuntimeWarning("execution failed on server"))
+
+        snapshot = progress.snapshot()
+
+        assert_that(snapshot.total).is_equal_to(4)
+        assert_that(snapshot.completed).is_equal_to(1)
+        assert_that(snapshot.failed).is_equal_to(1)
+        assert_that(snapshot.images_per_second).is_positive()
+        assert_that(snapshot.eta).is_close_to(2 / snapshot.images_per_second, 1e-6)
+        assert_that(snapshot.summary()).contains("2/4 done, 1 failed")
+
+    def test_updates_end_with_the_run(self):
+        progress = Progress(interval=0.01).start()
+        progress.close()
+
+        snapshots = list(progress.updates())
+
+        assert_that(snapshots).is_length(1)
+        assert_that(snapshots[0].finished).is_true()
+
+
+class ProcessFolderProgressTest(FakeServerTestCase):
+
+    server_kwargs = {"processing_time": 0.1}
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.input_dir = os.path.join(self.tmp, "in")
+        self.output_dir = os.path.join(self.tmp, "out")
+        os.makedirs(self.input_dir)
+        os.makedirs(self.output_dir)
+        for i in range(3):
+            shutil.copy(INPUT_IMAGE, os.path.join(self.input_dir, f"image_{i}.jpeg"))
+
+    def assert_finished(self, progress: Progress, reports: list):
+        snapshot = progress.snapshot()
+        assert_that(snapshot.finished).is_true()
+        assert_that(snapshot.total).is_equal_to(3)
+        assert_that(snapshot.completed).is_equal_to(3)
+        assert_that(snapshot.credits).is_equal_to(30)
+        assert_that(snapshot.uploaded_bytes).is_equal_to(3 * os.path.getsize(INPUT_IMAGE))
+        assert_that(snapshot.downloaded_bytes).is_equal_to(3 * os.path.getsize(INPUT_IMAGE))
+        assert_that(reports[-1]).is_equal_to(snapshot)
+
+    def test_reports_a_run(self):
+        reports = []
+        progress = Progress(callback=reports.append, interval=0.05)
+
+        self.client.process_folder(self.input_dir, self.output_dir, progress=progress)
+
+        self.assert_finished(progress, reports)
+
+    def test_reports_a_batch_run(self):
+        reports = []
+        progress = Progress(callback=reports.append, interval=0.05)
+
+        self.client.process_folder(self.input_dir, self.output_dir, completion=COMPLETION_BATCH, progress=progress)
+
+        self.assert_finished(progress, reports)
+
+    def test_gives_back_the_instrumentation_of_the_client(self):
+        self.client.process_folder(self.input_dir, self.output_dir, progress=Progress())
+
+        assert_that(self.client.instrumentation).is_none()
+
+        events = []
+        instrumentation = Instrumentation(events.append)
+        self.client.instrumentation = instrumentation
+        progress = Progress()
+
+        self.client.process_folder(self.input_dir, self.output_dir, progress=progress)
+
+        assert_that(self.client.instrumentation).is_same_as(instrumentation)
+        assert_that(instrumentation.listeners).is_equal_to([events.append])
+        assert_that(events).is_not_empty()
+        assert_that(progress.snapshot().completed).is_equal_to(3)
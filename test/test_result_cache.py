@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from assertpy import assert_that
+
+from autoretouch.api_client.client import COMPLETION_BATCH, COMPLETION_POLL
+from autoretouch.api_client.result_cache import ResultCache
+from autoretouch.api_client.schedule import FixedPollSchedule
+from test.fake_server import FakeServerTestCase, INPUT_IMAGE, WORKFLOW_ID, WORKFLOW_VERSION
+
+OTHER_VERSION = "9b6f3e2a-7c1d-4e8f-a5b4-3c2d1e0f9a8b"
+
+
+class ResultCacheTest(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.cache = ResultCache(os.path.join(self.tmp, "cache"), max_bytes=250)
+
+    def tearDown(self) -> None:
+        self.cache.close()
+        shutil.rmtree(self.tmp)
+
+    def result(self, name: str, size: int = 100) -> str:
+        path = os.path.join(self.tmp, name)
+        with open(path, "wb") as f:
+            f.write(name.encode().ljust(size, b"."))
+        return path
+
+    def test_key_depends_on_everything_that_produces_the_result(self):
+        key = ResultCache.key("hash", WORKFLOW_ID, WORKFLOW_VERSION)
+
+        assert_that(ResultCache.key("hash", WORKFLOW_ID, WORKFLOW_VERSION, {})).is_equal_to(key)
+        assert_that(ResultCache.key("other", WORKFLOW_ID, WORKFLOW_VERSION)).is_not_equal_to(key)
+        assert_that(ResultCache.key("hash", WORKFLOW_ID, OTHER_VERSION)).is_not_equal_to(key)
+        assert_that(ResultCache.key("hash", WORKFLOW_ID, WORKFLOW_VERSION, {"a": 1})).is_not_equal_to(key)
+
+    def test_serves_cached_results(self):
+        self.cache.put("a", self.result("a"))
+        target = os.path.join(self.tmp, "out", "a.jpg")
+
+        assert_that(self.cache.get("a", target)).is_true()
+        assert_that(self.cache.get("b", target)).is_false()
+        with open(target, "rb") as f, open(os.path.join(self.tmp, "a"), "rb") as original:
+            assert_that(f.read()).is_equal_to(original.read())
+
+    def test_evicts_least_recently_used_results(self):
+        self.cache.put("a", self.result("a"))
+        self.cache.put("b", self.result("b"))
+        self.cache.get("a", os.path.join(self.tmp, "out"))
+        self.cache.put("c", self.result("c"))
+
+        assert_that(self.cache.get("a", os.path.join(self.tmp, "out"))).is_true()
+        assert_that(self.cache.get("b", os.path.join(self.tmp, "out"))).is_false()
+        assert_that(self.cache.get("c", os.path.join(self.tmp, "out"))).is_true()
+        assert_that(os.path.join(self.tmp, "cache", "objects", "b", "b")).does_not_exist()
+
+
+class ProcessImageCacheTest(FakeServerTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.cache = ResultCache(os.path.join(self.tmp, "cache"))
+        self.client.result_cache = self.cache
+
+    def tearDown(self) -> None:
+        self.cache.close()
+
+    def client_kwargs(self, **kwargs) -> dict:
+        return super().client_kwargs(poll_schedule=FixedPollSchedule(0.01), **kwargs)
+
+    def test_duplicates_are_served_from_the_cache_until_the_workflow_changes(self):
+        self.client.process_image(INPUT_IMAGE, os.path.join(self.tmp, "first"))
+        self.client.process_image(INPUT_IMAGE, os.path.join(self.tmp, "second"))
+
+        assert_that(self.server.requests["create"]).is_equal_to(1)
+        assert_that(os.path.join(self.tmp, "second", "input_image.jpeg")).is_file()
+
+        self.server.workflow_version = OTHER_VERSION
+        self.client.process_image(INPUT_IMAGE, os.path.join(self.tmp, "third"))
+
+        assert_that(self.server.requests["create"]).is_equal_to(2)
+        versions = {str(execution["workflowVersion"]) for execution in self.server.executions.values()}
+        assert_that(versions).is_equal_to({WORKFLOW_VERSION, OTHER_VERSION})
+
+    def test_batch_and_journaled_runs_use_the_cache(self):
+        input_dir = os.path.join(self.tmp, "input")
+        os.makedirs(input_dir)
+        shutil.copy(INPUT_IMAGE, input_dir)
+
+        self.client.process_folder(input_dir, os.path.join(self.tmp, "first"), completion=COMPLETION_BATCH)
+        self.client.process_folder(
+            input_dir, os.path.join(self.tmp, "second"), journal_path=os.path.join(self.tmp, "journal.sqlite")
+        )
+
+        assert_that(self.server.requests["create"]).is_equal_to(1)
+        assert_that(os.path.join(self.tmp, "second", "input_image.jpeg")).is_file()
+
+    def test_process_images_uses_the_cache(self):
+        with open(INPUT_IMAGE, "rb") as f:
+            content = f.read()
+
+        first = list(self.client.process_images([content]))
+        second = list(self.client.process_images([content, INPUT_IMAGE]))
+
+        assert_that(self.server.requests["create"]).is_equal_to(1)
+        assert_that([record.error for record in first + second]).contains_only(None)
+        assert_that([record.result for record in second]).contains_only(first[0].result)
+
+    def test_resolves_the_workflow_version_once_per_run(self):
+        input_dir = os.path.join(self.tmp, "input")
+        os.makedirs(input_dir)
+        for index in range(4):
+            shutil.copy(INPUT_IMAGE, os.path.join(input_dir, f"{index}.jpeg"))
+
+        for completion in (COMPLETION_POLL, COMPLETION_BATCH):
+            requests = self.server.requests.get("workflow", 0)
+            self.client.process_folder(input_dir, os.path.join(self.tmp, completion), completion=completion)
+            assert_that(self.server.requests.get("workflow", 0) - requests).is_equal_to(1)
+
+        requests = self.server.requests.get("workflow", 0)
+        list(self.client.process_images([os.path.join(input_dir, name) for name in os.listdir(input_dir)]))
+        assert_that(self.server.requests.get("workflow", 0) - requests).is_equal_to(1)
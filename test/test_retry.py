@@ -0,0 +1,106 @@
+import os
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from unittest import TestCase
+
+import requests
+from assertpy import assert_that
+
+from autoretouch.api_client.client import COMPLETION_BATCH
+from autoretouch.api_client.retry import RetryPolicy
+from autoretouch.api_client.schedule import FixedPollSchedule
+from test.fake_server import FakeServerTestCase, INPUT_IMAGE, WORKFLOW_ID
+
+
+class RetryPolicyTest(TestCase):
+
+    def test_only_rejected_requests_are_retried_when_not_idempotent(self):
+        policy = RetryPolicy()
+
+        assert_that(policy.should_retry_status(502, idempotent=True)).is_true()
+        assert_that(policy.should_retry_status(502, idempotent=False)).is_false()
+        assert_that(policy.should_retry_status(429, idempotent=False)).is_true()
+        assert_that(policy.should_retry_status(404, idempotent=True)).is_false()
+        assert_that(policy.should_retry_error(requests.ConnectTimeout(), idempotent=False)).is_true()
+        assert_that(policy.should_retry_error(requests.ReadTimeout(), idempotent=False)).is_false()
+        assert_that(policy.should_retry_error(requests.ReadTimeout(), idempotent=True)).is_true()
+
+    def test_retry_after_takes_precedence_over_backoff(self):
+        policy = RetryPolicy(backoff=1.0, cap=4.0)
+        response = requests.Response()
+
+        for attempt in range(10):
+            assert_that(policy.delay(attempt, response)).is_between(0, 4.0)
+        response.headers["Retry-After"] = "7"
+        assert_that(policy.delay(0, response)).is_equal_to(7.0)
+        response.headers["Retry-After"] = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=60))
+        assert_that(policy.delay(0, response)).is_between(55, 60)
+
+    def test_retry_after_is_clamped(self):
+        policy = RetryPolicy(max_retry_after=10.0)
+        response = requests.Response()
+
+        response.headers["Retry-After"] = "86400"
+        assert_that(policy.delay(0, response)).is_equal_to(10.0)
+        response.headers["Retry-After"] = format_datetime(datetime.now(timezone.utc) + timedelta(days=1))
+        assert_that(policy.delay(0, response)).is_equal_to(10.0)
+
+
+class ClientRetryTest(FakeServerTestCase):
+
+    def client_kwargs(self, **kwargs) -> dict:
+        return super().client_kwargs(
+            retry_policy=RetryPolicy(backoff=0.01), poll_schedule=FixedPollSchedule(0.01), **kwargs
+        )
+
+    def test_upload_is_retried_with_the_whole_file(self):
+        self.server.inject("upload", 502, 503)
+
+        content_hash = self.client.upload_image(INPUT_IMAGE)
+
+        assert_that(content_hash).is_equal_to("8bcac2125bd98cd96ba75667b9a8832024970ac05bf4123f864bb63bcfefbcf7")
+        assert_that(self.server.requests["upload"]).is_equal_to(3)
+
+    def test_execution_creation_is_not_retried_after_a_bad_gateway(self):
+        self.server.inject("create", 502)
+
+        assert_that(self.client.create_workflow_execution_for_image_file).raises(
+            requests.HTTPError
+        ).when_called_with(WORKFLOW_ID, INPUT_IMAGE)
+        assert_that(self.server.requests["create"]).is_equal_to(1)
+
+    def test_execution_creation_is_retried_when_throttled(self):
+        self.server.inject("create", 429, headers={"Retry-After": "0"})
+
+        self.client.create_workflow_execution_for_image_file(WORKFLOW_ID, INPUT_IMAGE)
+
+        assert_that(self.server.requests["create"]).is_equal_to(2)
+
+    def test_gives_up_after_max_attempts(self):
+        self.server.inject("details", 500, 500, 500, 500, 500)
+
+        assert_that(self.client.get_workflow_execution_details).raises(
+            requests.HTTPError
+        ).when_called_with("6f1c0c5e-3c1b-4b53-a0c5-1c2b7b3a9d10")
+        assert_that(self.server.requests["details"]).is_equal_to(4)
+
+    def test_stalled_requests_time_out_and_are_retried(self):
+        self.client.timeout = (1.0, 0.2)
+        self.server.stall("details", 1.0)
+        execution_id = self.client.create_workflow_execution_for_image_file(WORKFLOW_ID, INPUT_IMAGE)
+
+        self.client.get_workflow_execution_details(execution_id)
+
+        assert_that(self.server.requests["details"]).is_equal_to(2)
+
+    def test_failed_executions_are_retried_on_the_server(self):
+        self.server.failing_executions = 2
+
+        self.client.process_image(INPUT_IMAGE, self.tmp)
+        self.client.process_folder(
+            os.path.dirname(INPUT_IMAGE), os.path.join(self.tmp, "out"), completion=COMPLETION_BATCH
+        )
+
+        assert_that(self.server.requests["retry"]).is_equal_to(2)
+        assert_that(os.path.isfile(os.path.join(self.tmp, "input_image.jpeg"))).is_true()
+        assert_that(os.path.isfile(os.path.join(self.tmp, "out", "input_image.jpeg"))).is_true()
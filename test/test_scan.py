@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from assertpy import assert_that
+
+from autoretouch.api_client.client import AutoRetouchAPIClient, COMPLETION_BATCH
+from autoretouch.api_client.scan import scan_images
+from autoretouch.api_client.schedule import FixedPollSchedule
+from test.fake_server import FakeServerTestCase
+
+FILES = [
+    "a.jpg", "b.JPG", "notes.txt", ".hidden.png", "._a.jpg",
+    "shoot/c.png", "shoot/raw/d.tif", "shoot/e_thumb.jpeg",
+    ".cache/f.jpg", "other/g.TIFF",
+]
+
+
+class ScanImagesTest(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        for path in FILES:
+            os.makedirs(os.path.dirname(os.path.join(self.tmp, path)), exist_ok=True)
+            with open(os.path.join(self.tmp, path), "wb") as f:
+                f.write(path.encode())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+
+    def scan(self, **kwargs):
+        return sorted(path.replace(os.sep, "/") for path in scan_images(self.tmp, **kwargs))
+
+    def test_finds_images_recursively_ignoring_case_and_hidden_entries(self):
+        assert_that(self.scan()).is_equal_to(
+            ["a.jpg", "b.JPG", "other/g.TIFF", "shoot/c.png", "shoot/e_thumb.jpeg", "shoot/raw/d.tif"]
+        )
+        assert_that(self.scan(recursive=False)).is_equal_to(["a.jpg", "b.JPG"])
+
+    def test_include_and_exclude_globs(self):
+        assert_that(self.scan(include=["*.PNG", "*.tif"])).is_equal_to(["shoot/c.png", "shoot/raw/d.tif"])
+        assert_that(self.scan(exclude=["shoot/raw", "*_thumb.*", "other"])).is_equal_to(
+            ["a.jpg", "b.JPG", "shoot/c.png"]
+        )
+
+    def test_skips_given_directories(self):
+        assert_that(self.scan(skip_dirs=[os.path.join(self.tmp, "shoot")])).is_equal_to(
+            ["a.jpg", "b.JPG", "other/g.TIFF"]
+        )
+
+    def test_yields_lazily(self):
+        images = scan_images(self.tmp)
+
+        first = next(images)
+        shutil.rmtree(os.path.join(self.tmp, "shoot"))
+        shutil.rmtree(os.path.join(self.tmp, "other"))
+
+        assert_that([first, *images]).is_length(2)
+
+    def test_find_images_lists_the_top_level_images(self):
+        images = AutoRetouchAPIClient.find_images(self.tmp)
+
+        assert_that(images).is_instance_of(list)
+        assert_that(sorted(images)).is_equal_to(["a.jpg", "b.JPG"])
+
+
+class ProcessNestedFolderTest(FakeServerTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.input_dir = os.path.join(self.tmp, "input")
+        for path in FILES:
+            os.makedirs(os.path.dirname(os.path.join(self.input_dir, path)), exist_ok=True)
+            with open(os.path.join(self.input_dir, path), "wb") as f:
+                f.write(path.encode())
+
+    def client_kwargs(self, **kwargs) -> dict:
+        return super().client_kwargs(poll_schedule=FixedPollSchedule(0.01), **kwargs)
+
+    def outputs(self, output_dir: str):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), output_dir).replace(os.sep, "/")
+            for root, _, names in os.walk(output_dir) for name in names
+        )
+
+    def test_results_mirror_the_input_tree(self):
+        for completion in ("poll", COMPLETION_BATCH):
+            output_dir = os.path.join(self.tmp, f"output-{completion}")
+
+            self.client.process_folder(
+                self.input_dir, output_dir, completion=completion, recursive=True, exclude=["raw"]
+            )
+
+            assert_that(self.outputs(output_dir)).is_equal_to(
+                ["a.jpg", "b.JPG", "other/g.TIFF", "shoot/c.png", "shoot/e_thumb.jpeg"]
+            )
+            with open(os.path.join(output_dir, "shoot", "c.png"), "rb") as f:
+                assert_that(f.read()).is_equal_to(b"shoot/c.png")
+
+    def test_output_directory_inside_input_is_not_processed(self):
+        output_dir = os.path.join(self.input_dir, "retouched")
+        self.client.process_folder(self.input_dir, output_dir, recursive=True)
+        self.client.process_folder(self.input_dir, output_dir, recursive=True)
+
+        assert_that(self.outputs(output_dir)).is_length(6)
+        assert_that(self.server.requests["create"]).is_equal_to(12)
@@ -0,0 +1,52 @@
+import os
+import tempfile
+from itertools import islice
+from unittest import TestCase
+from uuid import uuid4
+
+from assertpy import assert_that
+
+from autoretouch.api_client.schedule import BackoffPollSchedule, FixedPollSchedule, PollSchedule, RuntimeStats
+
+
+class PollScheduleTest(TestCase):
+
+    def test_fixed_schedule(self):
+        assert_that(list(islice(FixedPollSchedule(2.0).delays(30.0), 3))).is_equal_to([2.0, 2.0, 2.0])
+
+    def test_backoff_starts_at_expected_runtime_and_is_capped(self):
+        schedule = BackoffPollSchedule(initial=1.0, factor=2.0, cap=5.0, jitter=False)
+
+        assert_that(list(islice(schedule.delays(12.0), 5))).is_equal_to([5.0, 1.0, 2.0, 4.0, 5.0])
+        assert_that(list(islice(schedule.delays(3.0), 2))).is_equal_to([3.0, 1.0])
+        assert_that(next(schedule.delays())).is_equal_to(1.0)
+
+    def test_full_jitter_stays_within_bounds(self):
+        delays = list(islice(BackoffPollSchedule(initial=1.0, cap=8.0).delays(4.0), 1000))
+
+        assert_that(delays[0]).is_between(3.6, 4.4)
+        for attempt, delay in enumerate(delays[1:]):
+            assert_that(delay).is_between(0, min(8.0, 2.0 ** attempt))
+        assert_that(len(set(delays))).is_greater_than(900)
+
+    def test_schedules_must_define_delays(self):
+        class Incomplete(PollSchedule):
+            pass
+
+        assert_that(Incomplete).raises(TypeError).when_called_with()
+
+
+class RuntimeStatsTest(TestCase):
+
+    def test_median_over_window_and_persistence(self):
+        workflow_id = uuid4()
+        stats = RuntimeStats(window=3)
+        assert_that(stats.median(workflow_id)).is_none()
+        for runtime in [100.0, 1.0, 2.0, 3.0]:
+            stats.record(workflow_id, runtime)
+
+        path = os.path.join(tempfile.mkdtemp(), "stats.json")
+        stats.save(path)
+
+        assert_that(stats.median(workflow_id)).is_equal_to(2.0)
+        assert_that(RuntimeStats.load(path, window=3).median(workflow_id)).is_equal_to(2.0)
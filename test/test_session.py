@@ -0,0 +1,104 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+
+import requests
+from assertpy import assert_that
+
+from autoretouch.api_client.client import AutoRetouchAPIClient
+from autoretouch.api_client.model import ApiConfig
+
+USER_AGENT = "Python-Unit-Test-0.1.0"
+N_REQUESTS = 200
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with _StandInHandler.lock:
+            _StandInHandler.connections += 1
+
+    def do_GET(self):
+        self._answer(b"1000")
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._answer(json.dumps({
+            "access_token": "access", "scope": "offline_access", "expires_in": 3600, "token_type": "Bearer"
+        }).encode())
+
+    def _answer(self, body: bytes):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SessionBenchmark(TestCase):
+    """compares a pooled client against one connection per request on a local stand-in server"""
+
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{self.server.server_port}"
+        self.config = ApiConfig(
+            BASE_API_URL=base, BASE_API_URL_CURRENT=f"{base}/v1", CLIENT_ID="client", SCOPE="offline_access",
+            AUDIENCE=base, AUTH_DOMAIN=base
+        )
+        _StandInHandler.connections = 0
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _client(self, **kwargs) -> AutoRetouchAPIClient:
+        return AutoRetouchAPIClient(
+            organization_id="d92fe1cd-7166-4f5d-b43f-a100758d42c9", api_config=self.config,
+            refresh_token="refresh", credentials_path=None, save_credentials=False, user_agent=USER_AGENT, **kwargs
+        )
+
+    def _measure(self, client: AutoRetouchAPIClient):
+        _StandInHandler.connections = 0
+        start = time.perf_counter()
+        for _ in range(N_REQUESTS):
+            client.get_balance()
+        latency = (time.perf_counter() - start) / N_REQUESTS
+        return _StandInHandler.connections, latency
+
+    def test_pooled_session_reuses_connections(self):
+        class _NoKeepAliveSession(requests.Session):
+            # equivalent to the module-level `requests.get/post`: a fresh connection per call
+            def request(self, *args, **kwargs):
+                with requests.Session() as session:
+                    return session.request(*args, **kwargs)
+
+        with self._client() as pooled, self._client(session=_NoKeepAliveSession()) as unpooled:
+            pooled.login(), unpooled.login()
+            pooled_connections, _ = self._measure(pooled)
+            unpooled_connections, _ = self._measure(unpooled)
+
+        assert_that(pooled_connections).is_less_than_or_equal_to(1)
+        assert_that(unpooled_connections).is_equal_to(N_REQUESTS)
+
+    def test_passed_in_session_is_not_closed(self):
+        class _RecordingSession(requests.Session):
+            closed = False
+
+            def close(self):
+                self.closed = True
+                super().close()
+
+        session = _RecordingSession()
+        with self._client(session=session) as client:
+            assert_that(client.session).is_same_as(session)
+        assert_that(session.closed).is_false()
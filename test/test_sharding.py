@@ -0,0 +1,73 @@
+import os
+
+from assertpy import assert_that
+
+from autoretouch.api_client.instrumentation import Instrumentation, StageEvent, STAGE_DOWNLOAD
+from autoretouch.api_client.sharding import ShardedRunner
+from autoretouch.api_client.upload_index import UploadIndex, sha256_file
+from test.fake_server import FakeServerTestCase, ORGANIZATION_ID, WORKFLOW_ID
+
+
+class ShardedRunnerTest(FakeServerTestCase):
+
+    server_kwargs = {"processing_time": 0.1}
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.input_dir = os.path.join(self.tmp, "input")
+        self.output_dir = os.path.join(self.tmp, "output")
+        os.makedirs(self.input_dir)
+        for i in range(6):
+            with open(os.path.join(self.input_dir, f"image_{i}.jpeg"), "wb") as f:
+                f.write(f"image {i}".encode())
+        self.image_paths = sorted(os.path.join(self.input_dir, name) for name in os.listdir(self.input_dir))
+
+    def client_kwargs(self, **kwargs) -> dict:
+        return super().client_kwargs(
+            credentials_path=os.path.join(self.tmp, "credentials.json"), save_credentials=True, **kwargs
+        )
+
+    def test_shards_images_across_processes_and_reports_back(self):
+        results = []
+
+        summary = ShardedRunner(
+            self.client, WORKFLOW_ID, ORGANIZATION_ID, processes=3, poll_interval=0.05,
+            on_result=lambda path, error: results.append((path, error))
+        ).run(self.image_paths, self.output_dir)
+
+        assert_that(sorted(summary.succeeded)).is_equal_to(self.image_paths)
+        assert_that(summary.failed).is_empty()
+        assert_that(results).is_length(6)
+        assert_that(sorted(os.listdir(self.output_dir))).is_equal_to(sorted(os.listdir(self.input_dir)))
+        # the workers reuse the credentials of the parent
+        assert_that(self.server.requests["token"]).is_equal_to(1)
+
+    def test_failures_are_aggregated_in_the_parent(self):
+        self.server.inject("create", 400, 400)
+        self.client.retry_policy.max_attempts = 1
+
+        summary = ShardedRunner(
+            self.client, WORKFLOW_ID, ORGANIZATION_ID, processes=2, poll_interval=0.05,
+            on_result=lambda path, error: None
+        ).run(self.image_paths, self.output_dir)
+
+        assert_that(summary.failed).is_length(2)
+        assert_that(summary.succeeded).is_length(4)
+        for error in summary.failed.values():
+            assert_that(error).contains("HTTPError")
+
+    def test_workers_share_the_settings_of_the_client(self):
+        events = []
+        self.client.upload_index = UploadIndex(os.path.join(self.tmp, "uploads.sqlite"))
+        self.client.instrumentation = Instrumentation(events.append)
+
+        ShardedRunner(
+            self.client, WORKFLOW_ID, ORGANIZATION_ID, processes=2, poll_interval=0.05,
+            on_result=lambda path, error: None
+        ).run(self.image_paths, self.output_dir)
+
+        for image_path in self.image_paths:
+            assert_that(self.client.upload_index.contains(ORGANIZATION_ID, sha256_file(image_path))).is_true()
+        downloads = [event for event in events if isinstance(event, StageEvent) and event.stage == STAGE_DOWNLOAD]
+        assert_that(sorted(event.image_path for event in downloads)).is_equal_to(self.image_paths)
+        self.client.upload_index.close()
@@ -0,0 +1,41 @@
+from unittest import TestCase
+
+from assertpy import assert_that
+
+from autoretouch.api_client.model import ServerSentEvent
+from autoretouch.api_client.sse import EventStreamParser, iter_events
+
+
+class EventStreamParserTest(TestCase):
+
+    def test_parses_events_split_across_chunks(self):
+        stream = b'event: status\r\ndata: {"status": "ACTIVE"}\r\n\r\n: keep-alive\r\nid: 2\r\ndata: {"status": "COMPLETED"}\r\n\r\n'
+        chunks = [stream[i:i + 3] for i in range(0, len(stream), 3)]
+
+        events = list(iter_events(chunks))
+
+        assert_that(events).is_equal_to([
+            ServerSentEvent(data='{"status": "ACTIVE"}', event="status"),
+            ServerSentEvent(data='{"status": "COMPLETED"}', id="2"),
+        ])
+        assert_that(events[1].json()["status"]).is_equal_to("COMPLETED")
+
+    def test_emits_event_as_soon_as_it_is_terminated(self):
+        parser = EventStreamParser()
+
+        assert_that(parser.feed(b"data: first\ndata: second\n")).is_empty()
+        assert_that(parser.feed(b"\n")).is_equal_to([ServerSentEvent(data="first\nsecond")])
+
+    def test_blank_lines_without_data_dispatch_nothing(self):
+        parser = EventStreamParser()
+
+        assert_that(parser.feed(b": comment\nfoo: bar\nretry: 100\nevent: status\n\n\n")).is_empty()
+        # the event type of the undispatched event does not leak into the next one
+        assert_that(parser.feed(b"data: x\n\n")).is_equal_to([ServerSentEvent(data="x")])
+
+    def test_a_data_field_without_value_dispatches_empty_data(self):
+        # the data buffer is "\n" here, not empty: the spec only drops its trailing newline when dispatching
+        assert_that(EventStreamParser().feed(b"retry: x\ndata\n\n")).is_equal_to([ServerSentEvent(data="")])
+
+    def test_drops_incomplete_event_at_end_of_stream(self):
+        assert_that(list(iter_events([b"data: partial\n"]))).is_empty()
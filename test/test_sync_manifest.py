@@ -0,0 +1,128 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from assertpy import assert_that
+
+from autoretouch.api_client.client import COMPLETION_BATCH
+from autoretouch.api_client.schedule import FixedPollSchedule
+from autoretouch.api_client.sync_manifest import SyncManifest, SYNC_HASH, SYNC_MTIME, SYNC_NAME
+from test.fake_server import FakeServerTestCase, WORKFLOW_ID
+
+OTHER_WORKFLOW_ID = "0e7a1a9c-5b4f-4d43-9d55-6a3c1d2e7f80"
+
+
+class SyncManifestTest(TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.input_dir = os.path.join(self.tmp, "input")
+        self.output_dir = os.path.join(self.tmp, "output")
+        os.makedirs(self.input_dir)
+        os.makedirs(self.output_dir)
+        self.image = self.write(os.path.join(self.input_dir, "image.jpg"), b"image")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+
+    @staticmethod
+    def write(path: str, content: bytes, mtime_ns: int = 10 ** 18) -> str:
+        with open(path, "wb") as f:
+            f.write(content)
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+        return path
+
+    def processed(self, manifest: SyncManifest):
+        self.write(os.path.join(self.output_dir, "image.jpg"), b"result")
+        manifest.record(self.image, WORKFLOW_ID)
+
+    def test_name_mode_only_checks_the_result_exists(self):
+        manifest = SyncManifest(self.input_dir, self.output_dir, SYNC_NAME)
+
+        assert_that(manifest.needs_processing(self.image, WORKFLOW_ID)).is_true()
+        self.write(os.path.join(self.output_dir, "image.jpg"), b"result")
+        self.write(self.image, b"changed", mtime_ns=2 * 10 ** 18)
+        assert_that(manifest.needs_processing(self.image, WORKFLOW_ID)).is_false()
+        manifest.close()
+
+    def test_mtime_mode_reprocesses_modified_images_and_other_workflows(self):
+        manifest = SyncManifest(self.input_dir, self.output_dir, SYNC_MTIME)
+        self.processed(manifest)
+
+        assert_that(manifest.needs_processing(self.image, WORKFLOW_ID)).is_false()
+        assert_that(manifest.needs_processing(self.image, OTHER_WORKFLOW_ID)).is_true()
+        self.write(self.image, b"image", mtime_ns=2 * 10 ** 18)
+        assert_that(manifest.needs_processing(self.image, WORKFLOW_ID)).is_true()
+        manifest.close()
+
+    def test_hash_mode_ignores_touched_but_unchanged_images(self):
+        manifest = SyncManifest(self.input_dir, self.output_dir, SYNC_HASH)
+        self.processed(manifest)
+
+        self.write(self.image, b"image", mtime_ns=2 * 10 ** 18)
+        assert_that(manifest.needs_processing(self.image, WORKFLOW_ID)).is_false()
+        self.write(self.image, b"IMAGE", mtime_ns=3 * 10 ** 18)
+        assert_that(manifest.needs_processing(self.image, WORKFLOW_ID)).is_true()
+        manifest.close()
+
+    def test_an_image_changed_while_processed_is_reprocessed(self):
+        manifest = SyncManifest(self.input_dir, self.output_dir, SYNC_HASH)
+        fingerprint = manifest.fingerprint(self.image)
+
+        self.write(self.image, b"IMAGE", mtime_ns=2 * 10 ** 18)
+        self.write(os.path.join(self.output_dir, "image.jpg"), b"result")
+        manifest.record(self.image, WORKFLOW_ID, fingerprint)
+
+        assert_that(manifest.needs_processing(self.image, WORKFLOW_ID)).is_true()
+        manifest.close()
+
+    def test_missing_result_is_reprocessed(self):
+        manifest = SyncManifest(self.input_dir, self.output_dir, SYNC_HASH)
+        self.processed(manifest)
+
+        os.remove(os.path.join(self.output_dir, "image.jpg"))
+
+        assert_that(manifest.needs_processing(self.image, WORKFLOW_ID)).is_true()
+        manifest.close()
+
+
+class IncrementalProcessFolderTest(FakeServerTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.input_dir = os.path.join(self.tmp, "input")
+        self.output_dir = os.path.join(self.tmp, "output")
+        os.makedirs(os.path.join(self.input_dir, "sub"))
+        for i in range(3):
+            with open(os.path.join(self.input_dir, "sub", f"image_{i}.jpg"), "wb") as f:
+                f.write(f"image {i}".encode())
+
+    def client_kwargs(self, **kwargs) -> dict:
+        return super().client_kwargs(poll_schedule=FixedPollSchedule(0.01), **kwargs)
+
+    def test_rerun_only_processes_the_delta(self):
+        for completion in ("poll", COMPLETION_BATCH):
+            self.server.requests.clear()
+            shutil.rmtree(self.output_dir, ignore_errors=True)
+
+            self.client.process_folder(
+                self.input_dir, self.output_dir, completion=completion, recursive=True, sync=SYNC_HASH
+            )
+            assert_that(self.server.requests["create"]).is_equal_to(3)
+
+            self.client.process_folder(
+                self.input_dir, self.output_dir, completion=completion, recursive=True, sync=SYNC_HASH
+            )
+            assert_that(self.server.requests["create"]).is_equal_to(3)
+
+            changed = os.path.join(self.input_dir, "sub", "image_1.jpg")
+            with open(changed, "wb") as f:
+                f.write(f"changed by {completion}".encode())
+            os.utime(changed, ns=(os.stat(changed).st_mtime_ns + 10 ** 9,) * 2)
+            self.client.process_folder(
+                self.input_dir, self.output_dir, completion=completion, recursive=True, sync=SYNC_HASH
+            )
+            assert_that(self.server.requests["create"]).is_equal_to(4)
+            with open(os.path.join(self.output_dir, "sub", "image_1.jpg"), "rb") as f:
+                assert_that(f.read()).is_equal_to(f"changed by {completion}".encode())
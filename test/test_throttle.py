@@ -0,0 +1,190 @@
+import asyncio
+import os
+import shutil
+import threading
+from time import monotonic
+from unittest import TestCase
+
+from assertpy import assert_that
+
+from autoretouch.api_client.async_client import AsyncAutoRetouchAPIClient
+from autoretouch.api_client.client import AutoRetouchAPIClient
+from autoretouch.api_client.retry import RetryPolicy
+from autoretouch.api_client.schedule import FixedPollSchedule
+from autoretouch.api_client.throttle import AIMDController, TokenBucket
+from test.fake_server import FakeServerTestCase, INPUT_IMAGE
+
+
+class TokenBucketTest(TestCase):
+
+    def test_burst_then_sustained_rate(self):
+        bucket = TokenBucket(rate=50, burst=5)
+
+        start = monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        assert_that(monotonic() - start).is_less_than(0.01)
+        for _ in range(10):
+            bucket.acquire()
+        assert_that(monotonic() - start).is_between(0.18, 0.3)
+
+
+class AIMDControllerTest(TestCase):
+
+    def test_increases_additively_while_saturated(self):
+        controller = AIMDController(initial=4, maximum=6)
+
+        for _ in range(3):
+            controller.acquire()
+        for _ in range(4):
+            controller.record(0.01, 200)
+        assert_that(controller.limit).is_equal_to(4)
+        for _ in range(4):
+            controller.record(0.01, 200)
+        assert_that(controller.limit).is_equal_to(5)
+        controller.acquire()
+        for _ in range(100):
+            controller.record(0.01, 200)
+        assert_that(controller.limit).is_equal_to(6)
+
+    def test_does_not_increase_when_idle(self):
+        controller = AIMDController(initial=4)
+
+        for _ in range(100):
+            controller.record(0.01, 200)
+
+        assert_that(controller.limit).is_equal_to(4)
+
+    def test_decreases_multiplicatively_once_per_cooldown(self):
+        controller = AIMDController(initial=16, cooldown=60)
+
+        controller.record(0.01, 429)
+        controller.record(0.01, 503)
+        controller.record(0.01, None)
+
+        assert_that(controller.limit).is_equal_to(8)
+
+    def test_latency_increase_is_congestion(self):
+        controller = AIMDController(initial=16, cooldown=0)
+
+        for _ in range(5):
+            controller.record(0.01, 200)
+        for _ in range(3):
+            controller.record(1.0, 200)
+
+        assert_that(controller.limit).is_less_than(16)
+
+    def test_routes_have_their_own_baseline(self):
+        controller = AIMDController(initial=16, cooldown=0)
+
+        for _ in range(5):
+            controller.record(0.01, 200, "GET /v1/workflow/execution")
+        for _ in range(5):
+            controller.record(0.5, 200, "GET /v1/image/{hash}/{name}")
+        controller.record(None, 200, "POST /v1/workflow/execution/create")
+
+        assert_that(controller.limit).is_equal_to(16)
+        for _ in range(3):
+            controller.record(5.0, 200, "GET /v1/image/{hash}/{name}")
+        assert_that(controller.limit).is_less_than(16)
+
+    def test_acquire_blocks_at_limit(self):
+        controller = AIMDController(initial=2)
+        controller.acquire()
+        controller.acquire()
+        acquired = threading.Event()
+
+        def acquire():
+            controller.acquire()
+            acquired.set()
+
+        threading.Thread(target=acquire, daemon=True).start()
+        assert_that(acquired.wait(0.1)).is_false()
+        controller.release()
+        assert_that(acquired.wait(1)).is_true()
+        assert_that(controller.in_flight).is_equal_to(2)
+
+
+class ClientThrottleTest(FakeServerTestCase):
+
+    create_client = False
+
+    def client_kwargs(self, **kwargs) -> dict:
+        return super().client_kwargs(
+            retry_policy=RetryPolicy(backoff=0.01), poll_schedule=FixedPollSchedule(0.01), **kwargs
+        )
+
+    def client(self, **kwargs) -> AutoRetouchAPIClient:
+        return AutoRetouchAPIClient(**self.client_kwargs(**kwargs))
+
+    def async_client(self, **kwargs) -> AsyncAutoRetouchAPIClient:
+        return AsyncAutoRetouchAPIClient(**self.client_kwargs(**kwargs))
+
+    def test_rate_limiter_spaces_requests(self):
+        with self.client(rate_limiter=TokenBucket(rate=20)) as client:
+            start = monotonic()
+            for _ in range(5):
+                client.get_api_status()
+
+            assert_that(monotonic() - start).is_greater_than_or_equal_to(0.19)
+
+    def test_throttled_requests_lower_the_concurrency_limit(self):
+        controller = AIMDController(initial=8, increase=0, latency_tolerance=1000, cooldown=0)
+        self.server.inject("create", 429, 429)
+        input_dir = os.path.join(self.tmp, "input")
+        os.makedirs(input_dir)
+        for i in range(4):
+            shutil.copy(INPUT_IMAGE, os.path.join(input_dir, f"image_{i}.jpeg"))
+        output_dir = os.path.join(self.tmp, "output")
+
+        with self.client(concurrency_controller=controller) as client:
+            client.process_folder(input_dir, output_dir)
+
+        assert_that(controller.limit).is_equal_to(2)
+        assert_that(controller.in_flight).is_equal_to(0)
+        assert_that(os.listdir(output_dir)).is_length(4)
+
+    def test_large_images_do_not_lower_the_concurrency_limit(self):
+        controller = AIMDController(initial=8, increase=0, cooldown=0)
+        input_dir = os.path.join(self.tmp, "input")
+        os.makedirs(input_dir)
+        with open(INPUT_IMAGE, "rb") as f:
+            content = f.read()
+        for i in range(4):
+            # camera images of 8 to 32 MB take far longer to send and receive than a status request
+            with open(os.path.join(input_dir, f"image_{i}.jpeg"), "wb") as f:
+                f.write(content + os.urandom(8_000_000 * (i + 1)))
+        output_dir = os.path.join(self.tmp, "output")
+
+        with self.client(concurrency_controller=controller) as client:
+            client.process_folder(input_dir, output_dir)
+
+        assert_that(controller.limit).is_equal_to(8)
+        assert_that(os.listdir(output_dir)).is_length(4)
+
+    def test_async_requests_share_the_limiters(self):
+        bucket = TokenBucket(rate=20)
+        controller = AIMDController(initial=8, increase=0, latency_tolerance=1000, cooldown=0)
+        self.server.inject("create", 429, 429)
+        input_dir = os.path.join(self.tmp, "input")
+        os.makedirs(input_dir)
+        for i in range(4):
+            shutil.copy(INPUT_IMAGE, os.path.join(input_dir, f"image_{i}.jpeg"))
+        output_dir = os.path.join(self.tmp, "output")
+
+        async def run():
+            async with self.async_client(rate_limiter=bucket, concurrency_controller=controller) as client:
+                await client.authenticated()
+                start = monotonic()
+                await asyncio.gather(*(client.get_api_status() for _ in range(5)))
+                spaced = monotonic() - start
+                await client.process_folder(input_dir, output_dir)
+                return spaced
+
+        with self.client(rate_limiter=bucket) as client:
+            client.get_api_status()
+            assert_that(asyncio.run(run())).is_greater_than_or_equal_to(0.19)
+
+        assert_that(controller.limit).is_equal_to(2)
+        assert_that(controller.in_flight).is_equal_to(0)
+        assert_that(os.listdir(output_dir)).is_length(4)
@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+from assertpy import assert_that
+
+from autoretouch.api_client.client import AutoRetouchAPIClient
+from test.fake_server import FakeServerTestCase
+
+
+def _now() -> int:
+    return int(datetime.utcnow().timestamp())
+
+
+class TokenRefreshTest(FakeServerTestCase):
+
+    create_client = False
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.credentials_path = os.path.join(self.tmp, "credentials.json")
+
+    def client(self, **kwargs) -> AutoRetouchAPIClient:
+        return AutoRetouchAPIClient(
+            **self.client_kwargs(credentials_path=self.credentials_path, save_credentials=True, **kwargs)
+        )
+
+    def test_expired_token_is_refreshed_once_for_all_threads(self):
+        with self.client() as client:
+            client.get_balance()
+            client.auth.credentials.expires_at = 0
+            barrier = threading.Barrier(20)
+
+            def get_balance():
+                barrier.wait()
+                client.get_balance()
+
+            threads = [threading.Thread(target=get_balance) for _ in range(20)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert_that(self.server.requests["token"]).is_equal_to(2)
+        assert_that(self.server.requests["balance"]).is_equal_to(21)
+
+    def test_credentials_refreshed_by_another_process_are_adopted(self):
+        with self.client() as first, self.client() as second:
+            first.get_balance()
+            second.auth.credentials = first.auth.credentials
+            first.auth.credentials.expires_at = 0
+            first.get_balance()
+            assert_that(self.server.requests["token"]).is_equal_to(2)
+
+            second.auth.credentials.expires_at = 0
+            second.get_balance()
+
+            assert_that(self.server.requests["token"]).is_equal_to(2)
+            assert_that(second.auth.credentials.expires_at).is_greater_than(_now())
+
+    def test_refreshed_credentials_are_written_atomically(self):
+        with self.client() as client:
+            client.get_balance()
+            client.auth.credentials.expires_at = 0
+            client.get_balance()
+
+        with open(self.credentials_path) as f:
+            assert_that(json.load(f)).contains_entry({"refresh_token": "refresh"})
+        assert_that([name for name in os.listdir(self.tmp) if name.endswith(".part")]).is_empty()
+
+    def test_background_refresh_renews_token_before_it_expires(self):
+        with self.client(background_refresh=True) as client:
+            client.auth.refresh_margin = 1
+            client.get_balance()
+            client.auth.credentials.expires_at = _now() + 3
+            refreshed = threading.Event()
+            # restart the refresher so that it notices the shortened expiry
+            client.auth.stop_background_refresh()
+            client.auth.start_background_refresh()
+
+            for _ in range(50):
+                if client.auth.credentials.expires_at > _now() + 60:
+                    refreshed.set()
+                    break
+                refreshed.wait(0.1)
+
+            assert_that(refreshed.is_set()).is_true()
+            assert_that(self.server.requests["token"]).is_equal_to(2)
@@ -0,0 +1,109 @@
+import json
+import os
+import shutil
+import urllib.error
+import urllib.request
+from dataclasses import replace
+from unittest import TestCase
+
+from assertpy import assert_that
+
+from autoretouch.api_client.client import AutoRetouchAPIClient, COMPLETION_WEBHOOK
+from autoretouch.api_client.webhook import WebhookReceiver
+from test.fake_server import FakeServerTestCase, INPUT_IMAGE, WORKFLOW_ID
+
+
+def post(url: str, payload: dict) -> int:
+    request = urllib.request.Request(url, json.dumps(payload).encode(), method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+class WebhookReceiverTest(TestCase):
+
+    def test_callbacks_are_kept_until_awaited(self):
+        with WebhookReceiver() as receiver:
+            assert_that(post(receiver.url, {"id": "a", "status": "COMPLETED"})).is_equal_to(204)
+
+            assert_that(receiver.wait("a", timeout=1)).is_equal_to({"id": "a", "status": "COMPLETED"})
+            assert_that(receiver.wait("a", timeout=0.05)).is_none()
+
+    def test_rejects_callbacks_to_other_paths(self):
+        with WebhookReceiver() as receiver:
+            other_url = receiver.url.rsplit("/", 1)[0] + "/guess"
+
+            assert_that(post(other_url, {"id": "a"})).is_equal_to(404)
+            assert_that(receiver.wait("a", timeout=0.05)).is_none()
+
+    def test_plugs_into_a_callers_server(self):
+        receiver = WebhookReceiver(public_url="https://example.com/hooks", max_pending=1)
+        receiver.deliver({"workflowExecutionId": "a"})
+        receiver.deliver({"workflowExecutionId": "b"})
+
+        assert_that(receiver.url).is_equal_to("https://example.com/hooks")
+        assert_that(receiver.wait("a", timeout=0)).is_none()
+        assert_that(receiver.wait("b", timeout=0)).is_equal_to({"workflowExecutionId": "b"})
+
+
+class WebhookCompletionTest(FakeServerTestCase):
+
+    server_kwargs = {"processing_time": 0.2}
+
+    def setUp(self) -> None:
+        self.receiver = WebhookReceiver(fallback_interval=0.5).start()
+        self.addCleanup(self.receiver.stop)
+        super().setUp()
+
+    def client_kwargs(self, **kwargs) -> dict:
+        return super().client_kwargs(**{"webhook_receiver": self.receiver, **kwargs})
+
+    def test_completes_without_status_requests(self):
+        input_dir = os.path.join(self.tmp, "in")
+        os.makedirs(input_dir)
+        for i in range(5):
+            shutil.copy(INPUT_IMAGE, os.path.join(input_dir, f"image_{i}.jpeg"))
+        output_dir = os.path.join(self.tmp, "out")
+        os.makedirs(output_dir)
+
+        self.client.process_folder(input_dir, output_dir, completion=COMPLETION_WEBHOOK)
+
+        assert_that(sorted(os.listdir(output_dir))).is_length(5)
+        assert_that(self.server.requests).does_not_contain_key("details", "status", "list")
+
+    def test_falls_back_to_polling_a_missed_callback(self):
+        self.server.dropped_webhooks = 1
+
+        self.client.process_image(INPUT_IMAGE, self.tmp, completion=COMPLETION_WEBHOOK)
+
+        assert_that(os.path.isfile(os.path.join(self.tmp, "input_image.jpeg"))).is_true()
+        assert_that(self.server.requests["details"]).is_equal_to(1)
+
+    def test_waits_longer_than_the_fallback_for_executions_known_to_take_longer(self):
+        self.server.processing_time = 1.5
+        self.client.runtime_stats.record(WORKFLOW_ID, 1.5)
+
+        self.client.process_image(INPUT_IMAGE, self.tmp, completion=COMPLETION_WEBHOOK)
+
+        assert_that(os.path.isfile(os.path.join(self.tmp, "input_image.jpeg"))).is_true()
+        assert_that(self.server.requests).does_not_contain_key("details")
+
+    def test_starts_its_own_receiver(self):
+        with AutoRetouchAPIClient(**self.client_kwargs(webhook_receiver=None)) as client:
+            client.process_image(INPUT_IMAGE, self.tmp, completion=COMPLETION_WEBHOOK)
+            receiver = client.webhook_receiver
+
+        assert_that(os.path.isfile(os.path.join(self.tmp, "input_image.jpeg"))).is_true()
+        assert_that(receiver._server).is_none()
+
+    def test_a_remote_api_needs_a_public_url(self):
+        api_config = replace(self.server.api_config, BASE_API_URL="https://api.autoretouch.com")
+        with AutoRetouchAPIClient(**self.client_kwargs(api_config=api_config, webhook_receiver=None)) as client:
+            assert_that(client.process_image).raises(RuntimeError) \
+                .when_called_with(INPUT_IMAGE, self.tmp, completion=COMPLETION_WEBHOOK).contains("public_url")
+            assert_that(client.webhook_receiver).is_none()
+
+            client.webhook_receiver = WebhookReceiver(public_url="https://hooks.example.com/autoretouch")
+            assert_that(client._get_webhook_receiver().url).is_equal_to("https://hooks.example.com/autoretouch")